@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 压测工具
+功能：基于 asyncio 的 HTTP/1.1 keep-alive 客户端，按固定并发或固定到达速率压测本地后端，
+      延迟记录在对数分桶直方图中，输出吞吐、p50/p90/p99/p999 及按状态码分类的错误
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from array import array
+from collections import Counter, namedtuple
+
+DEFAULT_PATH = "/v1/chat/completions"
+DEFAULT_MODEL = "gpt-3.5-turbo"
+# 压测使用的令牌（sk-...），也可通过 -k 指定
+BENCH_KEY_ENV = "NEW_API_BENCH_KEY"
+REQUEST_TIMEOUT = 30.0
+PERCENTILES = (50, 90, 99, 99.9)
+
+# 直方图：每个 2 的幂区间分 128 个子桶，相对误差 < 1%；单位微秒，上限约 1 小时
+SUB_BUCKET_BITS = 8
+SUB_BUCKET_HALF = 1 << (SUB_BUCKET_BITS - 1)
+MAX_LATENCY_US = 3600 * 1000000
+
+BenchConfig = namedtuple("BenchConfig", [
+    "port", "path", "method", "body", "headers",
+    "concurrency",      # 固定并发：同时在途的请求数（rate 为 0 时生效）
+    "rate",             # 固定到达速率（请求/秒），>0 时按计划时间发起请求
+    "duration",         # 正式压测时长（秒），与 requests 二选一
+    "requests",         # 正式压测请求总数
+    "warmup",           # 预热时长（秒），期间的结果不计入统计
+    "timeout",
+])
+
+BenchResult = namedtuple("BenchResult", [
+    "config", "elapsed", "histogram", "statuses", "errors", "bytes",
+])
+
+
+def chat_body(model=DEFAULT_MODEL, stream=False, max_tokens=1):
+    """与 bin/time_test.sh 相同的最小对话请求"""
+    return json.dumps({
+        "messages": [{"content": "echo hi", "role": "user"}],
+        "model": model,
+        "stream": stream,
+        "max_tokens": max_tokens,
+    }).encode()
+
+
+def make_config(port, path=DEFAULT_PATH, key=None, model=DEFAULT_MODEL, stream=False,
+                concurrency=16, rate=0.0, duration=10.0, requests=0, warmup=2.0, timeout=REQUEST_TIMEOUT):
+    """/v1/ 下的接口默认发送对话请求，其余路径发送 GET"""
+    key = key if key is not None else os.environ.get(BENCH_KEY_ENV, "")
+    headers = {}
+    if key:
+        headers["Authorization"] = f"Bearer {key}"
+    if path.startswith("/v1/"):
+        method, body = "POST", chat_body(model, stream)
+        headers["Content-Type"] = "application/json"
+    else:
+        method, body = "GET", b""
+    return BenchConfig(port, path, method, body, headers, concurrency, rate,
+                       duration if not requests else 0.0, requests, warmup, timeout)
+
+
+# ---------- 直方图 ----------
+
+class LatencyHistogram:
+    """
+    HDR 风格的对数-线性分桶直方图（微秒）
+    小于 256us 的值精确计数，之后每个 2 的幂区间均分为 128 个子桶
+    """
+
+    def __init__(self, max_value=MAX_LATENCY_US):
+        self.max_value = max_value
+        self.counts = array("Q", bytes(8 * (self._index(max_value) + 1)))
+        self.count = 0
+        self.total = 0
+        self.total_sq = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def _index(value):
+        if value < 2 * SUB_BUCKET_HALF:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return shift * SUB_BUCKET_HALF + (value >> shift)
+
+    @staticmethod
+    def _value(index):
+        """桶所代表的值（区间中点）"""
+        if index < 2 * SUB_BUCKET_HALF:
+            return index
+        shift = (index - SUB_BUCKET_HALF) // SUB_BUCKET_HALF
+        low = (index - shift * SUB_BUCKET_HALF) << shift
+        return low + (1 << shift) // 2
+
+    def record(self, value):
+        value = min(max(int(value), 0), self.max_value)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            if n:
+                self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def stdev(self):
+        if not self.count:
+            return 0.0
+        return math.sqrt(max(self.total_sq / self.count - self.mean ** 2, 0.0))
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self._value(i), self.max)
+        return self.max
+
+
+# ---------- HTTP 客户端 ----------
+
+class _Connection:
+    """一条 keep-alive 连接，按顺序收发请求"""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def request(self, raw):
+        """发送请求并读完响应，返回 (状态码, 响应体字节数)"""
+        if self.writer is None:
+            await self.open()
+        self.writer.write(raw)
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        size = 0
+        if "content-length" in headers:
+            size = int(headers["content-length"])
+            await self.reader.readexactly(size)
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            # SSE 流式响应以分块编码返回，读到最后一个空块为止
+            while True:
+                chunk_size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await self.reader.readexactly(chunk_size + 2)
+                size += chunk_size
+                if chunk_size == 0:
+                    break
+        else:
+            size = len(await self.reader.read())
+            self.close()
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, size
+
+
+def _raw_request(config):
+    lines = [f"{config.method} {config.path} HTTP/1.1", f"Host: 127.0.0.1:{config.port}",
+             "Connection: keep-alive", f"Content-Length: {len(config.body)}"]
+    lines += [f"{k}: {v}" for k, v in config.headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + config.body
+
+
+class _Run:
+    """一次压测的执行状态"""
+
+    def __init__(self, config, progress):
+        self.config = config
+        self.progress = progress
+        self.raw = _raw_request(config)
+        self.histogram = LatencyHistogram()
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.bytes = 0
+        self.measuring = False
+        self.issued = 0
+        self.pool = []
+
+    async def one(self, conn, scheduled):
+        """
+        发起一次请求；延迟从计划发起时间算起，
+        固定速率模式下排队等待连接的时间也计入延迟（避免协同遗漏）
+        """
+        measuring = self.measuring
+        try:
+            status, size = await asyncio.wait_for(conn.request(self.raw), self.config.timeout)
+        except asyncio.TimeoutError:
+            conn.close()
+            status, error = None, "timeout"
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, IndexError) as e:
+            conn.close()
+            status, error = None, type(e).__name__
+        if not measuring:
+            return
+        if status is None:
+            self.errors[error] += 1
+            return
+        self.statuses[status] += 1
+        self.bytes += size
+        self.histogram.record((time.perf_counter() - scheduled) * 1000000)
+
+    def more(self, deadline):
+        if self.config.requests and self.measuring:
+            return self.issued < self.config.requests
+        return time.perf_counter() < deadline
+
+    async def closed_loop(self, deadline):
+        """固定并发：每个 worker 持有一条连接，请求完成后立即发下一个"""
+        async def worker(conn):
+            while self.more(deadline):
+                if self.measuring:
+                    self.issued += 1
+                await self.one(conn, time.perf_counter())
+
+        await asyncio.gather(*(worker(conn) for conn in self.pool))
+
+    async def open_loop(self, deadline):
+        """固定速率：按计划时间发起请求，连接不够时新建连接"""
+        idle = list(self.pool)
+        interval = 1.0 / self.config.rate
+        pending = set()
+        next_at = time.perf_counter()
+
+        async def fire(scheduled):
+            conn = idle.pop() if idle else _Connection(self.config.port)
+            try:
+                await self.one(conn, scheduled)
+            finally:
+                idle.append(conn)
+
+        while self.more(deadline):
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.measuring:
+                self.issued += 1
+            task = asyncio.ensure_future(fire(next_at))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            next_at += interval
+        if pending:
+            await asyncio.gather(*pending)
+        self.pool = idle
+
+    async def phase(self, seconds):
+        deadline = time.perf_counter() + seconds
+        reporter = asyncio.ensure_future(self.report(deadline)) if self.measuring and self.progress else None
+        try:
+            if self.config.rate > 0:
+                await self.open_loop(deadline)
+            else:
+                await self.closed_loop(deadline)
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+
+    async def report(self, deadline):
+        last, last_count = time.perf_counter(), 0
+        while True:
+            await asyncio.sleep(1.0)
+            now = time.perf_counter()
+            done = self.histogram.count + sum(self.errors.values())
+            self.progress(done, (done - last_count) / (now - last), max(deadline - now, 0))
+            last, last_count = now, done
+
+    async def execute(self):
+        config = self.config
+        self.pool = [_Connection(config.port) for _ in range(max(1, config.concurrency))]
+        try:
+            if config.warmup > 0:
+                await self.phase(config.warmup)
+            self.measuring = True
+            start = time.perf_counter()
+            await self.phase(config.duration if not config.requests else float("inf"))
+            elapsed = time.perf_counter() - start
+        finally:
+            for conn in self.pool:
+                conn.close()
+        return BenchResult(config, elapsed, self.histogram, dict(self.statuses), dict(self.errors), self.bytes)
+
+
+def run_bench(config, progress=None):
+    """
+    在当前线程中运行一次压测（独立事件循环，不与管理器共用）
+    progress(已完成数, 当前每秒请求数, 剩余秒数) 每秒回调一次
+    """
+    return asyncio.run(_Run(config, progress).execute())
+
+
+def format_ms(us):
+    return f"{us / 1000:.2f}ms"
+
+
+def format_report(result):
+    """压测结果的文本报告（多行）"""
+    config, hist = result.config, result.histogram
+    total = hist.count + sum(result.errors.values())
+    mode = f"固定速率 {config.rate:g}/s" if config.rate > 0 else f"并发 {config.concurrency}"
+    lines = [
+        f"{config.method} {config.path}  {mode}  预热 {config.warmup:g}s  "
+        f"正式 {result.elapsed:.1f}s  共 {total} 个请求",
+        f"吞吐: {total / result.elapsed if result.elapsed else 0:.1f} req/s  "
+        f"({result.bytes / result.elapsed / 1024 if result.elapsed else 0:.1f} KB/s)",
+    ]
+    if hist.count:
+        lines.append(f"延迟: 最小 {format_ms(hist.min)}  平均 {format_ms(hist.mean)}±{format_ms(hist.stdev)}  "
+                     f"最大 {format_ms(hist.max)}")
+        lines.append("      " + "  ".join(f"p{p:g} {format_ms(hist.percentile(p))}" for p in PERCENTILES))
+    ok = sum(n for status, n in result.statuses.items() if status < 400)
+    breakdown = [f"{status}: {n}" for status, n in sorted(result.statuses.items())]
+    breakdown += [f"{name}: {n}" for name, n in sorted(result.errors.items())]
+    lines.append(f"成功 {ok}/{total}  " + "  ".join(breakdown))
+    return lines
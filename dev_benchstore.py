@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 压测结果库
+功能：把每次压测的吞吐、延迟直方图连同提交号、改动状态、环境配置和机器信息写入本地 SQLite，
+      按提交对比两组结果（Welch t 检验判断差异是否显著），超过回退阈值时以非零状态退出
+"""
+
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime
+from statistics import mean, stdev
+
+from dev_build import CACHE_DIR, BACKEND_DIR
+from dev_bench import LatencyHistogram, format_ms
+from dev_pprof import source_revision
+
+DB_FILE = os.path.join(CACHE_DIR, "bench.sqlite3")
+DEFAULT_PROFILE = "default"
+# 回退阈值（百分比），超过且差异显著（或样本不足以判断）即视为回退
+DEFAULT_THRESHOLD = 5.0
+SIGNIFICANCE = 0.05
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time REAL NOT NULL,
+    commit_id TEXT NOT NULL,
+    dirty INTEGER NOT NULL,
+    profile TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    scenario TEXT NOT NULL,
+    config TEXT NOT NULL,
+    elapsed REAL NOT NULL,
+    requests INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    statuses TEXT NOT NULL,
+    histogram BLOB NOT NULL,
+    note TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS runs_commit ON runs (commit_id, scenario, profile);
+"""
+
+Run = namedtuple("Run", [
+    "id", "time", "commit", "dirty", "profile", "machine", "scenario", "config",
+    "elapsed", "requests", "failures", "bytes", "statuses", "histogram", "note",
+])
+# 对比的指标：(名称, 显示名, 是否越大越好)
+METRICS = (
+    ("throughput", "吞吐 req/s", True),
+    ("mean", "平均延迟", False),
+    ("p50", "p50", False),
+    ("p90", "p90", False),
+    ("p99", "p99", False),
+)
+Delta = namedtuple("Delta", [
+    "metric", "label", "base", "new",
+    "change",           # 相对变化（正值为变差）
+    "p_value",          # None 表示样本不足无法检验
+    "regression",
+])
+
+
+class BenchStoreError(Exception):
+    pass
+
+
+def machine_info():
+    return {
+        "host": platform.node(),
+        "system": platform.platform(),
+        "cpu": platform.processor() or platform.machine(),
+        "cores": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def scenario_of(config):
+    """同一场景的结果才有可比性：方法、路径、压测模式"""
+    mode = f"rate={config.rate:g}" if config.rate > 0 else f"c={config.concurrency}"
+    return f"{config.method} {config.path} {mode}"
+
+
+# ---------- 直方图序列化 ----------
+
+def pack_histogram(hist):
+    """只保存非零桶，压缩后写入 BLOB"""
+    data = {
+        "buckets": [[i, n] for i, n in enumerate(hist.counts) if n],
+        "count": hist.count, "total": hist.total, "total_sq": hist.total_sq,
+        "min": hist.min, "max": hist.max,
+    }
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+
+
+def unpack_histogram(blob):
+    data = json.loads(zlib.decompress(blob))
+    hist = LatencyHistogram()
+    for i, n in data["buckets"]:
+        hist.counts[i] = n
+    hist.count, hist.total, hist.total_sq = data["count"], data["total"], data["total_sq"]
+    hist.min, hist.max = data["min"], data["max"]
+    return hist
+
+
+# ---------- 读写 ----------
+
+def _connect(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record(result, profile=None, note="", path=DB_FILE):
+    """保存一次压测结果，返回记录 ID"""
+    commit, dirty = source_revision()
+    config = result.config
+    failures = sum(result.errors.values()) + sum(n for s, n in result.statuses.items() if s >= 400)
+    config_json = {k: v for k, v in config._asdict().items() if k not in ("body", "headers")}
+    conn = _connect(path)
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO runs (time, commit_id, dirty, profile, machine, scenario, config, elapsed, "
+                "requests, failures, bytes, statuses, histogram, note) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                (time.time(), commit, int(dirty), profile or DEFAULT_PROFILE, json.dumps(machine_info()),
+                 scenario_of(config), json.dumps(config_json), result.elapsed,
+                 result.histogram.count + sum(result.errors.values()), failures, result.bytes,
+                 json.dumps({**{str(s): n for s, n in result.statuses.items()}, **result.errors}),
+                 pack_histogram(result.histogram), note))
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def _row_to_run(row):
+    return Run(row[0], row[1], row[2], bool(row[3]), row[4], json.loads(row[5]), row[6], json.loads(row[7]),
+               row[8], row[9], row[10], row[11], json.loads(row[12]), unpack_histogram(row[13]), row[14])
+
+
+def load_runs(commit=None, scenario=None, profile=None, limit=None, path=DB_FILE):
+    """按时间从旧到新返回 [Run]；commit 为提交号前缀"""
+    if not os.path.exists(path):
+        return []
+    clauses, params = [], []
+    if commit:
+        # 记录的是短提交号，传入的可能是完整提交号或更短的前缀
+        clauses.append("(commit_id = substr(?, 1, length(commit_id)) OR substr(commit_id, 1, length(?)) = ?)")
+        params += [commit, commit, commit]
+    for column, value in (("scenario", scenario), ("profile", profile)):
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    sql = "SELECT * FROM runs" + (" WHERE " + " AND ".join(clauses) if clauses else "") + " ORDER BY id DESC"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    conn = _connect(path)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    return [_row_to_run(row) for row in reversed(rows)]
+
+
+def resolve_revision(rev):
+    """把分支名、HEAD~1、短提交号等解析为完整提交号；git 无法解析时原样返回（按前缀匹配）"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--verify", "--quiet", f"{rev}^{{commit}}"],
+                                cwd=BACKEND_DIR, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return rev
+    return result.stdout.strip() or rev
+
+
+# ---------- 统计 ----------
+
+def throughput(run):
+    return run.requests / run.elapsed if run.elapsed else 0.0
+
+
+def metric_value(run, metric):
+    if metric == "throughput":
+        return throughput(run)
+    if metric == "mean":
+        return run.histogram.mean
+    return run.histogram.percentile(float(metric[1:]))
+
+
+def _betacf(a, b, x):
+    """不完全 Beta 函数的连分式展开（Numerical Recipes 6.4）"""
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 200):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < 1e-12:
+            break
+    return h
+
+
+def _betainc(a, b, x):
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1 - x) / b
+
+
+def welch_p_value(base, new):
+    """两组独立样本均值差异的双侧 p 值（Welch t 检验）；任一组少于 2 个样本返回 None"""
+    if len(base) < 2 or len(new) < 2:
+        return None
+    va, vb = stdev(base) ** 2 / len(base), stdev(new) ** 2 / len(new)
+    if va + vb == 0:
+        return 0.0 if mean(base) != mean(new) else 1.0
+    t = (mean(new) - mean(base)) / math.sqrt(va + vb)
+    df = (va + vb) ** 2 / ((va ** 2 / (len(base) - 1) if va else 0) + (vb ** 2 / (len(new) - 1) if vb else 0))
+    return _betainc(df / 2, 0.5, df / (df + t * t))
+
+
+def _latency_p_value(base, new):
+    """各只有一次运行时，用单次运行内全部请求的延迟分布比较平均延迟（近似 z 检验）"""
+    a, b = base[0].histogram, new[0].histogram
+    if a.count < 2 or b.count < 2:
+        return None
+    se = math.sqrt(a.stdev ** 2 / a.count + b.stdev ** 2 / b.count)
+    if se == 0:
+        return 0.0 if a.mean != b.mean else 1.0
+    z = abs(b.mean - a.mean) / se
+    return math.erfc(z / math.sqrt(2))
+
+
+def compare(base_runs, new_runs, threshold=DEFAULT_THRESHOLD):
+    """
+    对比同一场景下两组运行；多次运行取各次的均值并做 Welch t 检验
+    变化超过阈值且差异显著（或样本不足以检验）时标记为回退
+    """
+    deltas = []
+    for metric, label, higher_better in METRICS:
+        base = [metric_value(r, metric) for r in base_runs]
+        new = [metric_value(r, metric) for r in new_runs]
+        base_value, new_value = mean(base), mean(new)
+        if base_value:
+            change = (new_value - base_value) / base_value
+        else:
+            change = 0.0 if not new_value else float("inf")
+        if higher_better:
+            change = -change
+        p_value = welch_p_value(base, new)
+        if p_value is None and metric == "mean" and len(base_runs) == len(new_runs) == 1:
+            p_value = _latency_p_value(base_runs, new_runs)
+        significant = p_value is None or p_value < SIGNIFICANCE
+        deltas.append(Delta(metric, label, base_value, new_value, change, p_value,
+                            change * 100 > threshold and significant))
+    return deltas
+
+
+def compare_revisions(rev_a, rev_b, threshold=DEFAULT_THRESHOLD, profile=None, path=DB_FILE):
+    """
+    按 (场景, 环境配置) 分组对比两个提交，不同环境配置的结果不混在一起；profile 只对比该配置
+    返回 [(场景, 环境配置, 基准运行, 新运行, [Delta])]；没有共同的分组时抛出 BenchStoreError
+    """
+    groups = []
+    runs_a = load_runs(resolve_revision(rev_a), profile=profile, path=path)
+    runs_b = load_runs(resolve_revision(rev_b), profile=profile, path=path)
+    for rev, runs in ((rev_a, runs_a), (rev_b, runs_b)):
+        if not runs:
+            raise BenchStoreError(f"没有 {rev} 的压测记录")
+    for key in sorted({(r.scenario, r.profile) for r in runs_a} & {(r.scenario, r.profile) for r in runs_b}):
+        base = [r for r in runs_a if (r.scenario, r.profile) == key]
+        new = [r for r in runs_b if (r.scenario, r.profile) == key]
+        groups.append((*key, base, new, compare(base, new, threshold)))
+    if not groups:
+        raise BenchStoreError(f"{rev_a} 与 {rev_b} 没有相同场景与环境配置的压测记录")
+    return groups
+
+
+# ---------- 输出 ----------
+
+def display_width(text):
+    # 中文字符占两列
+    return len(text) + sum(1 for c in text if ord(c) > 0x2e80)
+
+
+def pad(text, width, align="<"):
+    """按终端显示宽度补齐到 width 列；align 为 "<" 左对齐、">" 右对齐"""
+    fill = " " * max(width - display_width(text), 0)
+    return text + fill if align == "<" else fill + text
+
+
+def _format_value(metric, value):
+    return f"{value:.1f}" if metric == "throughput" else format_ms(value)
+
+
+def describe_run(run):
+    stamp = datetime.fromtimestamp(run.time).strftime("%m-%d %H:%M:%S")
+    dirty = "*" if run.dirty else ""
+    hist = run.histogram
+    note = f"  {run.note}" if run.note else ""
+    return (f"#{run.id:<4} {stamp}  {run.commit}{dirty:<1}  {run.profile:<10} {run.scenario:<36} "
+            f"{throughput(run):>9.1f} req/s  p50 {format_ms(hist.percentile(50))}  "
+            f"p99 {format_ms(hist.percentile(99))}  失败 {run.failures}{note}")
+
+
+def format_comparison(groups, rev_a, rev_b, threshold):
+    """对比报告（多行）"""
+    lines = []
+    for scenario, profile, base, new, deltas in groups:
+        lines.append(f"{scenario} [{profile}]  ({rev_a}: {len(base)} 次, {rev_b}: {len(new)} 次, 阈值 {threshold:g}%)")
+        dirty = [rev for rev, runs in ((rev_a, base), (rev_b, new)) if any(r.dirty for r in runs)]
+        if dirty:
+            lines.append(f"  注意: {', '.join(dirty)} 包含未提交改动时的运行")
+        machines = {r.machine.get("host") for r in base + new}
+        if len(machines) > 1:
+            lines.append(f"  注意: 结果来自不同机器 ({', '.join(sorted(machines))})")
+        for d in deltas:
+            if d.p_value is None:
+                verdict = "样本不足"
+            else:
+                verdict = f"p={d.p_value:.3f}" + (" 显著" if d.p_value < SIGNIFICANCE else "")
+            sign = "变差" if d.change > 0 else "改善"
+            flag = "  ✗ 回退" if d.regression else ""
+            lines.append(f"  {pad(d.label, 12)}{_format_value(d.metric, d.base):>12} -> {_format_value(d.metric, d.new):<12}"
+                         f"{sign} {abs(d.change):.1%}  {verdict}{flag}")
+    return lines
+
+
+def regressions(groups):
+    return [(scenario, profile, d) for scenario, profile, _, _, deltas in groups for d in deltas if d.regression]
+
+
+def main(argv=None):
+    """
+    命令行：history [条数] | compare <基准提交> <新提交> [-t 阈值%] [-p 环境配置]
+    compare 按环境配置分别对比（-p 只对比指定配置），发现回退时退出码为 1，参数或数据有误为 2
+    """
+    args = list(sys.argv[1:] if argv is None else argv)
+    action = args.pop(0) if args else "history"
+    if action == "history":
+        runs = load_runs(limit=int(args[0]) if args and args[0].isdigit() else 20)
+        if not runs:
+            print("暂无压测记录")
+        for run in runs:
+            print(describe_run(run))
+        return 0
+    if action == "compare":
+        options = {"-t": str(DEFAULT_THRESHOLD), "-p": None}
+        revs = []
+        it = iter(args)
+        for arg in it:
+            if arg in options:
+                options[arg] = next(it, None)
+            else:
+                revs.append(arg)
+        try:
+            threshold = float(options["-t"])
+        except (TypeError, ValueError):
+            revs = []
+        if len(revs) != 2:
+            print("用法: compare <基准提交> <新提交> [-t 阈值%] [-p 环境配置]")
+            return 2
+        try:
+            groups = compare_revisions(revs[0], revs[1], threshold, options["-p"])
+        except BenchStoreError as e:
+            print(e)
+            return 2
+        for line in format_comparison(groups, revs[0], revs[1], threshold):
+            print(line)
+        found = regressions(groups)
+        print(f"发现 {len(found)} 项回退" if found else "没有超过阈值的回退")
+        return 1 if found else 0
+    print("用法: dev_benchstore.py history [条数] | compare <基准提交> <新提交> [-t 阈值%] [-p 环境配置]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
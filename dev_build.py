@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 后端增量编译
+功能：按 Go 源码内容哈希缓存编译产物，源码未变化时直接复用已编译的二进制
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+# 项目路径配置
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(PROJECT_ROOT, "new-api")
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".devcache")
+BIN_DIR = os.path.join(CACHE_DIR, "bin")
+STAT_CACHE_FILE = os.path.join(CACHE_DIR, "backend-sources.json")
+
+# 参与哈希的文件：Go 源码、被 go:embed 的资源、模块描述文件
+SOURCE_EXTS = (".go", ".lua")
+MODULE_FILES = ("go.mod", "go.sum")
+EMBED_DIRS = (os.path.join("web", "dist"),)
+# 不参与编译的目录
+SKIP_DIRS = {".git", ".idea", ".vscode", "web", "electron", "docs", "bin",
+             "logs", "pprof", "data", "upload", "node_modules", "tiktoken_cache"}
+# 保留的历史二进制数量（便于来回切换分支时直接命中）
+KEEP_BINARIES = 3
+
+BuildResult = namedtuple("BuildResult", ["path", "digest", "built", "elapsed"])
+
+
+class BuildError(Exception):
+    """go build 失败，output 为编译器输出"""
+
+    def __init__(self, output):
+        super().__init__("后端编译失败")
+        self.output = output
+
+
+def binary_name(digest):
+    suffix = ".exe" if sys.platform == "win32" else ""
+    return f"new-api-{digest[:16]}{suffix}"
+
+
+def iter_source_files():
+    """遍历参与编译的文件，返回相对 BACKEND_DIR 的路径"""
+    for dirpath, dirnames, filenames in os.walk(BACKEND_DIR):
+        rel_dir = os.path.relpath(dirpath, BACKEND_DIR)
+        if rel_dir == ".":
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        else:
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in filenames:
+            if filename.endswith("_test.go") or not filename.endswith(SOURCE_EXTS):
+                continue
+            yield os.path.normpath(os.path.join(rel_dir, filename))
+    for filename in MODULE_FILES:
+        if os.path.exists(os.path.join(BACKEND_DIR, filename)):
+            yield filename
+    for embed_dir in EMBED_DIRS:
+        root = os.path.join(BACKEND_DIR, embed_dir)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                yield os.path.relpath(os.path.join(dirpath, filename), BACKEND_DIR)
+
+
+def _load_stat_cache():
+    try:
+        with open(STAT_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_stat_cache(cache):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = STAT_CACHE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp, STAT_CACHE_FILE)
+
+
+def source_digest():
+    """
+    计算后端源码的内容哈希
+    文件的 mtime/size 未变化时复用上次的摘要，只重新读取改动过的文件
+    """
+    old_cache = _load_stat_cache()
+    new_cache = {}
+    total = hashlib.sha256()
+    total.update(sys.platform.encode())
+    for rel_path in sorted(iter_source_files()):
+        full_path = os.path.join(BACKEND_DIR, rel_path)
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            continue
+        key = rel_path.replace(os.sep, "/")
+        cached = old_cache.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            digest = cached[2]
+        else:
+            h = hashlib.sha256()
+            with open(full_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()
+        new_cache[key] = [st.st_mtime_ns, st.st_size, digest]
+        total.update(key.encode("utf-8"))
+        total.update(b"\0")
+        total.update(digest.encode())
+    if new_cache != old_cache:
+        _save_stat_cache(new_cache)
+    return total.hexdigest()
+
+
+def _prune_binaries(current):
+    try:
+        names = [n for n in os.listdir(BIN_DIR) if n.startswith("new-api-") and n != current]
+    except OSError:
+        return
+    paths = sorted((os.path.join(BIN_DIR, n) for n in names), key=os.path.getmtime, reverse=True)
+    for path in paths[KEEP_BINARIES - 1:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def ensure_backend_binary(log=None):
+    """
+    确保存在与当前源码对应的后端二进制
+    源码哈希命中缓存时直接返回，否则执行 go build；失败时抛出 BuildError
+    """
+    digest = source_digest()
+    name = binary_name(digest)
+    path = os.path.join(BIN_DIR, name)
+    if os.path.exists(path):
+        return BuildResult(path, digest, False, 0.0)
+
+    if log:
+        log(f"源码已变化，正在编译后端 ({digest[:8]})...")
+    os.makedirs(BIN_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"
+    start = time.monotonic()
+    result = subprocess.run(
+        ["go", "build", "-o", tmp_path, "."],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    )
+    elapsed = time.monotonic() - start
+    if result.returncode != 0:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise BuildError(result.stdout + result.stderr)
+    os.replace(tmp_path, path)
+    _prune_binaries(name)
+    return BuildResult(path, digest, True, elapsed)
+
+
+if __name__ == "__main__":
+    try:
+        res = ensure_backend_binary(log=print)
+    except BuildError as e:
+        print(e.output, end="")
+        sys.exit(1)
+    state = f"编译完成，耗时 {res.elapsed:.1f}s" if res.built else "命中缓存"
+    print(f"{state}: {res.path}")
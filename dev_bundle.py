@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 前端生产包构建
+功能：按 makefile 的 build-frontend 步骤把 web/ 构建到 web/dist，供后端 go:embed 打包，
+      以 web/src、构建配置与锁文件的内容哈希缓存构建产物，源码未变化时直接复用
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+from dev_build import CACHE_DIR, BACKEND_DIR
+
+WEB_DIR = os.path.join(BACKEND_DIR, "web")
+DIST_DIR = os.path.join(WEB_DIR, "dist")
+BUNDLE_DIR = os.path.join(CACHE_DIR, "web")
+# web/dist 当前对应的哈希
+DIST_STAMP_FILE = os.path.join(CACHE_DIR, "web-dist.json")
+# 参与哈希的内容：源码目录、构建配置、依赖描述与锁文件
+BUNDLE_SOURCE_DIRS = ("src", "public")
+BUNDLE_FILES = ("index.html", "package.json", "vite.config.js", "tailwind.config.js",
+                "postcss.config.js", "jsconfig.json")
+LOCK_FILES = ("bun.lock", "bun.lockb", "package-lock.json", "pnpm-lock.yaml", "yarn.lock")
+# 保留的历史构建数量（便于来回切换分支时直接命中）
+KEEP_BUNDLES = 3
+# 与 makefile 的 build-frontend 相同的构建环境
+BUILD_ENV = {"DISABLE_ESLINT_PLUGIN": "true"}
+
+BundleResult = namedtuple("BundleResult", ["digest", "built", "restored", "elapsed"])
+
+
+class BundleError(Exception):
+    """前端构建失败，output 为构建输出"""
+
+    def __init__(self, message, output=""):
+        super().__init__(message)
+        self.output = output
+
+
+def package_manager():
+    """与 makefile 一致优先使用 bun，没有时退回 npm"""
+    if shutil.which("bun"):
+        return "bun"
+    return "npm.cmd" if sys.platform == "win32" else "npm"
+
+
+def app_version():
+    try:
+        with open(os.path.join(BACKEND_DIR, "VERSION"), encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def iter_bundle_files():
+    """遍历参与哈希的文件，返回相对 WEB_DIR 的路径"""
+    for name in BUNDLE_SOURCE_DIRS:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(WEB_DIR, name)):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                yield os.path.relpath(os.path.join(dirpath, filename), WEB_DIR)
+    for name in BUNDLE_FILES + LOCK_FILES:
+        if os.path.exists(os.path.join(WEB_DIR, name)):
+            yield name
+
+
+def bundle_digest():
+    total = hashlib.sha256()
+    # 版本号会写进构建产物
+    total.update(app_version().encode())
+    for rel_path in sorted(iter_bundle_files()):
+        h = hashlib.sha256()
+        try:
+            with open(os.path.join(WEB_DIR, rel_path), "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    h.update(chunk)
+        except OSError:
+            continue
+        total.update(rel_path.replace(os.sep, "/").encode("utf-8"))
+        total.update(b"\0")
+        total.update(h.hexdigest().encode())
+    return total.hexdigest()
+
+
+def _dist_digest():
+    try:
+        with open(DIST_STAMP_FILE, encoding="utf-8") as f:
+            return json.load(f).get("digest")
+    except (OSError, ValueError):
+        return None
+
+
+def _set_dist_digest(digest):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(DIST_STAMP_FILE, "w", encoding="utf-8") as f:
+        json.dump({"digest": digest, "time": time.time()}, f)
+
+
+def _replace_tree(src, dst):
+    """先复制到临时目录再替换，避免中途失败留下残缺的目录"""
+    tmp = dst + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    shutil.copytree(src, tmp)
+    shutil.rmtree(dst, ignore_errors=True)
+    os.replace(tmp, dst)
+
+
+def _prune_bundles(current):
+    try:
+        names = [n for n in os.listdir(BUNDLE_DIR) if n != current]
+    except OSError:
+        return
+    paths = sorted((os.path.join(BUNDLE_DIR, n) for n in names), key=os.path.getmtime, reverse=True)
+    for path in paths[KEEP_BUNDLES - 1:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def run_web(args, env, log=None):
+    """在 web/ 下执行命令，失败时抛出 BundleError"""
+    if log:
+        log(f"执行 {' '.join(args)} ...")
+    try:
+        result = subprocess.run(
+            args, cwd=WEB_DIR, env=env, capture_output=True, text=True, encoding="utf-8", errors="replace",
+            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0)
+    except OSError as e:
+        raise BundleError(f"无法执行 {args[0]}: {e}")
+    if result.returncode != 0:
+        raise BundleError(f"{' '.join(args)} 失败 (退出码 {result.returncode})", result.stdout + result.stderr)
+
+
+def ensure_frontend_bundle(log=None):
+    """
+    确保 web/dist 是当前前端源码的生产构建
+    web/dist 已对应当前哈希时直接返回；缓存中有同一哈希的构建时复制回 web/dist；
+    否则执行构建（package.json 或锁文件变化时先安装依赖）。失败时抛出 BundleError
+    """
+    digest = bundle_digest()
+    name = digest[:16]
+    cached = os.path.join(BUNDLE_DIR, name)
+    if _dist_digest() == digest and os.path.exists(os.path.join(DIST_DIR, "index.html")):
+        return BundleResult(digest, False, False, 0.0)
+    start = time.monotonic()
+    if os.path.exists(os.path.join(cached, "index.html")):
+        _replace_tree(cached, DIST_DIR)
+        _set_dist_digest(digest)
+        os.utime(cached)
+        return BundleResult(digest, False, True, time.monotonic() - start)
+
+    if log:
+        log(f"前端源码已变化，正在构建生产包 ({digest[:8]})...")
+    # 与 dev_webdeps 互相引用，在此处导入
+    from dev_webdeps import ensure_dependencies
+    ensure_dependencies(log)
+    env = {**os.environ, **BUILD_ENV, "VITE_REACT_APP_VERSION": app_version()}
+    run_web([package_manager(), "run", "build"], env, log)
+    if not os.path.exists(os.path.join(DIST_DIR, "index.html")):
+        raise BundleError("构建完成但 web/dist 中没有 index.html")
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    _replace_tree(DIST_DIR, cached)
+    _set_dist_digest(digest)
+    _prune_bundles(name)
+    return BundleResult(digest, True, False, time.monotonic() - start)
+
+
+if __name__ == "__main__":
+    try:
+        res = ensure_frontend_bundle(log=print)
+    except BundleError as e:
+        print(e.output, end="")
+        print(e)
+        sys.exit(1)
+    state = (f"构建完成，耗时 {res.elapsed:.1f}s" if res.built
+             else "从缓存恢复" if res.restored else "命中缓存")
+    print(f"{state}: {DIST_DIR} ({res.digest[:8]})")
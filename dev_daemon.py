@@ -0,0 +1,723 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 开发环境守护进程
+功能：在独立会话中运行 Supervisor 并持有所有服务进程，通过 Unix socket（Windows 为本机回环 TCP）
+      提供按行分隔的 JSON 控制协议；CLI 与 GUI 作为客户端随时连接、断开，不影响运行中的服务
+
+协议：每行一个 JSON 对象
+  请求  {"id": 1, "method": "start_service", "params": ["backend"]}   params 可为数组或对象，
+        数组形式可另带 "kwargs": {...} 传递关键字参数
+  响应  {"id": 1, "result": ...} 或 {"id": 1, "error": "..."}
+  推送  {"events": [[kind, service, source, text, level, time], ...]}   调用 subscribe 之后
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+from dev_build import CACHE_DIR
+from dev_supervisor import Supervisor, Event, PROJECT_ROOT
+from dev_services import ServiceSpec
+from dev_envprofiles import EnvProfile
+from dev_procstat import Sample
+from dev_logindex import Match, Query
+from dev_routestats import RouteRow, WINDOWS
+
+DAEMON_LOG = os.path.join(CACHE_DIR, "daemon.log")
+# Windows 没有 Unix socket，改用本机回环端口
+DAEMON_PORT = 3099
+USE_UNIX_SOCKET = hasattr(socket, "AF_UNIX") and sys.platform != "win32"
+# 最近的事件，客户端连接时先回放这一段
+BACKLOG_SIZE = 2000
+START_TIMEOUT = 15.0
+# 客户端对同一查询的结果缓存时间（GUI 每秒刷新多个视图）
+QUERY_TTL = 0.3
+
+# 客户端可以调用的 Supervisor 控制方法（返回 Future 的会等待其完成后再响应）
+CONTROL_METHODS = (
+    "start_service", "stop_service", "restart_service", "start_with_deps",
+    "start_all", "stop_all", "restart_all", "force_kill_all",
+    "set_watch", "set_blue_green", "set_bundle", "set_profiling", "set_env_profile", "set_cluster", "set_sample_interval",
+    "register_mock", "configure_mock", "capture_profiles", "set_flight_recorder", "capture_flight",
+    "say_threadsafe",
+)
+
+
+def _socket_path():
+    path = os.path.join(CACHE_DIR, "supervisor.sock")
+    # sun_path 长度有限（Linux 108 字节），项目路径过深时改放到临时目录
+    if len(os.path.abspath(path).encode()) > 100:
+        digest = hashlib.sha1(PROJECT_ROOT.encode()).hexdigest()[:8]
+        path = os.path.join(tempfile.gettempdir(), f"new-api-dev-{digest}.sock")
+    return path
+
+
+DAEMON_SOCKET = _socket_path()
+
+
+class DaemonError(Exception):
+    pass
+
+
+def _encode(payload):
+    return (json.dumps(payload, ensure_ascii=False, default=str) + "\n").encode()
+
+
+def _open_socket(timeout=None):
+    """连接守护进程，失败抛出 OSError"""
+    if USE_UNIX_SOCKET:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(DAEMON_SOCKET)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        return sock
+    return socket.create_connection(("127.0.0.1", DAEMON_PORT), timeout=timeout)
+
+
+def running():
+    try:
+        _open_socket(timeout=1.0).close()
+    except OSError:
+        return False
+    return True
+
+
+# ---------- 服务端 ----------
+
+class ControlServer:
+    """在 Supervisor 的事件循环中运行的控制端口"""
+
+    def __init__(self, supervisor):
+        self.sup = supervisor
+        self.recent = deque(maxlen=BACKLOG_SIZE)
+        self.stopping = None
+        self._server = None
+
+    async def start(self):
+        self.stopping = asyncio.Event()
+        if USE_UNIX_SOCKET:
+            if os.path.exists(DAEMON_SOCKET):
+                if running():
+                    raise DaemonError(f"守护进程已在运行 ({DAEMON_SOCKET})")
+                # 上次异常退出留下的 socket 文件
+                os.remove(DAEMON_SOCKET)
+            os.makedirs(os.path.dirname(DAEMON_SOCKET), exist_ok=True)
+            self._server = await asyncio.start_unix_server(self._handle, DAEMON_SOCKET)
+            os.chmod(DAEMON_SOCKET, 0o600)
+        else:
+            try:
+                self._server = await asyncio.start_server(self._handle, "127.0.0.1", DAEMON_PORT)
+            except OSError as e:
+                raise DaemonError(f"无法监听 127.0.0.1:{DAEMON_PORT}: {e}")
+        self.sup.loop.create_task(self._record(self.sup.subscribe()))
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if USE_UNIX_SOCKET:
+            try:
+                os.remove(DAEMON_SOCKET)
+            except OSError:
+                pass
+
+    async def _record(self, subscription):
+        async for events in subscription:
+            self.recent.extend(events)
+
+    # ---------- 连接 ----------
+
+    async def _handle(self, reader, writer):
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    method = request["method"]
+                    params = request.get("params") or []
+                    kwargs = request.get("kwargs") or {}
+                    if isinstance(params, dict):
+                        params, kwargs = [], dict(params, **kwargs)
+                except (ValueError, KeyError, TypeError):
+                    await self._send(writer, {"id": None, "error": "无法解析的请求"})
+                    continue
+                if method == "subscribe":
+                    coro = self._stream(writer, request.get("id"), *params)
+                else:
+                    coro = self._dispatch(writer, request.get("id"), method, params, kwargs)
+                task = asyncio.ensure_future(coro)
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    @staticmethod
+    async def _send(writer, payload):
+        if writer.is_closing():
+            return
+        writer.write(_encode(payload))
+        try:
+            await writer.drain()
+        except OSError:
+            pass
+
+    async def _dispatch(self, writer, request_id, method, params, kwargs):
+        try:
+            if method in CONTROL_METHODS:
+                handler = getattr(self.sup, method)
+            else:
+                handler = getattr(self, f"rpc_{method}", None)
+                if handler is None:
+                    raise DaemonError(f"未知方法: {method}")
+            result = handler(*params, **kwargs)
+            if asyncio.iscoroutine(result):
+                result = await result
+            if isinstance(result, concurrent.futures.Future):
+                result = await asyncio.wrap_future(result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._send(writer, {"id": request_id, "error": f"{type(e).__name__}: {e}"})
+            return
+        await self._send(writer, {"id": request_id, "result": result})
+
+    async def _stream(self, writer, request_id, backlog=BACKLOG_SIZE):
+        """
+        先回放最近的事件，再持续推送新事件，直到连接断开
+        客户端读取过慢时丢弃事件（并插入提示），不让一个客户端拖住子进程输出
+        """
+        subscription = self.sup.subscribe(lossy=True)
+        try:
+            history = list(self.recent)[-backlog:] if backlog else []
+            await self._send(writer, {"id": request_id, "result": {"backlog": len(history)}})
+            if history:
+                await self._send(writer, {"events": history})
+            async for events in subscription:
+                await self._send(writer, {"events": events})
+                if writer.is_closing():
+                    break
+        finally:
+            subscription.close()
+
+    # ---------- 查询 ----------
+
+    def rpc_hello(self):
+        return {
+            "pid": os.getpid(),
+            "specs": [spec._asdict() for spec in self.sup.specs.values()],
+            "config_error": self.sup.config_error,
+            "env_profiles": [profile._asdict() for profile in self.sup.env_profiles.values()],
+        }
+
+    def rpc_snapshot(self):
+        return self.sup.snapshot()
+
+    def rpc_watching(self):
+        return bool(self.sup.watchers)
+
+    def rpc_sampler_interval(self):
+        return self.sup.sampler.interval
+
+    def rpc_sampler_latest(self, name):
+        return self.sup.sampler.latest(name)
+
+    def rpc_sampler_series(self, name, field):
+        return list(self.sup.sampler.series(name, field))
+
+    def rpc_runtime_stats(self):
+        stats = self.sup.runtime_stats
+        return {"interval": stats.interval, "error": stats.error, "growing": stats.growing(),
+                "count": len(stats.series), "latest": stats.series.latest()}
+
+    def rpc_runtime_series(self, field, last=None):
+        return self.sup.runtime_stats.series.values(field, last)
+
+    def rpc_route_table(self, window=None, sort="p95"):
+        return self.sup.route_stats.table(window, sort)
+
+    def rpc_route_total(self):
+        return self.sup.route_stats.total
+
+    def rpc_dashboard(self, services, window=None, sort="p95", points=60):
+        return self.sup.dashboard(services, window, sort, points)
+
+    async def rpc_log_search(self, query, limit=500):
+        regex = query.get("regex")
+        query = Query(query["terms"], [tuple(f) for f in query.get("fragments", ())], query["words"],
+                      query.get("service"), query.get("level"), re.compile(regex, re.IGNORECASE) if regex else None)
+        # 逐行判断可能较久，放到线程池中，不阻塞事件循环（日志写入与其他请求）
+        return await self.sup.loop.run_in_executor(None, self.sup.log_index.search, query, limit)
+
+    def rpc_log_count(self):
+        return len(self.sup.log_index)
+
+    def rpc_log_services(self):
+        return self.sup.log_store.services()
+
+    async def rpc_log_read(self, service, since, limit=200):
+        return await self.sup.loop.run_in_executor(None, self.sup.log_store.read_from, service, since, limit)
+
+    async def rpc_shutdown(self):
+        """停止所有服务并退出守护进程"""
+        await self.sup.stop_all_async()
+        # 先把响应发出去再退出
+        self.sup.loop.call_later(0.1, self.stopping.set)
+        return True
+
+
+def serve():
+    """在前台运行守护进程，直到收到 shutdown 请求或 SIGTERM/SIGINT"""
+    supervisor = Supervisor().start()
+    server = ControlServer(supervisor)
+    try:
+        supervisor.submit(server.start()).result()
+    except DaemonError as e:
+        supervisor.shutdown()
+        print(e, file=sys.stderr)
+        return 1
+
+    def request_stop(*_):
+        supervisor.loop.call_soon_threadsafe(server.stopping.set)
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    address = DAEMON_SOCKET if USE_UNIX_SOCKET else f"127.0.0.1:{DAEMON_PORT}"
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 守护进程已启动 (PID: {os.getpid()}, {address})", flush=True)
+    if supervisor.config_error:
+        print(supervisor.config_error, flush=True)
+    try:
+        waiter = supervisor.submit(server.stopping.wait())
+        while not waiter.done():
+            # 分段等待，让信号处理函数有机会执行
+            try:
+                waiter.result(timeout=0.5)
+            except concurrent.futures.TimeoutError:
+                pass
+    finally:
+        supervisor.submit(server.close()).result(5)
+        supervisor.shutdown()
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 守护进程已退出", flush=True)
+    return 0
+
+
+def spawn(timeout=START_TIMEOUT):
+    """在独立会话中启动守护进程（输出写入 .devcache/daemon.log），等待控制端口可连接"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    kwargs = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    with open(DAEMON_LOG, "ab") as log:
+        proc = subprocess.Popen([sys.executable, "-u", os.path.abspath(__file__), "serve"], cwd=PROJECT_ROOT,
+                                stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, **kwargs)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if running():
+            return proc.pid
+        if proc.poll() is not None:
+            raise DaemonError(f"守护进程启动失败 (退出码 {proc.returncode})，详见 {DAEMON_LOG}")
+        time.sleep(0.05)
+    raise DaemonError(f"守护进程未在 {timeout:g}s 内就绪，详见 {DAEMON_LOG}")
+
+
+# ---------- 客户端 ----------
+
+class RemoteSubscription:
+    """与 Subscription 相同的同步读取接口：drain / wait / close"""
+
+    def __init__(self, remote):
+        self._remote = remote
+        self._items = deque()
+        self._available = threading.Condition()
+        self.closed = False
+
+    def put(self, events):
+        with self._available:
+            self._items.extend(events)
+            self._available.notify_all()
+
+    def drain(self, limit=None):
+        with self._available:
+            if limit is None or limit >= len(self._items):
+                items = list(self._items)
+                self._items.clear()
+            else:
+                items = [self._items.popleft() for _ in range(limit)]
+        return items
+
+    def wait(self, timeout=None):
+        with self._available:
+            if not self._items and not self.closed:
+                self._available.wait(timeout)
+        return self.drain()
+
+    def close(self):
+        self._remote.unsubscribe(self)
+        with self._available:
+            self.closed = True
+            self._available.notify_all()
+
+
+class _RemoteService:
+    """守护进程中的一个服务；属性取自最近的快照"""
+
+    def __init__(self, remote, name):
+        self._remote = remote
+        self.name = name
+
+    def snapshot(self):
+        return self._remote.snapshot()[self.name]
+
+    @property
+    def running(self):
+        return self.snapshot()["pid"] is not None
+
+    def __getattr__(self, key):
+        info = self.snapshot()
+        if key in info:
+            return info[key]
+        raise AttributeError(key)
+
+
+class _RemoteSampler:
+    def __init__(self, remote):
+        self._remote = remote
+
+    @property
+    def interval(self):
+        return self._remote.query("sampler_interval")
+
+    def latest(self, name):
+        sample = self._remote.query("sampler_latest", name)
+        return Sample(*sample) if sample else None
+
+    def series(self, name, field):
+        return self._remote.query("sampler_series", name, field)
+
+
+class _RemoteSeries:
+    def __init__(self, remote):
+        self._remote = remote
+
+    def __len__(self):
+        return self._remote.query("runtime_stats")["count"]
+
+    def latest(self):
+        return self._remote.query("runtime_stats")["latest"]
+
+    def values(self, field, last=None):
+        return self._remote.query("runtime_series", field, last)
+
+
+class _RemoteRuntimeStats:
+    def __init__(self, remote):
+        self._remote = remote
+        self.series = _RemoteSeries(remote)
+
+    @property
+    def interval(self):
+        return self._remote.query("runtime_stats")["interval"]
+
+    @property
+    def error(self):
+        return self._remote.query("runtime_stats")["error"]
+
+    def growing(self):
+        return self._remote.query("runtime_stats")["growing"]
+
+
+class _RemoteRouteStats:
+    windows = WINDOWS
+
+    def __init__(self, remote):
+        self._remote = remote
+
+    @property
+    def total(self):
+        return self._remote.query("route_total")
+
+    def table(self, window=None, sort="p95"):
+        return [RouteRow(*row) for row in self._remote.query("route_table", window, sort)]
+
+
+class _RemoteLogIndex:
+    def __init__(self, remote):
+        self._remote = remote
+
+    def __len__(self):
+        return self._remote.request("log_count")
+
+    def search(self, query, limit=500):
+        payload = query._replace(regex=query.regex.pattern if query.regex else None)._asdict()
+        return [Match(*m) for m in self._remote.request("log_search", payload, limit)]
+
+
+class _RemoteLogStore:
+    def __init__(self, remote):
+        self._remote = remote
+
+    def services(self):
+        return self._remote.request("log_services")
+
+    def read_from(self, service, since, limit=200):
+        return self._remote.request("log_read", service, since, limit)
+
+
+class RemoteSupervisor:
+    """
+    守护进程的客户端，接口与 Supervisor 一致：控制方法立即返回 Future，不阻塞调用线程
+    shutdown 只断开连接，服务继续在守护进程中运行；stop_daemon 才会停止服务并退出守护进程
+    """
+
+    def __init__(self):
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._subs = []
+        self._stream_started = False
+        self._cache = {}
+        self._reader = None
+        self.daemon_pid = None
+        self.specs = {}
+        self.env_profiles = {}
+        self.config_error = None
+        self.sampler = _RemoteSampler(self)
+        self.runtime_stats = _RemoteRuntimeStats(self)
+        self.route_stats = _RemoteRouteStats(self)
+        self.log_index = _RemoteLogIndex(self)
+        self.log_store = _RemoteLogStore(self)
+        self.services = {}
+
+    def start(self):
+        """连接守护进程并读取服务清单"""
+        if self._sock is not None:
+            return self
+        try:
+            self._sock = _open_socket(timeout=2.0)
+        except OSError as e:
+            raise DaemonError(f"无法连接守护进程: {e}")
+        self._reader = threading.Thread(target=self._read_loop, name="daemon-client", daemon=True)
+        self._reader.start()
+        hello = self.request("hello")
+        self.daemon_pid = hello["pid"]
+        self.config_error = hello["config_error"]
+        self.specs = {spec["name"]: ServiceSpec(**spec) for spec in hello["specs"]}
+        self.env_profiles = {p["name"]: EnvProfile(**p) for p in hello["env_profiles"]}
+        self.services = {name: _RemoteService(self, name) for name in self.specs}
+        return self
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    # ---------- 收发 ----------
+
+    def call(self, method, *params, **kwargs):
+        """发送请求，返回 concurrent.futures.Future；参数与本地调用相同，可同时按位置和按名称传递"""
+        future = concurrent.futures.Future()
+        if self._sock is None:
+            future.set_exception(DaemonError("未连接守护进程"))
+            return future
+        request_id = next(self._ids)
+        self._pending[request_id] = future
+        try:
+            with self._send_lock:
+                request = {"id": request_id, "method": method, "params": list(params)}
+                if kwargs:
+                    request["kwargs"] = kwargs
+                self._sock.sendall(_encode(request))
+        except OSError as e:
+            self._pending.pop(request_id, None)
+            future.set_exception(DaemonError(f"与守护进程的连接已断开: {e}"))
+        return future
+
+    def request(self, method, *params, timeout=30.0):
+        return self.call(method, *params).result(timeout)
+
+    def query(self, method, *params):
+        """短时间内重复的查询直接使用缓存结果"""
+        key = (method, params)
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached is not None and now - cached[0] < QUERY_TTL:
+            return cached[1]
+        result = self.request(method, *params)
+        self._cache[key] = (now, result)
+        return result
+
+    def _read_loop(self):
+        stream = self._sock.makefile("rb")
+        try:
+            for line in stream:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if "events" in message:
+                    events = [Event(*e) for e in message["events"]]
+                    for sub in list(self._subs):
+                        sub.put(events)
+                    continue
+                future = self._pending.pop(message.get("id"), None)
+                if future is None:
+                    continue
+                if "error" in message:
+                    future.set_exception(DaemonError(message["error"]))
+                else:
+                    future.set_result(message.get("result"))
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._disconnected()
+
+    def _disconnected(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(DaemonError("与守护进程的连接已断开"))
+        for sub in list(self._subs):
+            sub.close()
+
+    # ---------- 与 Supervisor 相同的接口 ----------
+
+    def __getattr__(self, name):
+        if name in CONTROL_METHODS:
+            return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+        raise AttributeError(name)
+
+    def subscribe(self, maxsize=None):
+        sub = RemoteSubscription(self)
+        self._subs.append(sub)
+        if not self._stream_started:
+            self._stream_started = True
+            self.call("subscribe", BACKLOG_SIZE)
+        return sub
+
+    def unsubscribe(self, sub):
+        if sub in self._subs:
+            self._subs.remove(sub)
+
+    @property
+    def watchers(self):
+        return self.query("watching")
+
+    def snapshot(self):
+        info = self.query("snapshot")
+        for service_info in info.values():
+            if service_info.get("resources"):
+                service_info["resources"] = Sample(*service_info["resources"])
+            for member in (service_info.get("cluster") or {}).get("members", ()):
+                if member.get("resources"):
+                    member["resources"] = Sample(*member["resources"])
+        return info
+
+    def dashboard(self, services, window=None, sort="p95", points=60):
+        data = self.request("dashboard", list(services), window, sort, points)
+        for view in data["resources"].values():
+            if view["latest"]:
+                view["latest"] = Sample(*view["latest"])
+        data["routes"] = [RouteRow(*row) for row in data["routes"]]
+        return data
+
+    def shutdown(self, timeout=None):
+        """断开连接；守护进程及其中的服务继续运行"""
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._reader is not None:
+            self._reader.join(timeout=2)
+        self._disconnected()
+
+    def stop_daemon(self, timeout=60):
+        """停止所有服务并退出守护进程"""
+        try:
+            self.request("shutdown", timeout=timeout)
+        finally:
+            self.shutdown()
+
+
+def attach(autostart=True):
+    """连接正在运行的守护进程，没有时（autostart 为真）先在后台启动一个"""
+    if not running():
+        if not autostart:
+            raise DaemonError("守护进程未运行")
+        spawn()
+    return RemoteSupervisor().start()
+
+
+def main(argv):
+    command = argv[0] if argv else "status"
+    if command == "serve":
+        return serve()
+    if command == "start":
+        if running():
+            print("守护进程已在运行")
+            return 0
+        pid = spawn()
+        print(f"守护进程已启动 (PID: {pid})，日志: {DAEMON_LOG}")
+        return 0
+    if command == "stop":
+        if not running():
+            print("守护进程未运行")
+            return 0
+        RemoteSupervisor().start().stop_daemon()
+        print("守护进程已停止")
+        return 0
+    if command == "status":
+        if not running():
+            print("守护进程未运行")
+            return 1
+        remote = RemoteSupervisor().start()
+        try:
+            print(f"守护进程运行中 (PID: {remote.daemon_pid})")
+            for name, info in remote.snapshot().items():
+                state = f"运行中 (PID: {info['pid']})" if info["pid"] else info["state"]
+                print(f"  {name}: {state}")
+        finally:
+            remote.shutdown()
+        return 0
+    print("用法: python dev_daemon.py [serve|start|stop|status]")
+    return 2
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except DaemonError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 保存到生效耗时
+功能：以文件修改时间为保存时刻，关联后端重新编译后的就绪、生产包重建以及 Vite 的 HMR/整页刷新输出，
+      按检测、前端构建、编译、重启拆分每次“保存→生效”的耗时，记录历史并给出滚动 p50/p95
+"""
+
+import json
+import os
+import re
+import time
+from collections import deque, namedtuple
+
+from dev_build import CACHE_DIR, BACKEND_DIR
+from dev_startup import load_history
+
+HISTORY_FILE = os.path.join(CACHE_DIR, "edit_latency.jsonl")
+# 滚动统计的次数
+ROLLING = 50
+# 超过该时长的关联视为无关（如很久以前保存的文件被 git checkout 触发）
+MAX_LATENCY = 600
+WEB_DIR = os.path.join(BACKEND_DIR, "web")
+
+# Vite 输出（见 vite/src/node/server/hmr.ts），5.x 之后可能带 (client) 标签，重复的消息末尾带 (x2)
+HMR_RE = re.compile(r"\[vite\] (?:\(\w+\) )?(hmr update|page reload) (.+?)(?: \(x\d+\))?\s*$")
+ANSI_RE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+# 循环 -> 显示名
+LOOPS = {
+    "backend": "后端重新编译",
+    "bundle": "生产包重建",
+    "frontend": "Vite 重启",
+    "hmr": "Vite HMR",
+    "reload": "Vite 整页刷新",
+}
+# 阶段 -> 显示名
+EDIT_PHASES = {
+    "detect": "检测",
+    "bundle": "前端构建",
+    "compile": "编译",
+    "restart": "重启",
+}
+
+PendingEdit = namedtuple("PendingEdit", ["loop", "files", "saved", "detected"])
+
+
+def saved_time(paths, default):
+    """文件中最新的修改时间，即触发本次变化的保存时刻；文件都已删除时返回 default"""
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except OSError:
+            continue
+    return max(mtimes) if mtimes else default
+
+
+def parse_hmr(line):
+    """解析 Vite 的 HMR 输出，返回 (循环, [相对 web/ 的路径]) 或 None"""
+    if "[vite]" not in line:
+        return None
+    m = HMR_RE.search(ANSI_RE.sub("", line))
+    if not m:
+        return None
+    loop = "hmr" if m.group(1) == "hmr update" else "reload"
+    files = [p.strip().lstrip("/").split("?", 1)[0] for p in m.group(2).split(",")]
+    return loop, [f for f in files if f]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))]
+
+
+class EditTracker:
+    """
+    关联源码保存与服务重新生效；由事件循环线程调用
+    监听到的变化先挂起，服务下一次启动就绪时结算；启动失败时丢弃（修复编译错误的时间不计入）
+    """
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.pending = {}           # 服务名 -> [PendingEdit]
+        self.recent = {loop: deque(maxlen=ROLLING) for loop in LOOPS}
+        self._last_hmr = None
+        for entry in load_history(None, ROLLING * len(LOOPS), path):
+            if entry.get("loop") in self.recent:
+                self.recent[entry["loop"]].append(entry["total"])
+
+    def changed(self, service, loop, paths):
+        """监听器检测到变化，记录保存时刻；paths 为绝对路径"""
+        detected = time.time()
+        self.pending.setdefault(service, []).append(
+            PendingEdit(loop, [os.path.relpath(p, BACKEND_DIR) for p in paths],
+                        saved_time(paths, detected), detected))
+
+    def _take(self, service, timeline):
+        """取出在 timeline 开始之前检测到的变化（之后的留给下一次重启）"""
+        offset = time.time() - time.monotonic()
+        begin = timeline.marks["begin"] + offset
+        edits = self.pending.get(service, [])
+        taken = [e for e in edits if e.detected <= begin]
+        self.pending[service] = [e for e in edits if e.detected > begin]
+        return taken, offset
+
+    def abandon(self, service, timeline):
+        self._take(service, timeline)
+
+    def ready(self, service, timeline):
+        """服务启动就绪：结算挂起的变化，返回记录列表"""
+        taken, offset = self._take(service, timeline)
+        marks = timeline.marks
+        if not taken or "ready" not in marks:
+            return []
+        ready = marks["ready"] + offset
+        begin = marks["begin"] + offset
+        phases = {name: seconds for name, _, seconds in timeline.phases()}
+        records = []
+        for edit in taken:
+            total = ready - edit.saved
+            if not 0 <= total <= MAX_LATENCY:
+                continue
+            split = {
+                "detect": edit.detected - edit.saved,
+                "bundle": phases.get("bundle"),
+                "compile": phases.get("compile"),
+                # 停止旧进程 + 拉起新进程直到就绪
+                "restart": (begin - edit.detected) + (marks["ready"] - marks.get("built", marks["begin"])),
+            }
+            records.append(self._record(service, edit.loop, edit.files, edit.saved, total, split))
+        return records
+
+    def feed_vite(self, lines):
+        """扫描 Vite 输出中的 HMR/整页刷新，返回记录列表"""
+        records = []
+        for line in lines:
+            parsed = parse_hmr(line)
+            if parsed is None:
+                continue
+            loop, files = parsed
+            now = time.time()
+            saved = saved_time([os.path.join(WEB_DIR, f) for f in files], None)
+            # 同一次保存被 Vite 重复报告（x2）时只记一次
+            if saved is None or (files, saved) == self._last_hmr:
+                continue
+            self._last_hmr = (files, saved)
+            total = now - saved
+            if 0 <= total <= MAX_LATENCY:
+                records.append(self._record("frontend", loop, [os.path.join("web", f) for f in files],
+                                            saved, total, {}))
+        return records
+
+    def _record(self, service, loop, files, saved, total, phases):
+        self.recent[loop].append(total)
+        return {
+            "service": service, "loop": loop, "time": saved, "files": files,
+            "total": round(total, 3),
+            "phases": {k: round(max(v, 0.0), 3) for k, v in phases.items() if v is not None},
+        }
+
+    def rolling(self, loop):
+        """(次数, p50, p95)"""
+        values = list(self.recent[loop])
+        return len(values), percentile(values, 0.50), percentile(values, 0.95)
+
+    def save(self, records, revision=None):
+        """追加到历史；revision 为 (提交号, 是否有未提交改动)"""
+        if not records:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for record in records:
+                    if revision is not None:
+                        record = dict(record, commit=revision[0], dirty=revision[1])
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+
+def describe(record):
+    parts = [f"{EDIT_PHASES[k]} {v:.2f}s" for k, v in record["phases"].items() if k in EDIT_PHASES]
+    return f"保存→生效 {record['total']:.2f}s" + (f" ({' / '.join(parts)})" if parts else "")
+
+
+def summarize(entries):
+    """按循环汇总历史：{循环: (次数, p50, p95, {阶段: p50})}"""
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry.get("loop"), []).append(entry)
+    result = {}
+    for loop, items in groups.items():
+        totals = [e["total"] for e in items]
+        phases = {}
+        for name in EDIT_PHASES:
+            values = [e["phases"][name] for e in items if name in e.get("phases", {})]
+            if values:
+                phases[name] = percentile(values, 0.50)
+        result[loop] = (len(items), percentile(totals, 0.50), percentile(totals, 0.95), phases)
+    return result
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 后端环境配置
+功能：从 dev_profiles.toml 读取命名的后端配置（环境变量、系统设置、依赖服务），
+      供管理器切换配置重启后端，并对各配置依次运行同一压测做 A/B 对比
+"""
+
+import http.client
+import json
+import os
+from collections import namedtuple
+
+from dev_services import tomllib
+from dev_runtimestats import ACCESS_TOKEN_ENV, USER_ID_ENV
+
+PROFILES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dev_profiles.toml")
+DEFAULT_PROFILE = "default"
+OPTION_PATH = "/api/option/"
+
+EnvProfile = namedtuple("EnvProfile", [
+    "name", "description",
+    "env",          # 附加给后端的环境变量
+    "options",      # 后端就绪后通过 /api/option/ 写入的系统设置（保存在数据库中）
+    "services",     # 启动后端前需要先启动的服务（如 redis）
+])
+
+DEFAULT_PROFILES = {
+    DEFAULT_PROFILE: EnvProfile(DEFAULT_PROFILE, "不附加任何设置", {}, {}, ()),
+}
+
+
+class EnvProfileError(Exception):
+    pass
+
+
+def _parse_profile(name, table):
+    if not isinstance(table, dict):
+        raise EnvProfileError(f"{name}: 应为表 [profiles.{name}]")
+    env = table.get("env", {})
+    options = table.get("options", {})
+    if not isinstance(env, dict) or not isinstance(options, dict):
+        raise EnvProfileError(f"{name}: env 与 options 应为表")
+    services = table.get("services", ())
+    if isinstance(services, str) or not all(isinstance(s, str) for s in services):
+        raise EnvProfileError(f"{name}: services 应为服务名列表")
+    return EnvProfile(
+        name, str(table.get("description", "")),
+        {str(k): os.path.expandvars(str(v)) for k, v in env.items()},
+        {str(k): v for k, v in options.items()},
+        tuple(services))
+
+
+def load_profiles(path=PROFILES_FILE):
+    """读取环境配置，返回 {配置名: EnvProfile}；文件不存在时只有 default"""
+    profiles = {}
+    if os.path.exists(path):
+        if tomllib is None:
+            raise EnvProfileError("读取环境配置需要 Python 3.11+ 或 pip install tomli")
+        try:
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        except (OSError, tomllib.TOMLDecodeError) as e:
+            raise EnvProfileError(f"{os.path.basename(path)}: {e}")
+        for name, table in data.get("profiles", {}).items():
+            profiles[name] = _parse_profile(name, table)
+    for name, profile in DEFAULT_PROFILES.items():
+        profiles.setdefault(name, profile)
+    return profiles
+
+
+def describe(profile):
+    parts = [f"{k}={v}" for k, v in profile.env.items()]
+    parts += [f"{k}={json.dumps(v, ensure_ascii=False)}" for k, v in profile.options.items()]
+    if profile.services:
+        parts.append(f"依赖 {', '.join(profile.services)}")
+    return "  ".join(parts) or "(无)"
+
+
+# ---------- 系统设置 ----------
+
+def _option_request(port, method, body=None, timeout=5.0):
+    token = os.environ.get(ACCESS_TOKEN_ENV, "")
+    if not token:
+        raise EnvProfileError(f"写入系统设置需要设置环境变量 {ACCESS_TOKEN_ENV}")
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request(method, OPTION_PATH, body=json.dumps(body) if body is not None else None, headers={
+            "Authorization": token,
+            "New-Api-User": os.environ.get(USER_ID_ENV, "1"),
+            "Content-Type": "application/json",
+        })
+        response = conn.getresponse()
+        payload = json.loads(response.read() or b"{}")
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        raise EnvProfileError(f"请求 {OPTION_PATH} 失败: {e}")
+    finally:
+        conn.close()
+    if not payload.get("success"):
+        raise EnvProfileError(payload.get("message") or f"HTTP {response.status}")
+    return payload.get("data")
+
+
+def read_options(port, keys):
+    """读取系统设置的当前值（字符串），不存在的键省略"""
+    values = {item["key"]: item["value"] for item in _option_request(port, "GET") or ()}
+    return {k: values[k] for k in keys if k in values}
+
+
+def write_options(port, options):
+    for key, value in options.items():
+        _option_request(port, "PUT", {"key": key, "value": value})
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 后端飞行记录
+功能：在内存中保留后端最近的输出，进程异常退出、无响应、资源超限或延迟突增时
+      把输出、goroutine 栈、pprof profile、/proc 状态与资源序列保存为现场包，并给出自动重启的退避间隔
+"""
+
+import json
+import os
+import shutil
+import sys
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+from dev_build import CACHE_DIR
+
+FLIGHT_ROOT = os.path.join(CACHE_DIR, "flight")
+# 保留最近多少秒的输出，行数另设上限防止刷屏时占用过多内存
+RECORD_WINDOW = 120
+MAX_LINES = 50000
+KEEP_BUNDLES = 20
+# 巡检间隔；连续 STALL_PROBES 次探测超时视为无响应
+WATCH_INTERVAL = 5.0
+PROBE_TIMEOUT = 5.0
+STALL_PROBES = 3
+# 同一类触发的最短间隔，避免持续超限时反复保存
+COOLDOWN = 300
+# SIGQUIT 后等待 Go 运行时打印完 goroutine 栈并退出
+DUMP_TIMEOUT = 5.0
+# 开启 pprof 时随现场包采集的 CPU profile 时长
+CPU_PROFILE_SECONDS = 5
+# 自动重启的退避：BACKOFF_BASE * 2^(n-1)，最长 BACKOFF_MAX；稳定运行 BACKOFF_RESET 秒后清零
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 120.0
+BACKOFF_RESET = 300.0
+# 延迟突增只看请求数足够的路由，避免偶发的单个慢请求触发
+LATENCY_WINDOW = 60
+LATENCY_MIN_REQUESTS = 20
+
+Thresholds = namedtuple("Thresholds", [
+    "rss_mb",       # 后端进程树 RSS（MB）
+    "goroutines",   # goroutine 数（来自 /api/performance/stats）
+    "p99_ms",       # 任一路由 LATENCY_WINDOW 内的 p99（毫秒）
+])
+DEFAULT_THRESHOLDS = Thresholds(2048, 10000, 5000)
+
+# 触发类型 -> 显示名
+TRIGGERS = {
+    "exit": "异常退出",
+    "probe": "启动超时",
+    "stall": "无响应",
+    "rss": "内存超限",
+    "goroutines": "Goroutine 超限",
+    "latency": "延迟突增",
+    "manual": "手动保存",
+}
+# 进程已无法继续服务的触发，可以用 SIGQUIT 取 goroutine 栈（Go 运行时打印后退出）；
+# 启动超时可能只是迁移较慢，只在开启自动重启时才这样做
+FATAL_TRIGGERS = ("stall",)
+# /proc/<pid> 下保存的文件
+PROC_FILES = ("status", "stat", "io", "limits", "smaps_rollup", "wchan", "cmdline")
+SYSTEM_FILES = ("loadavg", "meminfo", "pressure/cpu", "pressure/memory", "pressure/io")
+
+
+class FlightRecorder:
+    """最近输出的环形缓冲与触发状态；由事件循环线程写入"""
+
+    def __init__(self, window=RECORD_WINDOW, max_lines=MAX_LINES):
+        self.window = window
+        self.lines = deque(maxlen=max_lines)   # (时间, 来源, 行)
+        self.enabled = True
+        self.auto_restart = False
+        self.thresholds = DEFAULT_THRESHOLDS
+        self.failures = 0           # 连续自动重启次数，决定下一次退避
+        self.last_bundle = None
+        self._fired = {}            # 触发类型 -> 上次保存时间
+
+    def feed(self, source, lines, now=None):
+        now = time.time() if now is None else now
+        self.lines.extend((now, source, line.rstrip("\r")) for line in lines)
+        expired = now - self.window
+        while self.lines and self.lines[0][0] < expired:
+            self.lines.popleft()
+
+    def since(self, ts):
+        return [entry for entry in list(self.lines) if entry[0] >= ts]
+
+    def allow(self, trigger, now=None):
+        """是否应保存现场：手动保存总是允许，其余受开关与冷却时间限制"""
+        now = time.time() if now is None else now
+        if trigger != "manual":
+            if not self.enabled or now - self._fired.get(trigger, 0) < COOLDOWN:
+                return False
+        self._fired[trigger] = now
+        return True
+
+    def check(self, sample=None, runtime=None, routes=()):
+        """按阈值检查最新的资源采样、运行时统计与路由延迟，返回 [(触发类型, 说明)]"""
+        limits = self.thresholds
+        hits = []
+        if sample is not None and limits.rss_mb and sample.rss > limits.rss_mb * 1024 * 1024:
+            hits.append(("rss", f"RSS {sample.rss / 1024 / 1024:.0f}MB > {limits.rss_mb}MB"))
+        if runtime and limits.goroutines and runtime.get("goroutines", 0) > limits.goroutines:
+            hits.append(("goroutines", f"goroutine {runtime['goroutines']:.0f} > {limits.goroutines}"))
+        if limits.p99_ms:
+            slow = [r for r in routes if r.count >= LATENCY_MIN_REQUESTS and r.p99 * 1000 > limits.p99_ms]
+            if slow:
+                worst = max(slow, key=lambda r: r.p99)
+                hits.append(("latency", f"{worst.method} {worst.route} p99 {worst.p99 * 1000:.0f}ms "
+                                        f"> {limits.p99_ms}ms"))
+        return hits
+
+    def next_backoff(self):
+        self.failures += 1
+        return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1))
+
+    def settings(self):
+        return {"enabled": self.enabled, "auto_restart": self.auto_restart,
+                "thresholds": self.thresholds._asdict(), "failures": self.failures,
+                "last_bundle": self.last_bundle}
+
+
+def parse_thresholds(pairs, current=DEFAULT_THRESHOLDS):
+    """解析 rss=2048 goroutines=10000 p99=5000，0 表示不检查该项；格式有误时抛出 ValueError"""
+    aliases = {"rss": "rss_mb", "p99": "p99_ms"}
+    values = current._asdict()
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        key = aliases.get(key, key)
+        if not sep or key not in values:
+            raise ValueError(f"无法识别: {pair}（可设置: rss, goroutines, p99）")
+        if not value.isdigit():
+            raise ValueError(f"{pair}: 应为非负整数")
+        values[key] = int(value)
+    return Thresholds(**values)
+
+
+# ---------- 现场 ----------
+
+def _read_text(path, limit=1 << 20):
+    try:
+        with open(path, "rb") as f:
+            return f.read(limit).replace(b"\0", b" ").decode("utf-8", "replace").rstrip()
+    except OSError as e:
+        return f"({e.strerror or e})"
+
+
+def proc_snapshot(pids):
+    """各进程与系统的 /proc 状态，返回文本；没有 /proc 时返回 None"""
+    if not (sys.platform.startswith("linux") and os.path.isdir("/proc")):
+        return None
+    sections = []
+    for name in SYSTEM_FILES:
+        if os.path.exists(f"/proc/{name}"):
+            sections.append(f"==> /proc/{name} <==\n{_read_text(f'/proc/{name}')}")
+    for pid in pids:
+        for name in PROC_FILES:
+            sections.append(f"==> /proc/{pid}/{name} <==\n{_read_text(f'/proc/{pid}/{name}')}")
+        try:
+            fds = len(os.listdir(f"/proc/{pid}/fd"))
+        except OSError as e:
+            fds = f"({e.strerror or e})"
+        sections.append(f"==> /proc/{pid}/fd <==\n{fds}")
+    return "\n\n".join(sections) + "\n"
+
+
+def _format_lines(entries):
+    return "".join(f"{datetime.fromtimestamp(t).strftime('%H:%M:%S.%f')[:-3]} [{source}] {line}\n"
+                   for t, source, line in entries)
+
+
+def write_bundle(meta, lines, metrics, proc_text=None, goroutines=None, pprof_dir=None):
+    """
+    写入现场包，返回目录；目录名为 <时间>-<触发类型>
+      output.log      最近 RECORD_WINDOW 秒的后端输出
+      goroutines.txt  goroutine 栈（pprof debug=2 或 SIGQUIT 输出）
+      metrics.json    资源采样、运行时统计与路由延迟
+      proc.txt        /proc 状态
+      *.pb.gz         随现场采集的 pprof profile（同时保留在 pprof 归档中）
+    """
+    stamp = datetime.fromtimestamp(meta["time"]).strftime("%Y%m%d-%H%M%S")
+    base = directory = os.path.join(FLIGHT_ROOT, f"{stamp}-{meta['trigger']}")
+    n = 1
+    while os.path.exists(directory):
+        n += 1
+        directory = f"{base}-{n}"
+    os.makedirs(directory)
+    files = []
+
+    def save(name, text):
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(text)
+        files.append(name)
+
+    save("output.log", _format_lines(lines))
+    if goroutines:
+        save("goroutines.txt", goroutines if isinstance(goroutines, str) else _format_lines(goroutines))
+    save("metrics.json", json.dumps(metrics, ensure_ascii=False, indent=1))
+    if proc_text:
+        save("proc.txt", proc_text)
+    if pprof_dir:
+        for name in sorted(os.listdir(pprof_dir)):
+            if name.endswith(".pb.gz"):
+                shutil.copy2(os.path.join(pprof_dir, name), directory)
+                files.append(name)
+        meta["pprof"] = os.path.basename(pprof_dir)
+    meta["files"] = files
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    _prune_bundles()
+    return directory
+
+
+def _prune_bundles():
+    for name, _ in list_bundles()[KEEP_BUNDLES:]:
+        shutil.rmtree(os.path.join(FLIGHT_ROOT, name), ignore_errors=True)
+
+
+def list_bundles():
+    """按时间从新到旧返回 [(目录名, meta)]"""
+    try:
+        names = sorted(os.listdir(FLIGHT_ROOT), reverse=True)
+    except OSError:
+        return []
+    bundles = []
+    for name in names:
+        try:
+            with open(os.path.join(FLIGHT_ROOT, name, "meta.json"), encoding="utf-8") as f:
+                bundles.append((name, json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return bundles
+
+
+def describe(name, meta):
+    stamp = datetime.fromtimestamp(meta["time"]).strftime("%m-%d %H:%M:%S")
+    dirty = "*" if meta.get("dirty") else ""
+    label = TRIGGERS.get(meta["trigger"], meta["trigger"])
+    return f"{stamp}  {meta.get('commit', '?')}{dirty}  {label}  {meta.get('detail', '')}  [{', '.join(meta['files'])}]"
@@ -5,42 +5,140 @@ NEW_API 开发环境 GUI 启动器
 功能：图形界面管理前端和后端服务
 """
 
-import subprocess
-import threading
+import concurrent.futures
 import os
 import sys
+import re
+import threading
+import time
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 from datetime import datetime
+from collections import deque
 import queue
 
-# 项目路径配置
-PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
-BACKEND_DIR = os.path.join(PROJECT_ROOT, "new-api")
-FRONTEND_DIR = os.path.join(PROJECT_ROOT, "new-api", "web")
+from dev_supervisor import Supervisor, ANSI_RE, PROJECT_ROOT, BACKEND_PORT, FRONTEND_PORT, CLUSTER_MAX
+from dev_proxy import BALANCE_POLICIES
+from dev_envprofiles import DEFAULT_PROFILE
+from dev_daemon import attach, DaemonError
+from dev_logindex import build_query, match_line, classify, display_text
+from dev_procstat import format_bytes
+from dev_runtimestats import METRICS, format_metric
+from dev_routestats import WINDOWS as ROUTE_WINDOWS, format_latency
+from dev_pprof import DEFAULT_WINDOW, ProfileError, list_captures, resolve, diff as profile_diff
+
+# 日志面板：环形缓冲保留最近的日志行，文本框只渲染末尾部分
+LOG_CAPACITY = 100000
+LOG_VIEW_LINES = 5000
+LOG_TICK_MS = 100
+
+# 日志检索选项（显示名 -> 查询值）
+SEARCH_SERVICES = {"全部服务": None, "后端": "backend", "前端": "frontend", "管理器": "launcher"}
+SEARCH_LEVELS = {"全部级别": None, "错误": "error", "系统": "system", "输出": "output"}
+SEARCH_LIMIT = 2000
+SEARCH_DELAY_MS = 250
+
+# 资源趋势图：刷新周期、显示的采样点数与尺寸
+RESOURCE_TICK_MS = 1000
+# 后台线程执行查询（守护进程模式下为 RPC）时，界面线程检查结果的间隔
+JOB_POLL_MS = 50
+SPARK_POINTS = 60
+SPARK_WIDTH = 120
+SPARK_HEIGHT = 24
+# 后端运行时统计面板展示的指标
+RUNTIME_CHARTS = ("goroutines", "heap_alloc", "disk_cache_files", "disk_cache_bytes")
+# 路由延迟表：列名 -> (表头, 宽度)；点击表头切换排序列
+ROUTE_COLUMNS = {
+    "method": ("方法", 60),
+    "route": ("路由", 280),
+    "count": ("请求数", 70),
+    "rate": ("req/s", 70),
+    "error_rate": ("5xx", 60),
+    "p50": ("p50", 80),
+    "p95": ("p95", 80),
+    "p99": ("p99", 80),
+    "max": ("max", 80),
+}
+ROUTE_ROWS = 6
+
+# 服务状态显示
+STATE_TEXT = {
+    "starting": "启动中",
+    "running": "运行中",
+    "stopping": "停止中",
+    "stopped": "已停止",
+}
 
 class DevLauncherGUI:
-    def __init__(self, root):
+    def __init__(self, root, local=False):
         self.root = root
         self.root.title("NEW_API 开发环境启动器")
-        self.root.geometry("900x600")
+        self.root.geometry("1100x860")
         self.root.minsize(800, 500)
 
-        # 进程存储
-        self.processes = {
-            "backend": None,
-            "frontend": None
-        }
-
-        # 日志队列
+        # 进程管理核心，界面只订阅其事件流；默认连接守护进程，关闭窗口后服务继续运行
+        self.remote = False
+        attach_error = None
+        if local:
+            self.supervisor = Supervisor().start()
+        else:
+            try:
+                self.supervisor = attach()
+                self.remote = True
+            except DaemonError as e:
+                attach_error = f"{e}，改为在当前进程中管理服务"
+                self.supervisor = Supervisor().start()
+        self.subscription = self.supervisor.subscribe()
+
+        # 日志队列及环形缓冲
         self.log_queue = queue.Queue()
+        self.log_lines = deque(maxlen=LOG_CAPACITY)
 
         # 状态变量
         self.backend_status = tk.StringVar(value="已停止")
         self.frontend_status = tk.StringVar(value="已停止")
+        self.auto_restart = tk.BooleanVar(value=False)
+        self.blue_green = tk.BooleanVar(value=False)
+        self.bundle = tk.BooleanVar(value=False)
+        self.mock_upstream = tk.BooleanVar(value=False)
+        self.profiling = tk.BooleanVar(value=False)
+        self.flight_restart = tk.BooleanVar(value=False)
+        self.cluster_size = tk.IntVar(value=1)
+        self.cluster_balance = tk.StringVar(value=BALANCE_POLICIES[0])
+        self.cluster_info = tk.StringVar()
+        self.env_profile = tk.StringVar(value=DEFAULT_PROFILE)
+
+        # 日志检索
+        self.search_text = tk.StringVar()
+        self.search_regex = tk.StringVar()
+        self.search_service = tk.StringVar(value="全部服务")
+        self.search_level = tk.StringVar(value="全部级别")
+        self.search_info = tk.StringVar()
+        self.active_query = None
+        self.search_job = None
+        self.search_pending = None
+
+        # 资源占用（服务名 -> (文字, 趋势图画布)）
+        self.resource_views = {}
+        self.runtime_views = {}
+        self.runtime_info = tk.StringVar()
+
+        # 路由延迟
+        self.route_window = tk.StringVar(value=f"{ROUTE_WINDOWS[0]}s")
+        self.route_sort = "p95"
+        self.route_info = tk.StringVar()
+        self.dashboard_job = None
 
         self.setup_ui()
+        if attach_error:
+            self.log(attach_error, "error")
+        if self.supervisor.config_error:
+            self.log(self.supervisor.config_error, "error")
+        if self.remote:
+            self.log(f"已连接守护进程 (PID: {self.supervisor.daemon_pid})，关闭窗口后服务继续运行", "system")
+            self.sync_options()
         self.process_log_queue()
+        self.refresh_resources()
 
     def setup_ui(self):
         # 主框架
@@ -59,7 +157,7 @@ class DevLauncherGUI:
         backend_frame = ttk.Frame(control_frame)
         backend_frame.pack(fill=tk.X, pady=5)
 
-        ttk.Label(backend_frame, text="后端服务 (Go:3050)", width=20).pack(side=tk.LEFT)
+        ttk.Label(backend_frame, text=f"后端服务 (Go:{BACKEND_PORT})", width=20).pack(side=tk.LEFT)
         self.backend_status_label = ttk.Label(backend_frame, textvariable=self.backend_status, width=10)
         self.backend_status_label.pack(side=tk.LEFT, padx=10)
 
@@ -71,12 +169,13 @@ class DevLauncherGUI:
 
         self.btn_backend_restart = ttk.Button(backend_frame, text="重启", command=self.restart_backend, width=8)
         self.btn_backend_restart.pack(side=tk.LEFT, padx=2)
+        self.add_resource_view(backend_frame, "backend")
 
         # 前端控制
         frontend_frame = ttk.Frame(control_frame)
         frontend_frame.pack(fill=tk.X, pady=5)
 
-        ttk.Label(frontend_frame, text="前端服务 (Vite:5173)", width=20).pack(side=tk.LEFT)
+        ttk.Label(frontend_frame, text=f"前端服务 (Vite:{FRONTEND_PORT})", width=20).pack(side=tk.LEFT)
         self.frontend_status_label = ttk.Label(frontend_frame, textvariable=self.frontend_status, width=10)
         self.frontend_status_label.pack(side=tk.LEFT, padx=10)
 
@@ -88,6 +187,7 @@ class DevLauncherGUI:
 
         self.btn_frontend_restart = ttk.Button(frontend_frame, text="重启", command=self.restart_frontend, width=8)
         self.btn_frontend_restart.pack(side=tk.LEFT, padx=2)
+        self.add_resource_view(frontend_frame, "frontend")
 
         # 快捷操作
         quick_frame = ttk.Frame(control_frame)
@@ -99,11 +199,111 @@ class DevLauncherGUI:
         ttk.Button(quick_frame, text="强制清理", command=self.force_kill_all, width=12).pack(side=tk.LEFT, padx=5)
         ttk.Button(quick_frame, text="清空日志", command=self.clear_logs, width=12).pack(side=tk.LEFT, padx=5)
         ttk.Button(quick_frame, text="打开浏览器", command=self.open_browser, width=12).pack(side=tk.LEFT, padx=5)
+        if self.remote:
+            ttk.Button(quick_frame, text="停止守护进程", command=self.stop_daemon,
+                       width=12).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(quick_frame, text="自动重启", variable=self.auto_restart,
+                        command=self.toggle_watch).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(quick_frame, text="无缝重启", variable=self.blue_green,
+                        command=self.toggle_blue_green).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(quick_frame, text="生产包", variable=self.bundle,
+                        command=self.toggle_bundle).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(quick_frame, text="模拟上游", variable=self.mock_upstream,
+                        command=self.toggle_mock).pack(side=tk.LEFT, padx=5)
+
+        # 性能剖析
+        profile_frame = ttk.Frame(control_frame)
+        profile_frame.pack(fill=tk.X, pady=(5, 0))
+        ttk.Checkbutton(profile_frame, text="性能剖析 (pprof)", variable=self.profiling,
+                        command=self.toggle_profiling).pack(side=tk.LEFT, padx=5)
+        ttk.Button(profile_frame, text=f"采集 {DEFAULT_WINDOW}s Profile", command=self.capture_profiles,
+                   width=16).pack(side=tk.LEFT, padx=5)
+        ttk.Button(profile_frame, text="对比最近两次", command=self.diff_profiles,
+                   width=14).pack(side=tk.LEFT, padx=5)
+
+        # 飞行记录
+        ttk.Separator(profile_frame, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=10)
+        ttk.Button(profile_frame, text="保存现场", command=self.capture_flight,
+                   width=10).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(profile_frame, text="异常后自动重启", variable=self.flight_restart,
+                        command=self.toggle_flight_restart).pack(side=tk.LEFT, padx=5)
+
+        # 环境配置
+        ttk.Separator(profile_frame, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=10)
+        ttk.Label(profile_frame, text="环境配置:").pack(side=tk.LEFT)
+        env_combo = ttk.Combobox(profile_frame, textvariable=self.env_profile,
+                                 values=list(self.supervisor.env_profiles), state="readonly", width=14)
+        env_combo.pack(side=tk.LEFT, padx=5)
+        env_combo.bind("<<ComboboxSelected>>", lambda e: self.apply_env_profile())
+
+        # 集群模式
+        ttk.Separator(profile_frame, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=10)
+        ttk.Label(profile_frame, text="后端实例:").pack(side=tk.LEFT)
+        ttk.Spinbox(profile_frame, from_=1, to=CLUSTER_MAX, textvariable=self.cluster_size,
+                    width=4).pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(profile_frame, textvariable=self.cluster_balance, values=BALANCE_POLICIES,
+                     state="readonly", width=12).pack(side=tk.LEFT, padx=5)
+        ttk.Button(profile_frame, text="应用", command=self.apply_cluster, width=6).pack(side=tk.LEFT, padx=5)
+        ttk.Label(profile_frame, textvariable=self.cluster_info, foreground="gray").pack(side=tk.LEFT, padx=5)
+
+        # 后端运行时统计
+        runtime_frame = ttk.LabelFrame(main_frame, text="后端运行时", padding="5")
+        runtime_frame.pack(fill=tk.X, pady=(0, 10))
+        for name in RUNTIME_CHARTS:
+            text = tk.StringVar()
+            label = ttk.Label(runtime_frame, textvariable=text, width=18)
+            label.pack(side=tk.LEFT, padx=(5, 2))
+            canvas = tk.Canvas(runtime_frame, width=SPARK_WIDTH, height=SPARK_HEIGHT, bg="#1e1e1e",
+                               highlightthickness=0)
+            canvas.pack(side=tk.LEFT, padx=(0, 5))
+            self.runtime_views[name] = (text, label, canvas)
+        ttk.Label(runtime_frame, textvariable=self.runtime_info, foreground="gray").pack(side=tk.LEFT, padx=5)
+
+        # 后端路由延迟（由访问日志统计）
+        route_frame = ttk.LabelFrame(main_frame, text="路由延迟", padding="5")
+        route_frame.pack(fill=tk.X, pady=(0, 10))
+        route_bar = ttk.Frame(route_frame)
+        route_bar.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(route_bar, text="窗口").pack(side=tk.LEFT)
+        ttk.Combobox(route_bar, textvariable=self.route_window, values=[f"{w}s" for w in ROUTE_WINDOWS],
+                     state="readonly", width=6).pack(side=tk.LEFT, padx=5)
+        ttk.Label(route_bar, textvariable=self.route_info, foreground="gray").pack(side=tk.LEFT, padx=5)
+        self.route_tree = ttk.Treeview(route_frame, columns=list(ROUTE_COLUMNS), show="headings",
+                                       height=ROUTE_ROWS)
+        for column, (heading, width) in ROUTE_COLUMNS.items():
+            self.route_tree.heading(column, text=heading, command=lambda c=column: self.sort_routes(c))
+            self.route_tree.column(column, width=width, stretch=column == "route",
+                                   anchor=tk.W if column in ("method", "route") else tk.E)
+        self.route_tree.tag_configure("error", foreground="#C62828")
+        self.route_tree.pack(fill=tk.X)
+        self.sort_routes(self.route_sort)
 
         # 日志区域
         log_frame = ttk.LabelFrame(main_frame, text="运行日志", padding="5")
         log_frame.pack(fill=tk.BOTH, expand=True)
 
+        # 检索栏
+        search_frame = ttk.Frame(log_frame)
+        search_frame.pack(fill=tk.X, pady=(0, 5))
+
+        ttk.Label(search_frame, text="关键字").pack(side=tk.LEFT)
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_text, width=24)
+        search_entry.pack(side=tk.LEFT, padx=(2, 8))
+        ttk.Label(search_frame, text="正则").pack(side=tk.LEFT)
+        regex_entry = ttk.Entry(search_frame, textvariable=self.search_regex, width=16)
+        regex_entry.pack(side=tk.LEFT, padx=(2, 8))
+        for variable, values in ((self.search_service, SEARCH_SERVICES), (self.search_level, SEARCH_LEVELS)):
+            combo = ttk.Combobox(search_frame, textvariable=variable, values=list(values),
+                                 state="readonly", width=8)
+            combo.pack(side=tk.LEFT, padx=2)
+            combo.bind("<<ComboboxSelected>>", lambda e: self.schedule_search())
+        ttk.Button(search_frame, text="清除", command=self.clear_search, width=6).pack(side=tk.LEFT, padx=5)
+        ttk.Label(search_frame, textvariable=self.search_info).pack(side=tk.LEFT, padx=5)
+        for entry in (search_entry, regex_entry):
+            entry.bind("<KeyRelease>", lambda e: self.schedule_search())
+            entry.bind("<Return>", lambda e: self.run_search())
+            entry.bind("<Escape>", lambda e: self.clear_search())
+
         # 日志文本框
         self.log_text = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, font=("Consolas", 9))
         self.log_text.pack(fill=tk.BOTH, expand=True)
@@ -129,221 +329,423 @@ class DevLauncherGUI:
         self.log_queue.put((f"[{timestamp}] {message}\n", tag))
 
     def process_log_queue(self):
+        query = self.active_query
+        batch, visible = [], []
         try:
             while True:
-                message, tag = self.log_queue.get_nowait()
-                self.log_text.insert(tk.END, message, tag)
-                self.log_text.see(tk.END)
+                item = self.log_queue.get_nowait()
+                batch.append(item)
+                if query is not None and match_line(query, "launcher", item[1], item[0]):
+                    visible.append(item)
         except queue.Empty:
             pass
-        self.root.after(100, self.process_log_queue)
+        for event in self.subscription.drain():
+            if event.kind == "output":
+                # 清理 ANSI 转义序列
+                item = (f"[{event.source}] {ANSI_RE.sub('', event.text)}\n", event.service)
+            elif event.kind == "message":
+                timestamp = datetime.fromtimestamp(event.time).strftime("%H:%M:%S")
+                item = (f"[{timestamp}] {event.text}\n", event.level)
+            else:
+                if event.kind == "status":
+                    self.update_status(event.service, event.text)
+                continue
+            batch.append(item)
+            # 检索模式下只追加满足条件的新日志
+            if query is not None and match_line(query, event.service or "launcher",
+                                                classify(event), display_text(event)):
+                visible.append(item)
+        if batch:
+            self.log_lines.extend(batch)
+        if query is None and batch:
+            self.render_logs(batch)
+        elif visible:
+            self.render_logs(visible)
+        self.root.after(LOG_TICK_MS, self.process_log_queue)
+
+    def render_logs(self, batch):
+        """把一批日志合并为一次插入，并裁剪超出显示上限的旧行"""
+        if len(batch) >= LOG_VIEW_LINES:
+            batch = batch[-LOG_VIEW_LINES:]
+            self.log_text.delete("1.0", tk.END)
+        # 只有停留在底部时才自动滚动，方便向上翻看
+        follow = self.log_text.yview()[1] >= 0.999
+
+        args, chunk, chunk_tag = [], [], None
+        for message, tag in batch:
+            if tag != chunk_tag and chunk:
+                args += ["".join(chunk), chunk_tag]
+                chunk = []
+            chunk_tag = tag
+            chunk.append(message)
+        args += ["".join(chunk), chunk_tag]
+        self.log_text.insert(tk.END, *args)
+
+        lines = int(self.log_text.index("end-1c").split(".")[0])
+        if lines > LOG_VIEW_LINES:
+            self.log_text.delete("1.0", f"{lines - LOG_VIEW_LINES + 1}.0")
+        if follow:
+            self.log_text.see(tk.END)
+
+    def schedule_search(self):
+        """输入停顿后再检索，避免每个按键都查询一次"""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY_MS, self.run_search)
+
+    def run_search(self):
+        """检索在后台线程中进行，结果回到界面线程显示；输入变化后，之前未返回的检索结果被丢弃"""
+        self.search_job = None
+        text = self.search_text.get().strip()
+        regex = self.search_regex.get().strip()
+        service = SEARCH_SERVICES.get(self.search_service.get())
+        level = SEARCH_LEVELS.get(self.search_level.get())
+        if not (text or regex or service or level):
+            self.clear_search()
+            return
+        try:
+            query = build_query(text, service, level, regex)
+        except re.error as e:
+            self.search_info.set(f"正则错误: {e}")
+            return
+        log_index = self.supervisor.log_index
+
+        def search():
+            start = time.perf_counter()
+            matches = log_index.search(query, SEARCH_LIMIT)
+            return matches, len(log_index), (time.perf_counter() - start) * 1000
 
-    def stream_output(self, process, name, tag):
-        """实时读取进程输出并显示到日志"""
+        job = self.search_pending = self.in_background(search)
+        self.when_done(job, self.show_search, query)
+
+    def show_search(self, job, query):
+        if job is not self.search_pending:
+            return
+        self.search_pending = None
         try:
-            while process.poll() is None:
-                line = process.stdout.readline()
-                if line:
-                    # 清理 ANSI 转义序列
-                    import re
-                    clean_line = re.sub(r'\x1b\[[0-9;]*m', '', line)
-                    self.log_queue.put((f"[{name}] {clean_line}", tag))
-            # 读取剩余输出
-            remaining = process.stdout.read()
-            if remaining:
-                import re
-                for line in remaining.splitlines():
-                    clean_line = re.sub(r'\x1b\[[0-9;]*m', '', line)
-                    self.log_queue.put((f"[{name}] {clean_line}\n", tag))
-        except Exception as e:
-            self.log_queue.put((f"[{name}] 日志读取错误: {e}\n", "error"))
-
-    def update_status(self, service, running):
-        if service == "backend":
-            if running:
-                self.backend_status.set("运行中")
-                self.btn_backend_start.config(state=tk.DISABLED)
-                self.btn_backend_stop.config(state=tk.NORMAL)
-            else:
-                self.backend_status.set("已停止")
-                self.btn_backend_start.config(state=tk.NORMAL)
-                self.btn_backend_stop.config(state=tk.DISABLED)
-        elif service == "frontend":
-            if running:
-                self.frontend_status.set("运行中")
-                self.btn_frontend_start.config(state=tk.DISABLED)
-                self.btn_frontend_stop.config(state=tk.NORMAL)
+            matches, total, elapsed = job.result()
+        except (DaemonError, concurrent.futures.TimeoutError) as e:
+            self.search_info.set(f"检索失败: {e}")
+            return
+        self.active_query = query
+        self.log_text.delete("1.0", tk.END)
+        results = []
+        for match in matches:
+            stamp = datetime.fromtimestamp(match.time).strftime("%H:%M:%S")
+            if match.level == "output":
+                tag = match.service if match.service in ("backend", "frontend") else "info"
             else:
-                self.frontend_status.set("已停止")
-                self.btn_frontend_start.config(state=tk.NORMAL)
-                self.btn_frontend_stop.config(state=tk.DISABLED)
-
-    def start_backend(self):
-        if self.processes["backend"] and self.processes["backend"].poll() is None:
-            self.log("后端服务已在运行中", "system")
+                tag = match.level
+            results.append((f"{stamp} {match.text}\n", tag))
+        if results:
+            self.render_logs(results)
+        self.search_info.set(f"{len(matches)} 条匹配 / {total} 行，{elapsed:.1f} ms")
+
+    def clear_search(self):
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+            self.search_job = None
+        self.search_pending = None
+        self.search_text.set("")
+        self.search_regex.set("")
+        self.search_service.set("全部服务")
+        self.search_level.set("全部级别")
+        self.search_info.set("")
+        if self.active_query is None:
             return
-
-        self.log("正在启动后端服务...", "system")
+        self.active_query = None
+        self.log_text.delete("1.0", tk.END)
+        tail = list(self.log_lines)[-LOG_VIEW_LINES:]
+        if tail:
+            self.render_logs(tail)
+
+    def add_resource_view(self, parent, service):
+        """服务行右侧的资源文字与 CPU/RSS 趋势图"""
+        text = tk.StringVar()
+        ttk.Label(parent, textvariable=text, width=34).pack(side=tk.LEFT, padx=(10, 2))
+        canvas = tk.Canvas(parent, width=SPARK_WIDTH, height=SPARK_HEIGHT, bg="#1e1e1e", highlightthickness=0)
+        canvas.pack(side=tk.LEFT, padx=2)
+        self.resource_views[service] = (text, canvas)
+
+    def sync_options(self):
+        """连接到已在运行的守护进程时，在后台线程取回其当前状态，再在界面线程设置开关和服务状态"""
+        job = self.in_background(lambda: (self.supervisor.snapshot(), self.supervisor.watchers))
+        self.when_done(job, self.apply_options)
+
+    def apply_options(self, job):
         try:
-            self.processes["backend"] = subprocess.Popen(
-                ["go", "run", ".", "-port", "3050"],
-                cwd=BACKEND_DIR,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                encoding='utf-8',
-                errors='replace',
-                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-            )
-            thread = threading.Thread(
-                target=self.stream_output,
-                args=(self.processes["backend"], "后端", "backend"),
-                daemon=True
-            )
-            thread.start()
-            self.update_status("backend", True)
-            self.log(f"后端服务已启动 (PID: {self.processes['backend'].pid})", "system")
-        except Exception as e:
-            self.log(f"启动后端失败: {e}", "error")
-
-    def start_frontend(self):
-        if self.processes["frontend"] and self.processes["frontend"].poll() is None:
-            self.log("前端服务已在运行中", "system")
+            snapshot, watching = job.result()
+        except (DaemonError, concurrent.futures.TimeoutError) as e:
+            self.log(f"读取守护进程状态失败: {e}", "error")
             return
+        backend = snapshot["backend"]
+        self.auto_restart.set(watching)
+        self.blue_green.set(backend["blue_green"])
+        self.bundle.set(backend["bundle"])
+        self.env_profile.set(backend["env_profile"])
+        self.profiling.set(backend["profiling"])
+        self.flight_restart.set(backend["flight"]["auto_restart"])
+        self.cluster_size.set(backend["instances"])
+        self.cluster_balance.set(backend["balance"])
+        for name, info in snapshot.items():
+            self.update_status(name, info["state"])
+
+    def refresh_resources(self):
+        if self.remote and not self.supervisor.connected:
+            self.log("与守护进程的连接已断开，请重新打开启动器", "error")
+            return
+        self.fetch_dashboard()
+        self.root.after(RESOURCE_TICK_MS, self.refresh_resources)
 
-        self.log("正在启动前端服务...", "system")
-        try:
-            npm_cmd = "npm.cmd" if sys.platform == "win32" else "npm"
-            self.processes["frontend"] = subprocess.Popen(
-                [npm_cmd, "run", "dev"],
-                cwd=FRONTEND_DIR,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                encoding='utf-8',
-                errors='replace',
-                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-            )
-            thread = threading.Thread(
-                target=self.stream_output,
-                args=(self.processes["frontend"], "前端", "frontend"),
-                daemon=True
-            )
-            thread.start()
-            self.update_status("frontend", True)
-            self.log(f"前端服务已启动 (PID: {self.processes['frontend'].pid})", "system")
-        except Exception as e:
-            self.log(f"启动前端失败: {e}", "error")
+    def in_background(self, call, *args):
+        """在后台线程中执行 call（守护进程模式下通常是 RPC），返回 concurrent.futures.Future"""
+        job = concurrent.futures.Future()
 
-    def stop_backend(self):
-        proc = self.processes.get("backend")
-        if proc and proc.poll() is None:
-            self.log("正在停止后端服务...", "system")
+        def run():
             try:
-                if sys.platform == "win32":
-                    # 强制终止进程树
-                    subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
-                                   capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-                    # 额外清理可能残留的 go 进程
-                    subprocess.run(["taskkill", "/F", "/IM", "new-api.exe"],
-                                   capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-                else:
-                    proc.terminate()
-                proc.wait(timeout=5)
-            except:
-                proc.kill()
-            self.processes["backend"] = None
-            self.update_status("backend", False)
-            self.log("后端服务已停止", "system")
+                job.set_result(call(*args))
+            except Exception as e:
+                job.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return job
+
+    def when_done(self, job, callback, *args):
+        """界面线程用 after 轮询 job，完成后调用 callback(job, *args)"""
+        if not job.done():
+            self.root.after(JOB_POLL_MS, self.when_done, job, callback, *args)
+            return
+        callback(job, *args)
+
+    def fetch_dashboard(self):
+        """
+        在后台线程中取回资源面板的数据（守护进程模式下为一次请求），完成后在界面线程绘制；
+        上一次还没有返回（守护进程繁忙）时跳过本次，不堆积请求
+        """
+        if self.dashboard_job is not None:
+            return
+        services = list(self.resource_views)
+        window = int(self.route_window.get().rstrip("s"))
+        sort = "route" if self.route_sort == "method" else self.route_sort
+        self.dashboard_job = self.in_background(self.supervisor.dashboard, services, window, sort, SPARK_POINTS)
+        self.when_done(self.dashboard_job, self.apply_dashboard)
+
+    def apply_dashboard(self, job):
+        self.dashboard_job = None
+        try:
+            data = job.result()
+        except (DaemonError, concurrent.futures.TimeoutError):
+            # 连接断开时由下一次 refresh_resources 提示
+            return
+        for service, (text, canvas) in self.resource_views.items():
+            view = data["resources"][service]
+            sample = view["latest"]
+            canvas.delete("all")
+            if sample is None or not sample.procs:
+                text.set("")
+                continue
+            text.set(f"CPU {sample.cpu:.0f}%  RSS {format_bytes(sample.rss)}  "
+                     f"线程 {sample.threads}  FD {sample.fds}")
+            self.draw_sparkline(canvas, view["rss"], "#4ec9b0")
+            self.draw_sparkline(canvas, view["cpu"], "#dcdcaa")
+        self.show_runtime_stats(data["runtime"])
+        self.show_routes(data["routes"])
+        self.show_cluster(data["cluster"])
+
+    def show_cluster(self, cluster):
+        """各实例的累计连接数（反映负载均衡的分配情况）"""
+        if not cluster:
+            self.cluster_info.set("")
+            return
+        parts = [f"{m['port']}:{m['connections']}" + ("" if m["pid"] else "(已退出)") for m in cluster["members"]]
+        self.cluster_info.set("连接分配 " + "  ".join(parts) if parts else "")
+
+    def sort_routes(self, column):
+        """按点击的列排序，当前排序列的表头加上箭头"""
+        self.route_sort = column
+        for name, (heading, _) in ROUTE_COLUMNS.items():
+            arrow = (" ▲" if name == "route" else " ▼") if name == column else ""
+            self.route_tree.heading(name, text=heading + arrow)
+        self.fetch_dashboard()
+
+    def show_routes(self, rows):
+        self.route_tree.delete(*self.route_tree.get_children())
+        for row in rows:
+            self.route_tree.insert("", tk.END, tags=("error",) if row.errors else (), values=(
+                row.method, row.route, row.count, f"{row.rate:.2f}", f"{row.error_rate:.1%}",
+                format_latency(row.p50), format_latency(row.p95), format_latency(row.p99),
+                format_latency(row.max)))
+        self.route_info.set(f"{len(rows)} 条路由，共 {sum(r.count for r in rows)} 次请求" if rows
+                            else "暂无访问日志")
+
+    def show_runtime_stats(self, stats):
+        latest = stats["latest"]
+        growing = stats["growing"]
+        self.runtime_info.set(stats["error"] or ("" if latest else "等待采样..."))
+        for name, (text, label, canvas) in self.runtime_views.items():
+            canvas.delete("all")
+            if latest is None:
+                text.set(f"{METRICS[name][0]} -")
+                continue
+            flag = " ↑" if name in growing else ""
+            text.set(f"{METRICS[name][0]} {format_metric(name, latest[name])}{flag}")
+            label.config(foreground="red" if flag else "")
+            self.draw_sparkline(canvas, stats["series"][name], "#ce9178" if flag else "#4ec9b0")
+
+    @staticmethod
+    def draw_sparkline(canvas, values, color):
+        if len(values) < 2:
+            return
+        low, high = min(values), max(values)
+        span = (high - low) or 1
+        step = SPARK_WIDTH / (SPARK_POINTS - 1)
+        offset = SPARK_WIDTH - step * (len(values) - 1)
+        points = []
+        for i, value in enumerate(values):
+            points.append(offset + i * step)
+            points.append(SPARK_HEIGHT - 2 - (value - low) / span * (SPARK_HEIGHT - 4))
+        canvas.create_line(*points, fill=color, width=1)
+
+    def update_status(self, service, state):
+        if service == "mock":
+            self.mock_upstream.set(state != "stopped")
+            return
+        if service == "backend":
+            status, btn_start, btn_stop = self.backend_status, self.btn_backend_start, self.btn_backend_stop
+        elif service == "frontend":
+            status, btn_start, btn_stop = self.frontend_status, self.btn_frontend_start, self.btn_frontend_stop
         else:
-            # 即使进程记录为空，也尝试清理残留进程
-            if sys.platform == "win32":
-                subprocess.run(["taskkill", "/F", "/IM", "new-api.exe"],
-                               capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            self.processes["backend"] = None
-            self.update_status("backend", False)
-            self.log("后端服务未运行", "system")
+            return
+        status.set(STATE_TEXT.get(state, state))
+        btn_start.config(state=tk.NORMAL if state == "stopped" else tk.DISABLED)
+        btn_stop.config(state=tk.NORMAL if state in ("starting", "running") else tk.DISABLED)
+
+    def start_backend(self):
+        self.supervisor.start_service("backend")
+
+    def start_frontend(self):
+        self.supervisor.start_service("frontend")
+
+    def stop_backend(self):
+        self.supervisor.stop_service("backend")
 
     def stop_frontend(self):
-        proc = self.processes.get("frontend")
-        if proc and proc.poll() is None:
-            self.log("正在停止前端服务...", "system")
-            try:
-                if sys.platform == "win32":
-                    # 强制终止进程树
-                    subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
-                                   capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-                else:
-                    proc.terminate()
-                proc.wait(timeout=5)
-            except:
-                proc.kill()
-            self.processes["frontend"] = None
-            self.update_status("frontend", False)
-            self.log("前端服务已停止", "system")
-        else:
-            self.processes["frontend"] = None
-            self.update_status("frontend", False)
-            self.log("前端服务未运行", "system")
+        self.supervisor.stop_service("frontend")
 
     def restart_backend(self):
-        self.stop_backend()
-        self.root.after(1000, self.start_backend)
+        self.supervisor.restart_service("backend")
 
     def restart_frontend(self):
-        self.stop_frontend()
-        self.root.after(1000, self.start_frontend)
+        self.supervisor.restart_service("frontend")
+
+    def toggle_watch(self):
+        """开启/关闭源码变化自动重启"""
+        self.supervisor.set_watch(self.auto_restart.get())
+
+    def toggle_blue_green(self):
+        """开启/关闭无缝重启，下次启动或重启后端时生效"""
+        self.supervisor.set_blue_green(self.blue_green.get())
+
+    def toggle_bundle(self):
+        """开启/关闭生产包模式：前端构建后嵌入后端，页面由后端端口提供，不启动 Vite"""
+        self.supervisor.set_bundle(self.bundle.get())
+
+    def toggle_mock(self):
+        """启动/停止模拟上游；启动时若后端在运行则自动注册 dev-mock 渠道"""
+        if self.mock_upstream.get():
+            self.supervisor.start_service("mock")
+        else:
+            self.supervisor.stop_service("mock")
+
+    def toggle_profiling(self):
+        """开启/关闭后端 pprof（运行中的后端会被重启）"""
+        self.supervisor.set_profiling(self.profiling.get())
+
+    def capture_flight(self):
+        """立即保存后端现场（输出、goroutine 栈、/proc 状态等）到 .devcache/flight"""
+        self.supervisor.capture_flight()
+
+    def toggle_flight_restart(self):
+        """后端异常退出或无响应时保存现场后按指数退避自动重启"""
+        self.supervisor.set_flight_recorder(auto_restart=self.flight_restart.get())
+
+    def apply_env_profile(self):
+        """切换后端环境配置（运行中的后端会被重启）"""
+        self.supervisor.set_env_profile(self.env_profile.get())
+
+    def apply_cluster(self):
+        """按实例数和策略切换集群模式（实例数变化时重启运行中的后端）"""
+        try:
+            instances = int(self.cluster_size.get())
+        except (tk.TclError, ValueError):
+            self.log(f"实例数应为 1-{CLUSTER_MAX} 的整数", "error")
+            return
+        self.supervisor.set_cluster(instances, self.cluster_balance.get())
+
+    def capture_profiles(self):
+        self.supervisor.capture_profiles(DEFAULT_WINDOW)
+
+    def diff_profiles(self):
+        """在日志中显示最近两次采集的 CPU 差异（go tool pprof 在后台线程执行）"""
+        if len(list_captures()) < 2:
+            self.log("至少需要两次采集才能对比", "error")
+            return
+
+        def run():
+            try:
+                new, base = resolve("1"), resolve("2")
+                self.log(f"cpu 对比: {os.path.basename(new)} 相对 {os.path.basename(base)}（正值为新增开销）", "system")
+                for line in profile_diff(base, new):
+                    self.log(line, "system")
+            except ProfileError as e:
+                self.log(f"对比失败: {e}", "error")
+
+        threading.Thread(target=run, daemon=True).start()
 
     def start_all(self):
-        self.start_backend()
-        self.root.after(2000, self.start_frontend)
+        self.supervisor.start_all()
 
     def stop_all(self):
-        self.stop_frontend()
-        self.stop_backend()
+        self.supervisor.stop_all()
 
     def restart_all(self):
-        self.log("正在重启所有服务...", "system")
-        self.stop_all()
-        self.root.after(1500, self.start_all)
+        self.supervisor.restart_all()
 
     def clear_logs(self):
+        # 只清空界面，落盘日志仍保存在 .devcache/logs 下
+        self.log_lines.clear()
         self.log_text.delete(1.0, tk.END)
 
     def force_kill_all(self):
         """强制清理所有相关进程"""
-        self.log("正在强制清理所有进程...", "system")
-        if sys.platform == "win32":
-            # 清理 Go 后端进程
-            subprocess.run(["taskkill", "/F", "/IM", "go.exe"],
-                           capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            subprocess.run(["taskkill", "/F", "/IM", "new-api.exe"],
-                           capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            # 清理 Node 前端进程
-            subprocess.run(["taskkill", "/F", "/IM", "node.exe"],
-                           capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-        else:
-            subprocess.run(["pkill", "-f", "go run"], capture_output=True)
-            subprocess.run(["pkill", "-f", "node"], capture_output=True)
-
-        # 重置状态
-        self.processes["backend"] = None
-        self.processes["frontend"] = None
-        self.update_status("backend", False)
-        self.update_status("frontend", False)
-        self.log("所有进程已强制清理", "system")
+        self.supervisor.force_kill_all()
 
     def open_browser(self):
         import webbrowser
-        webbrowser.open("http://localhost:5173")
-        self.log("已打开浏览器: http://localhost:5173", "system")
+        # 生产包模式下页面由后端提供
+        url = f"http://localhost:{BACKEND_PORT if self.bundle.get() else FRONTEND_PORT}"
+        webbrowser.open(url)
+        self.log(f"已打开浏览器: {url}", "system")
+
+    def stop_daemon(self):
+        """停止守护进程中的所有服务并退出守护进程，然后关闭窗口"""
+        self.log("正在停止守护进程...", "system")
+        closer = threading.Thread(target=self.supervisor.stop_daemon, daemon=True)
+        closer.start()
+        self._wait_closed(closer)
 
     def on_closing(self):
+        # 连接守护进程时只断开连接，服务继续运行
         self.log("正在关闭...", "system")
-        self.stop_all()
-        self.root.after(500, self.root.destroy)
+        closer = threading.Thread(target=self.supervisor.shutdown, daemon=True)
+        closer.start()
+        self._wait_closed(closer)
+
+    def _wait_closed(self, closer):
+        if closer.is_alive():
+            self.root.after(100, self._wait_closed, closer)
+        else:
+            self.root.destroy()
 
 def main():
     root = tk.Tk()
@@ -352,7 +754,7 @@ def main():
     style = ttk.Style()
     style.theme_use('clam')
 
-    app = DevLauncherGUI(root)
+    app = DevLauncherGUI(root, local="--local" in sys.argv)
     root.mainloop()
 
 if __name__ == "__main__":
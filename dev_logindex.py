@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 日志检索
+功能：随日志到达增量维护倒排索引，按关键字、服务、级别、正则过滤缓冲中的日志
+"""
+
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+# 缓冲的最大行数，超出后最旧的行被覆盖
+INDEX_CAPACITY = 1000000
+# 关键字：字母数字串（请求 ID、路径片段、状态码等）或单个汉字
+TOKEN_RE = re.compile(r"[0-9a-z_]+|[一-鿿]")
+# 子进程输出中视为错误的行
+ERROR_RE = re.compile(r"^\[(?:ERR|FATAL)\]|\bpanic\b|\berror\b", re.IGNORECASE)
+LEVELS = ("output", "system", "error")
+# 片段展开出的行号合计超过该值时不再据此缩小候选范围，交给逐行的子串判断
+MERGE_LIMIT = 200000
+# 关键字（首尾加 ^ $）按该长度的子串建二级索引，用于把片段展开为包含它的关键字；
+# 不足该长度的片段（前缀、后缀算上 ^ $）不缩小候选范围
+GRAM = 3
+# 片段在三元组索引中的形式
+FRAGMENT_PADDING = {
+    "prefix": "^{}",
+    "suffix": "{}$",
+    "infix": "{}",
+}
+
+Match = namedtuple("Match", ["id", "time", "service", "level", "text"])
+Query = namedtuple("Query", ["terms", "fragments", "words", "service", "level", "regex"])
+# 片段与行中关键字的关系 -> 判断函数
+FRAGMENT_TESTS = {
+    "prefix": str.startswith,
+    "suffix": str.endswith,
+    "infix": str.__contains__,
+}
+
+
+def tokenize(text):
+    return set(TOKEN_RE.findall(text.lower()))
+
+
+def _grams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+def _service_token(service):
+    # 以 \0 开头的伪关键字不会与正文冲突，使服务/级别过滤也走倒排表
+    return "\0s:" + service
+
+
+def _level_token(level):
+    return "\0l:" + level
+
+
+def classify(event):
+    """事件的日志级别：message 沿用其 level，output 行按内容识别错误"""
+    if event.kind == "message":
+        return event.level if event.level in LEVELS else "system"
+    return "error" if ERROR_RE.search(event.text) else "output"
+
+
+def display_text(event):
+    if event.kind == "output":
+        return f"[{event.source}] {event.text}"
+    return event.text
+
+
+def _split_word(word):
+    """
+    把查询词中的关键字分为两类：两侧都被其他字符隔开的一定是行中的完整关键字；
+    位于词首的字母数字串只是行中某个关键字的后缀、词尾的是前缀，整个词本身则可以是任意子串
+    返回 (完整关键字集合, [(片段, "prefix"|"suffix"|"infix")])
+    """
+    exact, fragments = set(), []
+    for m in TOKEN_RE.finditer(word):
+        token = m.group()
+        head, tail = m.start() == 0, m.end() == len(word)
+        if not token.isascii() or not (head or tail):
+            exact.add(token)
+        elif head and tail:
+            fragments.append((token, "infix"))
+        else:
+            fragments.append((token, "suffix" if head else "prefix"))
+    return exact, fragments
+
+
+def build_query(text="", service=None, level=None, regex=None):
+    """
+    把用户输入整理为查询；正则非法时抛出 re.error
+    空格分隔的每个词都必须作为子串出现：其中的完整关键字直接查倒排表，
+    词首词尾的片段先经三元组索引展开为包含它的关键字再查倒排表
+    """
+    words = [w.lower() for w in (text or "").split()]
+    terms, fragments = set(), set()
+    for word in words:
+        exact, partial = _split_word(word)
+        terms.update(exact)
+        fragments.update(partial)
+    if service:
+        terms.add(_service_token(service))
+    if level:
+        terms.add(_level_token(level))
+    return Query(
+        terms=sorted(terms, key=len, reverse=True),
+        fragments=sorted(fragments, key=lambda f: len(f[0]), reverse=True),
+        words=words,
+        service=service or None,
+        level=level or None,
+        regex=re.compile(regex, re.IGNORECASE) if regex else None,
+    )
+
+
+def match_line(query, service, level, text):
+    """判断单行是否满足查询（用于新到达日志的实时过滤）"""
+    if query.service and service != query.service:
+        return False
+    if query.level and level != query.level:
+        return False
+    if query.words:
+        lower = text.lower()
+        if any(word not in lower for word in query.words):
+            return False
+    return not query.regex or bool(query.regex.search(text))
+
+
+class LogIndex:
+    """
+    固定容量的日志缓冲 + 倒排索引
+    行号单调递增，倒排表按行号有序；被覆盖的旧行号在查询时二分跳过，
+    并在每写满 1/4 容量时批量清理
+    查询只在读取倒排表时持锁，求交集与逐行判断在锁外进行，不阻塞写入
+    """
+
+    def __init__(self, capacity=INDEX_CAPACITY):
+        self.capacity = capacity
+        self._texts = [None] * capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._services = array("B", bytes(capacity))
+        self._levels = array("B", bytes(capacity))
+        self._service_codes = {}
+        self._service_names = []
+        self._postings = {}
+        # 三元组 -> 关键字编号；_vocab 按编号保存关键字，被清理的关键字在查询时跳过，过半时重建
+        self._grams = {}
+        self._vocab = []
+        self._indexed = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def oldest_id(self):
+        return max(0, self._next_id - self.capacity)
+
+    def __len__(self):
+        return self._next_id - self.oldest_id
+
+    def services(self):
+        return list(self._service_names)
+
+    def _service_code(self, service):
+        code = self._service_codes.get(service)
+        if code is None:
+            code = self._service_codes[service] = len(self._service_names)
+            self._service_names.append(service)
+        return code
+
+    # ---------- 写入 ----------
+
+    def append(self, events):
+        """追加一批 output/message 事件"""
+        with self._lock:
+            for event in events:
+                if event.kind not in ("output", "message"):
+                    continue
+                line_id = self._next_id
+                slot = line_id % self.capacity
+                text = display_text(event)
+                service = event.service or "launcher"
+                level = classify(event)
+                self._texts[slot] = text
+                self._times[slot] = event.time
+                self._services[slot] = self._service_code(service)
+                self._levels[slot] = LEVELS.index(level)
+                tokens = tokenize(text)
+                tokens.add(_service_token(service))
+                tokens.add(_level_token(level))
+                for token in tokens:
+                    posting = self._postings.get(token)
+                    if posting is None:
+                        posting = self._postings[token] = array("I")
+                        self._index_token(token)
+                    posting.append(line_id)
+                self._next_id += 1
+                if self._next_id % (self.capacity // 4 or 1) == 0 and self._next_id > self.capacity:
+                    self._compact()
+
+    def _index_token(self, token):
+        if token.startswith("\0") or not token.isascii():
+            return
+        token_id = len(self._vocab)
+        self._vocab.append(token)
+        self._indexed += 1
+        grams = self._grams
+        for gram in _grams(f"^{token}$"):
+            ids = grams.get(gram)
+            if ids is None:
+                ids = grams[gram] = array("I")
+            ids.append(token_id)
+
+    def _compact(self):
+        """裁掉倒排表中已被覆盖的行号"""
+        oldest = self.oldest_id
+        for token in list(self._postings):
+            posting = self._postings[token]
+            cut = bisect_left(posting, oldest)
+            if cut == len(posting):
+                del self._postings[token]
+                if not token.startswith("\0") and token.isascii():
+                    self._indexed -= 1
+            elif cut:
+                del posting[:cut]
+        if len(self._vocab) > 2 * self._indexed:
+            self._grams, self._vocab, self._indexed = {}, [], 0
+            for token in self._postings:
+                self._index_token(token)
+
+    # ---------- 查询 ----------
+
+    def _match(self, line_id, query):
+        slot = line_id % self.capacity
+        text = self._texts[slot]
+        time, service, level = self._times[slot], self._services[slot], self._levels[slot]
+        # 锁外读取：写入中的行号是 _next_id，它覆盖的是 _next_id - capacity，读完后仍比它新才可信
+        if line_id <= self._next_id - self.capacity:
+            return None
+        if query.words:
+            lower = text.lower()
+            if any(word not in lower for word in query.words):
+                return None
+        if query.regex is not None and not query.regex.search(text):
+            return None
+        return Match(line_id, time, self._service_names[service], LEVELS[level], text)
+
+    def _expand(self, fragment, kind, oldest):
+        """
+        经三元组索引找出包含片段的关键字，返回它们倒排表的副本；
+        没有这样的关键字时返回 None，片段过短或合计过大时返回空列表（不缩小候选范围）
+        """
+        grams = _grams(FRAGMENT_PADDING[kind].format(fragment))
+        if not grams:
+            return []
+        ids = None
+        for gram in grams:
+            found = self._grams.get(gram)
+            if found is None:
+                return None
+            if ids is None or len(found) < len(ids):
+                ids = found
+        test = FRAGMENT_TESTS[kind]
+        postings, total = [], 0
+        for token in {self._vocab[i] for i in ids}:
+            posting = self._postings.get(token)
+            if posting is None or not test(token, fragment):
+                continue
+            cut = bisect_left(posting, oldest)
+            total += len(posting) - cut
+            if total > MERGE_LIMIT:
+                return []
+            postings.append(posting[cut:])
+        return postings or None
+
+    def _lookup(self, query, oldest):
+        """
+        查询涉及的倒排表（裁掉已覆盖行号后的副本），每项是需要合并的一组；
+        先查完整关键字，任一关键字或片段在缓冲中不存在时返回 None
+        """
+        groups = []
+        for term in query.terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                return None
+            groups.append([posting[bisect_left(posting, oldest):]])
+        for fragment, kind in query.fragments:
+            postings = self._expand(fragment, kind, oldest)
+            if postings is None:
+                return None
+            if postings:
+                groups.append(postings)
+        return groups
+
+    @staticmethod
+    def _candidates(groups):
+        """每组倒排表合并后求交集，按行号从新到旧返回候选"""
+        postings = sorted((group[0] if len(group) == 1 else array("I", sorted(set().union(*group)))
+                           for group in groups), key=len)
+        base, others = postings[0], postings[1:]
+        for i in range(len(base) - 1, -1, -1):
+            line_id = base[i]
+            for other in others:
+                j = bisect_left(other, line_id)
+                if j == len(other) or other[j] != line_id:
+                    break
+            else:
+                yield line_id
+
+    def search(self, query, limit=500):
+        """返回最多 limit 条匹配（按时间先后排列）"""
+        with self._lock:
+            oldest, newest = self.oldest_id, self._next_id
+            groups = self._lookup(query, oldest)
+        if groups is None:
+            ids = ()
+        elif groups:
+            ids = self._candidates(groups)
+        else:
+            ids = range(newest - 1, oldest - 1, -1)
+        matches = []
+        for line_id in ids:
+            match = self._match(line_id, query)
+            if match is not None:
+                matches.append(match)
+                if len(matches) >= limit:
+                    break
+        matches.reverse()
+        return matches
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 日志持久化
+功能：把各服务输出追加写入分段文件，按大小轮转并分块压缩旧分段，
+      旁路索引记录 时间戳 -> 字节偏移（压缩后为 块偏移 + 块内偏移），按时间定位日志只需一次 seek
+"""
+
+import bisect
+import gzip
+import io
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from dev_build import CACHE_DIR
+
+LOG_ROOT = os.path.join(CACHE_DIR, "logs")
+# 单个分段的最大字节数，超过后轮转
+SEGMENT_SIZE = 16 * 1024 * 1024
+# 每个服务最多保留的分段数
+MAX_SEGMENTS = 64
+# 索引粒度：同一秒内只记录第一行的偏移
+INDEX_RECORD = struct.Struct("<dQ")
+COMPRESSED_EXTS = (".zst", ".gz")
+# 封存的分段按块压缩：每块在行边界处切分，是独立的 zstd frame / gzip member，
+# 索引随之改写为 时间戳 -> (块在压缩文件中的偏移, 块内偏移)，定位时只需解压一个块的前缀
+BLOCK_SIZE = 256 * 1024
+BLOCK_INDEX_RECORD = struct.Struct("<dQI")
+BLOCK_INDEX_EXT = ".bidx"
+
+
+def _read_index(index_path, record=INDEX_RECORD):
+    """返回 (时间戳列表, 其余字段的元组列表)，忽略末尾写了一半的记录"""
+    try:
+        with open(index_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return [], []
+    usable = len(data) - len(data) % record.size
+    times, positions = [], []
+    for ts, *rest in record.iter_unpack(data[:usable]):
+        times.append(ts)
+        positions.append(tuple(rest))
+    return times, positions
+
+
+def _compress(path):
+    """分块压缩已封存的分段并写入块索引，完成后删除原文件与字节偏移索引"""
+    base = path[:-len(".log")]
+    if zstandard is not None:
+        target, compress = path + ".zst", zstandard.ZstdCompressor(level=3).compress
+    else:
+        target = path + ".gz"
+
+        def compress(data):
+            return gzip.compress(data, compresslevel=6, mtime=0)
+
+    starts, blocks = [], []     # 各块的原始偏移、压缩偏移
+    with open(path, "rb") as src, open(target + ".tmp", "wb") as dst:
+        while True:
+            data = src.read(BLOCK_SIZE)
+            if not data:
+                break
+            data += src.readline()
+            starts.append(src.tell() - len(data))
+            blocks.append(dst.tell())
+            dst.write(compress(data))
+    times, offsets = _read_index(base + ".idx")
+    with open(base + BLOCK_INDEX_EXT + ".tmp", "wb") as f:
+        for ts, (offset,) in zip(times, offsets):
+            i = max(bisect.bisect_right(starts, offset) - 1, 0)
+            f.write(BLOCK_INDEX_RECORD.pack(ts, blocks[i] if blocks else 0, offset - (starts[i] if starts else 0)))
+    os.replace(base + BLOCK_INDEX_EXT + ".tmp", base + BLOCK_INDEX_EXT)
+    os.replace(target + ".tmp", target)
+    os.remove(path)
+    try:
+        os.remove(base + ".idx")
+    except OSError:
+        pass
+
+
+def _segment_lines(path, block=0, skip=0):
+    """
+    逐行读取分段：压缩分段从偏移 block 处的块开始解压（之后的块依次读出），跳过块内 skip 字节；
+    未压缩的分段直接 seek 到 block + skip
+    """
+    with open(path, "rb") as raw:
+        raw.seek(block)
+        if path.endswith(".zst"):
+            f = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True))
+        elif path.endswith(".gz"):
+            f = gzip.GzipFile(fileobj=raw, mode="rb")
+        else:
+            raw.seek(block + skip)
+            f, skip = raw, 0
+        with f:
+            if skip:
+                f.read(skip)
+            yield from f
+
+
+class _Segment:
+    """正在写入的分段及其索引"""
+
+    def __init__(self, directory, seq, start):
+        base = os.path.join(directory, f"{seq:06d}-{int(start)}")
+        self.path = base + ".log"
+        self.index_path = base + ".idx"
+        self.file = open(self.path, "ab")
+        self.index = open(self.index_path, "ab")
+        self.size = self.file.tell()
+        self.last_second = None
+
+    def write(self, ts, data):
+        second = int(ts)
+        if second != self.last_second:
+            self.index.write(INDEX_RECORD.pack(ts, self.size))
+            self.last_second = second
+        self.file.write(data)
+        self.size += len(data)
+
+    def flush(self):
+        self.file.flush()
+        self.index.flush()
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+
+class LogStore:
+    """
+    按服务分目录保存日志：<root>/<service>/<序号>-<起始时间>.log[.zst|.gz] + .idx
+    append 在事件循环线程调用；压缩在后台线程执行
+    """
+
+    def __init__(self, root=LOG_ROOT, segment_size=SEGMENT_SIZE, max_segments=MAX_SEGMENTS):
+        self.root = root
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self._active = {}
+        self._lock = threading.Lock()
+        self._compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-compress")
+
+    # ---------- 写入 ----------
+
+    def _segment(self, service, ts):
+        segment = self._active.get(service)
+        if segment is not None and segment.size < self.segment_size:
+            return segment
+        directory = os.path.join(self.root, service)
+        os.makedirs(directory, exist_ok=True)
+        seq = 0
+        if segment is not None:
+            self._seal(service, segment)
+        else:
+            # 上次异常退出时未封存的分段
+            for path in self._segments(service):
+                if path.endswith(".log"):
+                    self._compressor.submit(_compress, path)
+        existing = self._segments(service)
+        if existing:
+            seq = int(os.path.basename(existing[-1]).split("-", 1)[0]) + 1
+        segment = self._active[service] = _Segment(directory, seq, ts)
+        return segment
+
+    def _seal(self, service, segment):
+        segment.close()
+        self._compressor.submit(_compress, segment.path)
+        old = self._segments(service)[:-self.max_segments]
+        for path in old:
+            base = self._segment_base(path)
+            for victim in (path, base + ".idx", base + BLOCK_INDEX_EXT):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+
+    def append(self, events):
+        """写入一批事件（output/message），按服务分别落盘"""
+        with self._lock:
+            touched = set()
+            for event in events:
+                if event.kind not in ("output", "message"):
+                    continue
+                service = event.service or "launcher"
+                stamp = datetime.fromtimestamp(event.time).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+                data = f"{stamp} [{event.source or service}] {event.text}\n".encode("utf-8", "replace")
+                self._segment(service, event.time).write(event.time, data)
+                touched.add(service)
+            for service in touched:
+                self._active[service].flush()
+
+    def close(self):
+        with self._lock:
+            for service, segment in list(self._active.items()):
+                segment.close()
+            self._active.clear()
+        self._compressor.shutdown(wait=True)
+
+    # ---------- 读取 ----------
+
+    def services(self):
+        try:
+            return sorted(d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+        except OSError:
+            return []
+
+    def _segments(self, service):
+        """按序号排列的分段文件路径（含已压缩的）"""
+        directory = os.path.join(self.root, service)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        paths = [os.path.join(directory, n) for n in names
+                 if n.endswith(".log") or n.endswith(tuple(".log" + ext for ext in COMPRESSED_EXTS))]
+        return sorted(paths, key=lambda p: os.path.basename(p).split("-", 1)[0])
+
+    @staticmethod
+    def _segment_base(segment_path):
+        base = segment_path
+        for ext in COMPRESSED_EXTS:
+            if base.endswith(ext):
+                base = base[:-len(ext)]
+        return base[:-len(".log")]
+
+    @staticmethod
+    def _segment_start(segment_path):
+        name = os.path.basename(segment_path)
+        return int(name.split("-", 1)[1].split(".", 1)[0])
+
+    def _locate(self, segment_path, since):
+        """since 所在的 (块偏移, 块内偏移)；早于块索引的压缩分段只能从头解压到该偏移"""
+        base = self._segment_base(segment_path)
+        times, positions = _read_index(base + BLOCK_INDEX_EXT, BLOCK_INDEX_RECORD)
+        if not times:
+            times, offsets = _read_index(base + ".idx")
+            compressed = segment_path.endswith(COMPRESSED_EXTS)
+            positions = [(0, offset) if compressed else (offset, 0) for offset, in offsets]
+        pos = bisect.bisect_right(times, since) - 1
+        return positions[pos] if pos >= 0 else (0, 0)
+
+    def read_from(self, service, since, limit=200):
+        """
+        返回 service 在 since（时间戳）之后的至多 limit 行
+        先按分段起始时间定位分段，再用索引二分得到偏移直接 seek（压缩分段 seek 到所在的块）
+        """
+        with self._lock:
+            segment = self._active.get(service)
+            if segment is not None:
+                segment.flush()
+            segments = self._segments(service)
+        if not segments:
+            return []
+        starts = [self._segment_start(p) for p in segments]
+        first = max(bisect.bisect_right(starts, since) - 1, 0)
+
+        lines = []
+        for path in segments[first:]:
+            block, skip = self._locate(path, since)
+            try:
+                with closing(_segment_lines(path, block, skip)) as f:
+                    for raw in f:
+                        line = raw.decode("utf-8", "replace").rstrip("\n")
+                        if not lines and _line_time(line) < since:
+                            continue
+                        lines.append(line)
+                        if len(lines) >= limit:
+                            return lines
+            except (OSError, EOFError, AttributeError):
+                # 没有安装 zstandard 时无法读取 .zst 分段；压缩中途退出留下的残缺文件同样跳过
+                continue
+        return lines
+
+
+def _line_time(line):
+    try:
+        return datetime.strptime(line[:23], "%Y-%m-%d %H:%M:%S.%f").timestamp()
+    except ValueError:
+        return 0.0
+
+
+def parse_time(text):
+    """解析 HH:MM[:SS]（今天）或 YYYY-MM-DD HH:MM[:SS]，返回时间戳"""
+    text = text.strip()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            t = datetime.strptime(text, fmt).time()
+            return datetime.combine(datetime.now().date(), t).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"无法解析时间: {text}")
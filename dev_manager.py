@@ -5,24 +5,34 @@ NEW_API 开发环境管理器
 功能：启动/停止/重启 前端和后端服务，实时查看日志
 """
 
-import subprocess
 import threading
 import os
+import re
+import shlex
 import sys
-import signal
 import time
 from datetime import datetime
 
-# 项目路径配置
-PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
-BACKEND_DIR = os.path.join(PROJECT_ROOT, "new-api")
-FRONTEND_DIR = os.path.join(PROJECT_ROOT, "new-api", "web")
+from dev_supervisor import Supervisor, PROJECT_ROOT, BACKEND_PORT, CLUSTER_MAX
+from dev_logstore import parse_time
+from dev_logindex import build_query
+from dev_procstat import sparkline, format_bytes
+from dev_runtimestats import METRICS, ACCESS_TOKEN_ENV, format_metric
+from dev_routestats import SORT_KEYS, format_latency
+from dev_mockupstream import MOCK_PORT, CHAT_MODEL, DEFAULT_CONFIG as MOCK_DEFAULTS, parse_settings
+from dev_pprof import (DEFAULT_WINDOW, TOP_N, ProfileError, list_captures, resolve, describe,
+                       top as profile_top, diff as profile_diff)
+from dev_startup import PHASES, load_history, history_medians
+from dev_editlatency import (HISTORY_FILE as EDIT_HISTORY_FILE, LOOPS as EDIT_LOOPS, EDIT_PHASES,
+                             describe as describe_edit, summarize as summarize_edits)
+from dev_bench import make_config, run_bench, format_report, format_ms, BENCH_KEY_ENV, DEFAULT_PATH
+from dev_envprofiles import describe as describe_profile
+from dev_flightrecorder import FLIGHT_ROOT, list_bundles, parse_thresholds, Thresholds, describe as describe_bundle
+from dev_benchstore import record as record_bench, main as bench_store_main, pad
+from dev_daemon import attach, DaemonError, RemoteSupervisor
 
-# 进程存储
-processes = {
-    "backend": None,
-    "frontend": None
-}
+# 进程管理核心：默认连接守护进程（没有时在后台启动一个），--local 时在本进程内运行
+supervisor = None
 
 # 日志颜色
 class Colors:
@@ -33,121 +43,140 @@ class Colors:
     BLUE = "\033[94m"
     CYAN = "\033[96m"
 
+SERVICE_COLORS = {"backend": Colors.GREEN, "frontend": Colors.BLUE, "mock": Colors.YELLOW}
+LEVEL_COLORS = {"system": Colors.CYAN, "error": Colors.RED}
+
 def log(msg, color=Colors.RESET):
     timestamp = datetime.now().strftime("%H:%M:%S")
     print(f"{color}[{timestamp}] {msg}{Colors.RESET}")
 
-def stream_output(process, name, color):
-    """实时输出进程日志"""
-    try:
-        for line in iter(process.stdout.readline, ''):
-            if line:
-                print(f"{color}[{name}]{Colors.RESET} {line}", end='')
-    except:
-        pass
+def stream_output(subscription):
+    """订阅管理器事件并输出到终端"""
+    while not subscription.closed:
+        for event in subscription.wait():
+            if event.kind == "output":
+                color = SERVICE_COLORS.get(event.service, Colors.RESET)
+                print(f"{color}[{event.source}]{Colors.RESET} {event.text}")
+            elif event.kind == "message":
+                log(event.text, LEVEL_COLORS.get(event.level, Colors.RESET))
 
 def start_backend():
     """启动后端服务"""
-    if processes["backend"] and processes["backend"].poll() is None:
-        log("后端服务已在运行中", Colors.YELLOW)
-        return
-
-    log("正在启动后端服务...", Colors.CYAN)
-    try:
-        processes["backend"] = subprocess.Popen(
-            ["go", "run", "."],
-            cwd=BACKEND_DIR,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0
-        )
-        thread = threading.Thread(
-            target=stream_output,
-            args=(processes["backend"], "后端", Colors.GREEN),
-            daemon=True
-        )
-        thread.start()
-        log("后端服务已启动 (PID: {})".format(processes["backend"].pid), Colors.GREEN)
-    except Exception as e:
-        log(f"启动后端失败: {e}", Colors.RED)
+    supervisor.start_service("backend").result()
 
 def start_frontend():
     """启动前端服务"""
-    if processes["frontend"] and processes["frontend"].poll() is None:
-        log("前端服务已在运行中", Colors.YELLOW)
-        return
+    supervisor.start_service("frontend").result()
 
-    log("正在启动前端服务...", Colors.CYAN)
-    try:
-        # Windows 使用 npm.cmd
-        npm_cmd = "npm.cmd" if sys.platform == "win32" else "npm"
-        processes["frontend"] = subprocess.Popen(
-            [npm_cmd, "run", "dev"],
-            cwd=FRONTEND_DIR,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0
-        )
-        thread = threading.Thread(
-            target=stream_output,
-            args=(processes["frontend"], "前端", Colors.BLUE),
-            daemon=True
-        )
-        thread.start()
-        log("前端服务已启动 (PID: {})".format(processes["frontend"].pid), Colors.BLUE)
-    except Exception as e:
-        log(f"启动前端失败: {e}", Colors.RED)
-
-def stop_process(name):
-    """停止指定进程"""
-    proc = processes.get(name)
-    if proc and proc.poll() is None:
-        log(f"正在停止{name}服务...", Colors.YELLOW)
-        try:
-            if sys.platform == "win32":
-                # Windows: 使用 taskkill 终止进程树
-                subprocess.run(
-                    ["taskkill", "/F", "/T", "/PID", str(proc.pid)],
-                    capture_output=True
-                )
-            else:
-                os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-            proc.wait(timeout=5)
-        except:
-            proc.kill()
-        processes[name] = None
-        log(f"{name}服务已停止", Colors.GREEN)
-    else:
-        log(f"{name}服务未运行", Colors.YELLOW)
+def start_all():
+    """启动所有服务"""
+    supervisor.start_all().result()
 
 def stop_all():
     """停止所有服务"""
-    stop_process("frontend")
-    stop_process("backend")
+    supervisor.stop_all().result()
 
 def restart_all():
     """重启所有服务"""
-    log("正在重启所有服务...", Colors.CYAN)
-    stop_all()
-    time.sleep(1)
-    start_backend()
-    start_frontend()
+    supervisor.restart_all().result()
 
 def restart_backend():
     """重启后端服务"""
-    stop_process("backend")
-    time.sleep(1)
-    start_backend()
+    supervisor.restart_service("backend").result()
 
 def restart_frontend():
     """重启前端服务"""
-    stop_process("frontend")
-    time.sleep(1)
-    start_frontend()
+    supervisor.restart_service("frontend").result()
+
+SVC_USAGE = "用法: svc [list] | svc start|stop|restart <服务>"
+
+def manage_services(args):
+    """按服务清单 (dev_services.toml) 查看和启停单个服务: svc [list|start|stop|restart] [服务]"""
+    action = args[0] if args else "list"
+    if action == "list":
+        for name, spec in supervisor.specs.items():
+            service = supervisor.services[name]
+            state = f"{Colors.GREEN}运行中{Colors.RESET}" if service.running else service.state
+            deps = f"  依赖 {', '.join(spec.deps)}" if spec.deps else ""
+            flags = ("" if spec.autostart else "  按需启动") + ("" if spec.follow_restarts else "  不随依赖重启")
+            kind = "内置" if spec.builtin else " ".join(spec.command)
+            print(f"  {name:<10} {state}  {kind}{deps}{flags}")
+        return
+    if action not in ("start", "stop", "restart") or len(args) != 2 or args[1] not in supervisor.services:
+        log(SVC_USAGE + f"（服务: {', '.join(supervisor.services)}）", Colors.YELLOW)
+        return
+    name = args[1]
+    if action == "start":
+        # 连同尚未运行的依赖一起启动
+        supervisor.start_with_deps(name).result()
+    elif action == "stop":
+        supervisor.stop_service(name).result()
+    else:
+        supervisor.restart_service(name).result()
+
+def toggle_blue_green():
+    """开启/关闭无缝重启，下次启动或重启后端时生效"""
+    supervisor.set_blue_green(not supervisor.services["backend"].blue_green)
+
+def toggle_bundle():
+    """开启/关闭生产包模式：前端构建后嵌入后端二进制，浏览器访问后端端口"""
+    supervisor.set_bundle(not supervisor.services["backend"].bundle).result()
+
+def toggle_watch():
+    """开启/关闭文件监听自动重启"""
+    supervisor.set_watch(not supervisor.watchers)
+
+def show_logs(args):
+    """按时间回看已落盘的日志: logs <服务> <时间> [行数]"""
+    store = supervisor.log_store
+    if len(args) < 2:
+        log(f"用法: logs <{'|'.join(store.services()) or 'backend'}> <HH:MM:SS> [行数]", Colors.YELLOW)
+        return
+    service = args[0]
+    count = 50
+    time_args = args[1:]
+    if len(time_args) > 1 and time_args[-1].isdigit():
+        count = int(time_args[-1])
+        time_args = time_args[:-1]
+    try:
+        since = parse_time(" ".join(time_args))
+    except ValueError as e:
+        log(str(e), Colors.RED)
+        return
+    lines = store.read_from(service, since, count)
+    if not lines:
+        log(f"{service} 在该时间之后没有日志", Colors.YELLOW)
+        return
+    for line in lines:
+        print(line)
+
+def grep_logs(args):
+    """检索内存中的日志: grep [-s 服务] [-l 级别] [-e 正则] [-n 条数] 关键字..."""
+    options = {"-s": None, "-l": None, "-e": None, "-n": "50"}
+    words = []
+    it = iter(args)
+    for arg in it:
+        if arg in options:
+            options[arg] = next(it, None)
+        else:
+            words.append(arg)
+    if not words and not any(options[k] for k in ("-s", "-l", "-e")):
+        log("用法: grep [-s backend|frontend] [-l output|system|error] [-e 正则] [-n 条数] 关键字...", Colors.YELLOW)
+        return
+    try:
+        query = build_query(" ".join(words), options["-s"], options["-l"], options["-e"])
+        limit = int(options["-n"] or 50)
+    except (ValueError, re.error) as e:
+        log(f"查询参数错误: {e}", Colors.RED)
+        return
+    start = time.perf_counter()
+    matches = supervisor.log_index.search(query, limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    for match in matches:
+        stamp = datetime.fromtimestamp(match.time).strftime("%H:%M:%S")
+        color = Colors.RED if match.level == "error" else SERVICE_COLORS.get(match.service, Colors.CYAN)
+        print(f"{color}{stamp}{Colors.RESET} {match.text}")
+    log(f"共 {len(matches)} 条匹配，缓冲 {len(supervisor.log_index)} 行，耗时 {elapsed:.1f} ms", Colors.CYAN)
 
 def show_status():
     """显示服务状态"""
@@ -155,14 +184,511 @@ def show_status():
     print("服务状态:")
     print("=" * 50)
 
-    for name, proc in processes.items():
-        if proc and proc.poll() is None:
-            status = f"{Colors.GREEN}运行中 (PID: {proc.pid}){Colors.RESET}"
+    snapshot = supervisor.snapshot()
+    for name, info in snapshot.items():
+        if info["pid"]:
+            status = f"{Colors.GREEN}运行中 (PID: {info['pid']}){Colors.RESET}"
+        elif info["state"] == "starting":
+            status = f"{Colors.YELLOW}启动中{Colors.RESET}"
         else:
             status = f"{Colors.RED}已停止{Colors.RESET}"
         print(f"  {name}: {status}")
+    print(f"  自动重启: {'开启' if supervisor.watchers else '关闭'}")
+    backend = snapshot["backend"]
+    if backend["blue_green"]:
+        port = backend["port"]
+        target = f"-> {port}" if port else "(未连接后端)"
+        print(f"  无缝重启: 开启 代理 {BACKEND_PORT} {target}")
+    else:
+        print("  无缝重启: 关闭")
+    if backend["bundle"]:
+        print(f"  生产包模式: 开启 页面 http://localhost:{BACKEND_PORT}")
+    print(f"  环境配置: {backend['env_profile']}")
+    if backend["profiling"]:
+        print(f"  性能剖析: 开启 pprof 端口 {backend['pprof_port']}")
+    flight = backend["flight"]
+    print(f"  飞行记录: {'开启' if flight['enabled'] else '关闭'}"
+          f"  异常后自动重启: {'开启' if flight['auto_restart'] else '关闭'}")
+    show_cluster(backend["cluster"])
+    show_resources(snapshot)
     print("=" * 50 + "\n")
 
+def show_cluster(cluster):
+    """集群各实例的角色、负载均衡分配情况与资源占用"""
+    if not cluster:
+        return
+    print(f"  集群模式: {cluster['instances']} 个实例  代理 {BACKEND_PORT}  策略 {cluster['balance']}")
+    for member in cluster["members"]:
+        state = f"PID {member['pid']}" if member["pid"] else f"{Colors.RED}已退出{Colors.RESET}"
+        if not member["balanced"]:
+            state += f" {Colors.YELLOW}(未接流量){Colors.RESET}"
+        resources = member.get("resources")
+        usage = f"  CPU {resources.cpu:.1f}%  RSS {format_bytes(resources.rss)}" if resources else ""
+        print(f"    {member['port']} {member['role']:<6} {state}  活动连接 {member['active']}"
+              f"  累计 {member['connections']}  {format_bytes(member['bytes'])}{usage}")
+
+def show_resources(snapshot):
+    """各服务进程树的资源占用及最近的趋势"""
+    sampler = supervisor.sampler
+    rows = [(name, info["resources"]) for name, info in snapshot.items()
+            if info["resources"] and info["resources"].procs]
+    if not rows:
+        return
+    print("-" * 50)
+    # 中文表头每字占两列，按显示宽度手工对齐
+    print(f"  服务        进程{'CPU%':>8}{'RSS':>10}  线程{'FD':>6}")
+    for name, sample in rows:
+        print(f"  {name:<10}{sample.procs:>6}{sample.cpu:>8.1f}{format_bytes(sample.rss):>10}"
+              f"{sample.threads:>6}{sample.fds:>6}")
+        print(f"    CPU {sparkline(sampler.series(name, 'cpu'), 40)}")
+        print(f"    RSS {sparkline(sampler.series(name, 'rss'), 40)}")
+
+def show_runtime_stats():
+    """后端运行时统计（来自 /api/performance/stats）及趋势"""
+    stats = supervisor.runtime_stats
+    series = stats.series
+    if not len(series):
+        reason = stats.error or f"后端未运行或尚未采样（需设置 {ACCESS_TOKEN_ENV}）"
+        log(f"暂无运行时统计: {reason}", Colors.YELLOW)
+        return
+    latest = series.latest()
+    growing = stats.growing()
+    print("\n" + "=" * 50)
+    print(f"后端运行时统计 (共 {len(series)} 个采样点，间隔 {stats.interval:g}s):")
+    print("=" * 50)
+    for name, (label, _) in METRICS.items():
+        flag = f" {Colors.RED}↑ 持续增长{Colors.RESET}" if name in growing else ""
+        # 中文字符占两列
+        width = 10 - sum(1 for c in label if ord(c) > 0x2e80)
+        print(f"  {label.ljust(width)}{format_metric(name, latest[name]):>10}  {sparkline(series.values(name), 40)}{flag}")
+    if stats.error:
+        log(f"最近一次采样失败: {stats.error}", Colors.YELLOW)
+    print("=" * 50 + "\n")
+
+ROUTES_USAGE = f"用法: routes [窗口秒] [排序列] [行数]  (排序列: {', '.join(SORT_KEYS)})"
+
+def show_routes(args):
+    """各路由在滑动窗口内的延迟分位数、请求速率与错误率: routes [窗口秒] [排序列] [行数]"""
+    stats = supervisor.route_stats
+    numbers = [int(a) for a in args if a.isdigit()]
+    sorts = [a for a in args if not a.isdigit()]
+    if len(numbers) > 2 or len(sorts) > 1 or (sorts and sorts[0] not in SORT_KEYS):
+        log(ROUTES_USAGE, Colors.YELLOW)
+        return
+    window = numbers[0] if numbers else stats.windows[0]
+    limit = numbers[1] if len(numbers) > 1 else 20
+    if not 0 < window <= max(stats.windows):
+        log(f"窗口最长 {max(stats.windows)} 秒", Colors.YELLOW)
+        return
+    sort = sorts[0] if sorts else "p95"
+    rows = stats.table(window, sort)
+    if not rows:
+        log(f"最近 {window} 秒内没有后端访问日志", Colors.YELLOW)
+        return
+    print("\n" + "=" * 96)
+    print(f"后端路由延迟 (最近 {window} 秒，按 {sort} 排序，共 {len(rows)} 条路由):")
+    print("=" * 96)
+    print(f"  {'方法':<5}{'路由':<38}{'请求':>5}{'req/s':>8}{'5xx':>7}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for row in rows[:limit]:
+        route = row.route if len(row.route) <= 40 else row.route[:37] + "..."
+        color = Colors.RED if row.errors else Colors.RESET
+        print(f"{color}  {row.method:<7}{route:<40}{row.count:>7}{row.rate:>8.2f}{row.error_rate:>7.1%}"
+              f"{format_latency(row.p50):>9}{format_latency(row.p95):>9}"
+              f"{format_latency(row.p99):>9}{format_latency(row.max):>9}{Colors.RESET}")
+    if len(rows) > limit:
+        print(f"  ... 另有 {len(rows) - limit} 条路由")
+    print("=" * 96 + "\n")
+
+BENCH_USAGE = ("用法: bench [-c 并发] [-r 每秒请求数] [-d 秒] [-n 请求数] [-w 预热秒] "
+               f"[-p 路径] [-k 令牌] [-m 模型] [--note 备注] [--stream]  (令牌默认取 {BENCH_KEY_ENV})\n"
+               "      bench ab <环境配置A> <环境配置B> [...] [同上压测参数]\n"
+               "      bench history [条数] | bench compare <基准提交> <新提交> [-t 阈值%]")
+
+def parse_bench_args(args):
+    """解析压测参数，返回 (BenchConfig, 备注, 位置参数)；参数有误返回 None"""
+    options = {"-c": "16", "-r": "0", "-d": "10", "-n": "0", "-w": "2", "-p": DEFAULT_PATH, "-k": None, "-m": None,
+               "--note": ""}
+    stream = False
+    positional = []
+    it = iter(args)
+    for arg in it:
+        if arg == "--stream":
+            stream = True
+        elif arg in options:
+            options[arg] = next(it, None)
+        elif arg.startswith("-"):
+            return None
+        else:
+            positional.append(arg)
+    try:
+        config = make_config(
+            BACKEND_PORT, options["-p"], key=options["-k"], stream=stream,
+            concurrency=int(options["-c"]), rate=float(options["-r"]), duration=float(options["-d"]),
+            requests=int(options["-n"]), warmup=float(options["-w"]),
+            **({"model": options["-m"]} if options["-m"] else {}))
+    except (TypeError, ValueError):
+        return None
+    if config.path.startswith("/v1/") and "Authorization" not in config.headers:
+        log(f"未提供令牌（-k 或 {BENCH_KEY_ENV}），请求将返回 401", Colors.YELLOW)
+    return config, options["--note"] or "", positional
+
+def bench_progress(done, rps, remaining):
+    print(f"{Colors.CYAN}  已完成 {done}  当前 {rps:.0f} req/s  剩余 {remaining:.0f}s{Colors.RESET}")
+
+def run_benchmark(args):
+    """压测当前运行的后端，结果记入压测结果库；ab 对比环境配置，history / compare 查看与对比历史结果"""
+    if args and args[0] in ("history", "compare"):
+        bench_store_main(args)
+        return
+    if args and args[0] == "ab":
+        run_ab_benchmark(args[1:])
+        return
+    parsed = parse_bench_args(args)
+    if parsed is None or parsed[2]:
+        log(BENCH_USAGE, Colors.YELLOW)
+        return
+    config, note, _ = parsed
+    backend = supervisor.services["backend"]
+    if not backend.running:
+        log("后端未运行，请先启动后端", Colors.RED)
+        return
+
+    log(f"开始压测 {config.method} {config.path} ...", Colors.CYAN)
+    try:
+        result = run_bench(config, bench_progress)
+    except KeyboardInterrupt:
+        log("压测已中断", Colors.YELLOW)
+        return
+    report = format_report(result)
+    for line in report:
+        print(f"  {line}")
+    run_id = record_bench(result, profile=backend.env_profile, note=note)
+    log(f"结果已记录 (#{run_id})，可用 bench compare <基准提交> <新提交> 对比", Colors.CYAN)
+    supervisor.say_threadsafe("压测完成: " + " | ".join(report[1:]))
+
+def backend_usage(since, until):
+    """后端进程树在 [since, until]（time.time()）内的平均 CPU% 与峰值 RSS；没有采样返回 None"""
+    sampler = supervisor.sampler
+    samples = [(cpu, rss) for t, cpu, rss in zip(sampler.series("backend", "time"), sampler.series("backend", "cpu"),
+                                                 sampler.series("backend", "rss"))
+               if since <= t <= until]
+    if not samples:
+        return None
+    return sum(cpu for cpu, _ in samples) / len(samples), max(rss for _, rss in samples)
+
+def run_ab_benchmark(args):
+    """
+    bench ab <配置A> <配置B> [...] [压测参数]：依次切换环境配置并重新启动后端，
+    每个配置使用相同的预热与压测参数，最后输出吞吐、尾延迟、RSS 与 CPU 的对比表
+    """
+    parsed = parse_bench_args(args)
+    if parsed is None or len(parsed[2]) < 2:
+        log(BENCH_USAGE, Colors.YELLOW)
+        return
+    config, note, names = parsed
+    unknown = [name for name in names if name not in supervisor.env_profiles]
+    if unknown:
+        log(f"未知的环境配置: {', '.join(unknown)}（可选: {', '.join(supervisor.env_profiles)}）", Colors.RED)
+        return
+    original = supervisor.services["backend"].env_profile
+    rows = []
+    try:
+        for i, name in enumerate(names, 1):
+            log(f"[{i}/{len(names)}] 环境配置 {name}: 重新启动后端...", Colors.CYAN)
+            if not supervisor.set_env_profile(name, start=True).result():
+                log(f"{name}: 后端未能启动，跳过", Colors.RED)
+                continue
+            log(f"[{i}/{len(names)}] 环境配置 {name}: 预热 {config.warmup:g}s 后开始压测 {config.method} {config.path}",
+                Colors.CYAN)
+            begin = time.time() + config.warmup
+            result = run_bench(config, bench_progress)
+            usage = backend_usage(begin, time.time())
+            run_id = record_bench(result, profile=name, note=note or f"ab {' '.join(names)}")
+            rows.append((name, result, usage, run_id))
+            print("  " + format_report(result)[1])
+    except KeyboardInterrupt:
+        log("A/B 压测已中断", Colors.YELLOW)
+    finally:
+        if supervisor.services["backend"].env_profile != original:
+            log(f"恢复环境配置 {original}", Colors.CYAN)
+            supervisor.set_env_profile(original).result()
+    if rows:
+        show_ab_table(rows)
+
+# A/B 对比表的列：(标题, 显示宽度, 对齐)，表头与各行共用
+AB_COLUMNS = (
+    ("环境配置", 16, "<"), ("req/s", 10, ">"), ("变化", 9, ">"), ("p50", 10, ">"), ("p99", 10, ">"),
+    ("p99.9", 10, ">"), ("失败", 8, ">"), ("RSS峰值", 11, ">"), ("CPU%", 8, ">"), ("记录", 8, ">"),
+)
+AB_TABLE_WIDTH = 2 + sum(width for _, width, _ in AB_COLUMNS)
+
+def ab_table_line(cells):
+    return "  " + "".join(pad(str(cell), width, align) for cell, (_, width, align) in zip(cells, AB_COLUMNS))
+
+def show_ab_table(rows):
+    base = rows[0][1]
+    base_rps = (base.histogram.count + sum(base.errors.values())) / base.elapsed if base.elapsed else 0
+    print("\n" + "=" * AB_TABLE_WIDTH)
+    print(f"A/B 对比 ({rows[0][1].config.method} {rows[0][1].config.path}，以 {rows[0][0]} 为基准):")
+    print("=" * AB_TABLE_WIDTH)
+    print(ab_table_line(title for title, _, _ in AB_COLUMNS))
+    for name, result, usage, run_id in rows:
+        hist = result.histogram
+        total = hist.count + sum(result.errors.values())
+        rps = total / result.elapsed if result.elapsed else 0
+        change = f"{(rps - base_rps) / base_rps:+.1%}" if base_rps else "-"
+        failures = sum(result.errors.values()) + sum(n for status, n in result.statuses.items() if status >= 400)
+        rss, cpu = (format_bytes(usage[1]), f"{usage[0]:.0f}") if usage else ("-", "-")
+        print(ab_table_line((name, f"{rps:.1f}", change, format_ms(hist.percentile(50)), format_ms(hist.percentile(99)),
+                             format_ms(hist.percentile(99.9)), failures, rss, cpu, f"#{run_id}")))
+    print("=" * AB_TABLE_WIDTH + "\n")
+
+def manage_env_profile(args):
+    """环境配置: profile [list] | profile use <名称>"""
+    backend = supervisor.services["backend"]
+    if not args or args[0] == "list":
+        for name, profile in supervisor.env_profiles.items():
+            current = "*" if name == backend.env_profile else " "
+            note = f"  {profile.description}" if profile.description else ""
+            print(f"  {current} {name:<16}{note}")
+            print(f"      {describe_profile(profile)}")
+        return
+    if args[0] == "use" and len(args) == 2:
+        if args[1] not in supervisor.env_profiles:
+            log(f"未知的环境配置: {args[1]}（可选: {', '.join(supervisor.env_profiles)}）", Colors.RED)
+            return
+        try:
+            supervisor.set_env_profile(args[1]).result()
+        except (ValueError, DaemonError) as e:
+            log(str(e), Colors.RED)
+        return
+    log("用法: profile [list] | profile use <名称>", Colors.YELLOW)
+
+def manage_mock(args):
+    """模拟上游: mock [start|stop|register|set key=value ...]"""
+    action = args[0] if args else "status"
+    mock = supervisor.services["mock"]
+    if action in ("start", "stop", "register"):
+        try:
+            if action == "start":
+                supervisor.start_service("mock").result()
+                log(f"压测网关开销: bench -m {CHAT_MODEL}", Colors.CYAN)
+            elif action == "stop":
+                supervisor.stop_service("mock").result()
+            else:
+                supervisor.register_mock().result()
+        except (RuntimeError, OSError, DaemonError) as e:
+            log(f"操作失败: {e}", Colors.RED)
+    elif action == "set":
+        try:
+            update = parse_settings(args[1:])
+            supervisor.configure_mock(update).result()
+        except (ValueError, RuntimeError, OSError, DaemonError) as e:
+            log(f"设置失败: {e}", Colors.RED)
+    elif action == "status":
+        state = f"运行中 (端口 {MOCK_PORT})" if mock.running else "未运行"
+        config = dict(MOCK_DEFAULTS, **mock.config)
+        log(f"模拟上游: {state}", Colors.CYAN)
+        print("  " + "  ".join(f"{k}={v}" for k, v in config.items()))
+    else:
+        log("用法: mock [start|stop|register|set key=value ...]", Colors.YELLOW)
+
+PPROF_USAGE = ("用法: pprof on|off | capture [秒] [备注] | list | top [采集] [类型] [N] | "
+               "diff <基准> <新> [类型] [N]   (采集可用序号 1=最近一次，或目录名/提交号)")
+
+def manage_pprof(args):
+    """性能剖析：开关、采集、查看与对比"""
+    action = args[0] if args else "list"
+    rest = args[1:]
+    try:
+        if action in ("on", "off"):
+            future = supervisor.set_profiling(action == "on")
+            if future is not None:
+                future.result()
+        elif action == "capture":
+            seconds = int(rest[0]) if rest else DEFAULT_WINDOW
+            supervisor.capture_profiles(seconds, " ".join(rest[1:])).result()
+        elif action == "list":
+            captures = list_captures()
+            if not captures:
+                log("还没有采集记录，先执行 pprof on 和 pprof capture", Colors.YELLOW)
+            for i, (name, meta) in enumerate(captures, 1):
+                print(f"  {i:>3}  {describe(name, meta)}")
+        elif action == "top":
+            directory = resolve(rest[0] if rest else "1")
+            kind = rest[1] if len(rest) > 1 else "cpu"
+            n = int(rest[2]) if len(rest) > 2 else TOP_N
+            log(f"{os.path.basename(directory)} {kind}", Colors.CYAN)
+            for line in profile_top(directory, kind, n):
+                print(line)
+        elif action == "diff" and len(rest) >= 2:
+            base, new = resolve(rest[0]), resolve(rest[1])
+            kind = rest[2] if len(rest) > 2 else "cpu"
+            n = int(rest[3]) if len(rest) > 3 else TOP_N
+            log(f"{kind}: {os.path.basename(new)} 相对 {os.path.basename(base)}（正值为新增开销）", Colors.CYAN)
+            for line in profile_diff(base, new, kind, n):
+                print(line)
+        else:
+            log(PPROF_USAGE, Colors.YELLOW)
+    except ValueError:
+        log(PPROF_USAGE, Colors.YELLOW)
+    except ProfileError as e:
+        log(str(e), Colors.RED)
+
+FLIGHT_USAGE = ("用法: flight                     查看飞行记录设置与最近的现场包\n"
+                "      flight on|off              开启/关闭异常时自动保存现场\n"
+                "      flight restart on|off      异常退出/无响应后按指数退避自动重启后端\n"
+                "      flight set rss=MB goroutines=N p99=毫秒   调整阈值 (0 为不检查)\n"
+                "      flight capture [备注]      立即保存一次现场\n"
+                "      flight list [条数]         列出现场包")
+
+def manage_flight(args):
+    """飞行记录：异常退出、无响应、资源超限或延迟突增时保存后端现场"""
+    action = args[0] if args else "status"
+    rest = args[1:]
+    if action in ("on", "off") and not rest:
+        supervisor.set_flight_recorder(enabled=action == "on")
+    elif action == "restart" and rest in (["on"], ["off"]):
+        supervisor.set_flight_recorder(auto_restart=rest[0] == "on")
+    elif action == "set" and rest:
+        current = Thresholds(**supervisor.snapshot()["backend"]["flight"]["thresholds"])
+        try:
+            supervisor.set_flight_recorder(thresholds=parse_thresholds(rest, current)._asdict())
+        except ValueError as e:
+            log(str(e), Colors.RED)
+    elif action == "capture":
+        directory = supervisor.capture_flight(" ".join(rest)).result()
+        if directory:
+            for name in sorted(os.listdir(directory)):
+                print(f"  {name}")
+    elif action in ("list", "status") and all(a.isdigit() for a in rest):
+        if action == "status":
+            flight = supervisor.snapshot()["backend"]["flight"]
+            limits = flight["thresholds"]
+            log(f"飞行记录: {'开启' if flight['enabled'] else '关闭'}  "
+                f"自动重启: {'开启' if flight['auto_restart'] else '关闭'}"
+                + (f" (已连续重启 {flight['failures']} 次)" if flight["failures"] else ""), Colors.CYAN)
+            print(f"  阈值: RSS {limits['rss_mb'] or '-'}MB  goroutine {limits['goroutines'] or '-'}  "
+                  f"路由 p99 {limits['p99_ms'] or '-'}ms")
+        bundles = list_bundles()
+        limit = int(rest[0]) if rest else 10
+        if not bundles:
+            log(f"还没有现场包（保存在 {os.path.relpath(FLIGHT_ROOT, PROJECT_ROOT)}）", Colors.YELLOW)
+        for name, meta in bundles[:limit]:
+            print(f"  {name:<28}{describe_bundle(name, meta)}")
+    else:
+        log(FLIGHT_USAGE, Colors.YELLOW)
+
+CLUSTER_USAGE = ("用法: cluster                     查看集群状态\n"
+                 f"      cluster <实例数> [策略]     启动 1-{CLUSTER_MAX} 个后端实例 (1 为单实例)\n"
+                 "      cluster off                 关闭集群模式\n"
+                 "      cluster rr|lc               切换负载均衡策略 (轮询 / 最少连接)")
+BALANCE_ALIASES = {"rr": "round_robin", "lc": "least_conn",
+                   "round_robin": "round_robin", "least_conn": "least_conn"}
+
+def manage_cluster(args):
+    """多实例集群：cluster [实例数|off] [rr|lc]"""
+    if not args:
+        cluster = supervisor.snapshot()["backend"]["cluster"]
+        if cluster:
+            show_cluster(cluster)
+        else:
+            log("集群模式未开启（cluster <实例数> 开启）", Colors.YELLOW)
+        return
+    instances, balance = None, None
+    for arg in args:
+        if arg in BALANCE_ALIASES:
+            balance = BALANCE_ALIASES[arg]
+        elif arg == "off":
+            instances = 1
+        elif arg.isdigit():
+            instances = int(arg)
+        else:
+            log(CLUSTER_USAGE, Colors.YELLOW)
+            return
+    if instances is None:
+        instances = supervisor.services["backend"].instances
+    future = supervisor.set_cluster(instances, balance)
+    if future is not None:
+        future.result()
+
+# 启动记录中 cached 的含义：后端为复用缓存的二进制，前端为复用 Vite 依赖预构建
+CACHED_LABELS = {"backend": {True: "缓存", False: "重新编译"}, "frontend": {True: "热启动", False: "冷启动"}}
+
+def show_startup_history(args):
+    """各服务启动耗时的历史与中位数: startup [服务] [条数]"""
+    service = args[0] if args and not args[0].isdigit() else None
+    counts = [a for a in args if a.isdigit()]
+    limit = int(counts[0]) if counts else 10
+    services = [service] if service else ["backend", "frontend"]
+    labels = {name: label for name, label, _, _ in PHASES}
+    for name in services:
+        entries = load_history(name, 200)
+        if not entries:
+            log(f"{name}: 暂无启动记录", Colors.YELLOW)
+            continue
+        log(f"{name} 最近 {min(limit, len(entries))} 次启动:", Colors.CYAN)
+        cached_labels = CACHED_LABELS.get(name, CACHED_LABELS["backend"])
+        for entry in entries[-limit:]:
+            stamp = datetime.fromtimestamp(entry["time"]).strftime("%m-%d %H:%M:%S")
+            cached = f" {cached_labels[entry['cached']]}" if entry.get("cached") is not None else ""
+            phases = "  ".join(f"{labels.get(k, k)} {v:.2f}s" for k, v in entry["phases"].items())
+            print(f"  {stamp}  总计 {entry['total']:.2f}s{cached}  {phases}")
+        medians = history_medians(entries)
+        phases = "  ".join(f"{labels.get(k, k)} {v:.2f}s" for k, v in medians.items() if k != "total")
+        print(f"  中位数 ({len(entries)} 次)  总计 {medians['total']:.2f}s  {phases}")
+        # 有缓存与无缓存的启动分开统计
+        groups = {flag: [e for e in entries if e.get("cached") is flag] for flag in (False, True)}
+        if all(groups.values()):
+            for flag, items in groups.items():
+                medians = history_medians(items)
+                phases = "  ".join(f"{labels.get(k, k)} {v:.2f}s" for k, v in medians.items() if k != "total")
+                print(f"  {cached_labels[flag]} ({len(items)} 次)  总计 {medians['total']:.2f}s  {phases}")
+
+EDITS_USAGE = f"用法: edits [循环] [条数]  (循环: {', '.join(EDIT_LOOPS)})"
+
+def show_edit_latency(args):
+    """保存→生效耗时：最近的记录、各循环的 p50/p95 与按提交的对比"""
+    loops = [a for a in args if not a.isdigit()]
+    counts = [a for a in args if a.isdigit()]
+    if len(loops) > 1 or (loops and loops[0] not in EDIT_LOOPS):
+        log(EDITS_USAGE, Colors.YELLOW)
+        return
+    limit = int(counts[0]) if counts else 10
+    entries = [e for e in load_history(None, 2000, EDIT_HISTORY_FILE) if not loops or e.get("loop") == loops[0]]
+    if not entries:
+        log("暂无记录：开启 watch 后修改后端源码，或在 Vite 运行时修改前端源码", Colors.YELLOW)
+        return
+    log(f"最近 {min(limit, len(entries))} 次保存→生效:", Colors.CYAN)
+    for entry in entries[-limit:]:
+        stamp = datetime.fromtimestamp(entry["time"]).strftime("%m-%d %H:%M:%S")
+        more = f" 等 {len(entry['files'])} 个" if len(entry["files"]) > 1 else ""
+        print(f"  {stamp}  {EDIT_LOOPS.get(entry['loop'], entry['loop'])}  {describe_edit(entry)}"
+              f"  {entry['files'][0]}{more}")
+    log(f"汇总 ({len(entries)} 次):", Colors.CYAN)
+    for loop, (count, p50, p95, phases) in summarize_edits(entries).items():
+        split = "  ".join(f"{EDIT_PHASES[k]} {v:.2f}s" for k, v in phases.items())
+        print(f"  {EDIT_LOOPS.get(loop, loop)}: {count} 次  p50 {p50:.2f}s  p95 {p95:.2f}s"
+              + (f"  (各阶段 p50: {split})" if split else ""))
+    # 按提交分组，判断某次改动（Go 包依赖、vite.config.js 等）是否拖慢了循环
+    commits = {}
+    for entry in entries:
+        key = entry.get("commit", "?") + ("*" if entry.get("dirty") else "")
+        commits.setdefault(key, []).append(entry)
+    if len(commits) > 1:
+        log("按提交 (* 为有未提交改动):", Colors.CYAN)
+        for commit, items in list(commits.items())[-5:]:
+            for loop, (count, p50, p95, _) in summarize_edits(items).items():
+                print(f"  {commit:<10} {EDIT_LOOPS.get(loop, loop)}: {count} 次  p50 {p50:.2f}s  p95 {p95:.2f}s")
+
+def set_sample_interval(args):
+    """调整资源采样间隔: sample <秒>"""
+    try:
+        supervisor.set_sample_interval(args[0])
+    except (IndexError, ValueError):
+        log(f"用法: sample <秒>（当前 {supervisor.sampler.interval:g}s）", Colors.YELLOW)
+
 def show_help():
     """显示帮助信息"""
     print("""
@@ -177,6 +703,26 @@ def show_help():
 ║    5 / rf       - 仅重启前端                                 ║
 ║    6 / status   - 查看服务状态                               ║
 ║    7 / help     - 显示帮助                                   ║
+║    8 / watch    - 开启/关闭源码变化自动重启                  ║
+║    9 / bg       - 开启/关闭无缝重启 (蓝绿切换)               ║
+║    bundle       - 开启/关闭生产包模式 (前端嵌入后端二进制)   ║
+║    logs <服务> <时间> [行数] - 回看落盘日志                  ║
+║    grep [-s 服务] [-l 级别] [-e 正则] 关键字 - 检索日志      ║
+║    sample <秒>  - 调整资源采样间隔                           ║
+║    stats        - 后端运行时统计 (goroutine/堆/磁盘缓存)     ║
+║    routes [窗口秒] [排序列] - 各路由延迟分位数/速率/错误率   ║
+║    bench [-c 并发|-r 速率] [-d 秒|-n 次数] - 压测后端        ║
+║    bench history | compare <提交A> <提交B> [-t 阈值%] - 对比 ║
+║    bench ab <配置A> <配置B> [压测参数] - 各环境配置 A/B 压测 ║
+║    profile [list|use <名称>] - 查看/切换后端环境配置         ║
+║    mock [start|stop|register|set k=v] - 模拟上游             ║
+║    pprof on|off|capture|list|top|diff - 性能剖析             ║
+║    flight [on|off|restart|set|capture|list] - 异常现场记录   ║
+║    startup [服务] [条数] - 启动耗时分解与历史                ║
+║    edits [循环] [条数] - 保存到生效的耗时 (编译/重启/HMR)    ║
+║    cluster [实例数|off] [rr|lc] - 多实例集群与负载均衡       ║
+║    svc [start|stop|restart <服务>] - 服务清单与单个服务启停  ║
+║    shutdown     - 停止守护进程及其中的所有服务并退出         ║
 ║    0 / quit     - 退出程序                                   ║
 ╚══════════════════════════════════════════════════════════════╝
 """)
@@ -187,6 +733,11 @@ def main():
     if sys.platform == "win32":
         os.system("chcp 65001 >nul 2>&1")
 
+    # 非交互模式：dev_manager.py bench compare <基准提交> <新提交>，发现回退时退出码非零，可作为合并前的性能检查
+    argv = [a for a in sys.argv[1:] if a != "--local"]
+    if argv[:1] == ["bench"]:
+        sys.exit(bench_store_main(argv[1:]))
+
     print(f"""
 {Colors.CYAN}
 ╔══════════════════════════════════════════════════════════════╗
@@ -199,20 +750,41 @@ def main():
 
     show_help()
 
-    # 自动启动服务
-    log("自动启动所有服务...", Colors.CYAN)
-    start_backend()
-    time.sleep(2)  # 等待后端启动
-    start_frontend()
+    global supervisor
+    if "--local" in sys.argv:
+        supervisor = Supervisor().start()
+    else:
+        try:
+            supervisor = attach()
+            log(f"已连接守护进程 (PID: {supervisor.daemon_pid})，退出后服务继续运行", Colors.CYAN)
+        except DaemonError as e:
+            log(f"{e}，改为在当前进程中管理服务", Colors.RED)
+            supervisor = Supervisor().start()
+    remote = isinstance(supervisor, RemoteSupervisor)
+    subscription = supervisor.subscribe()
+    threading.Thread(target=stream_output, args=(subscription,), daemon=True).start()
+    if supervisor.config_error:
+        log(supervisor.config_error, Colors.RED)
+
+    # 自动启动服务；守护进程中已有服务在运行时沿用，不重启
+    if remote and any(info["pid"] for info in supervisor.snapshot().values()):
+        log("守护进程中的服务已在运行，沿用现有进程", Colors.CYAN)
+    else:
+        log("自动启动所有服务...", Colors.CYAN)
+        start_all()
 
     # 命令循环
     while True:
         try:
-            cmd = input(f"\n{Colors.YELLOW}输入命令 (help 查看帮助): {Colors.RESET}").strip().lower()
+            line = input(f"\n{Colors.YELLOW}输入命令 (help 查看帮助): {Colors.RESET}").strip()
+            try:
+                cmd, *args = shlex.split(line) or [""]
+            except ValueError:
+                cmd, *args = line.split() or [""]
+            cmd = cmd.lower()
 
             if cmd in ["1", "start"]:
-                start_backend()
-                start_frontend()
+                start_all()
             elif cmd in ["2", "stop"]:
                 stop_all()
             elif cmd in ["3", "restart"]:
@@ -225,24 +797,69 @@ def main():
                 show_status()
             elif cmd in ["7", "help", "?"]:
                 show_help()
+            elif cmd in ["8", "watch"]:
+                toggle_watch()
+            elif cmd in ["9", "bg"]:
+                toggle_blue_green()
+            elif cmd == "bundle":
+                toggle_bundle()
+            elif cmd == "logs":
+                show_logs(args)
+            elif cmd == "grep":
+                grep_logs(args)
+            elif cmd == "sample":
+                set_sample_interval(args)
+            elif cmd == "stats":
+                show_runtime_stats()
+            elif cmd == "routes":
+                show_routes(args)
+            elif cmd == "bench":
+                run_benchmark(args)
+            elif cmd == "profile":
+                manage_env_profile(args)
+            elif cmd == "mock":
+                manage_mock(args)
+            elif cmd == "pprof":
+                manage_pprof(args)
+            elif cmd == "flight":
+                manage_flight(args)
+            elif cmd == "startup":
+                show_startup_history(args)
+            elif cmd == "edits":
+                show_edit_latency(args)
+            elif cmd == "cluster":
+                manage_cluster(args)
+            elif cmd == "svc":
+                manage_services(args)
             elif cmd in ["0", "quit", "exit", "q"]:
                 log("正在退出...", Colors.YELLOW)
-                stop_all()
+                break
+            elif cmd == "shutdown":
+                if remote:
+                    log("正在停止守护进程...", Colors.YELLOW)
+                    supervisor.stop_daemon()
+                    remote = False
                 break
             elif cmd == "":
                 continue
             else:
                 log(f"未知命令: {cmd}", Colors.RED)
 
+        except DaemonError as e:
+            # 守护进程中执行出错或连接已断开：其余命令直接等待的 Future 也会以此结束，不应退出管理器
+            log(f"守护进程: {e}", Colors.RED)
         except KeyboardInterrupt:
             print()
             log("检测到 Ctrl+C，正在退出...", Colors.YELLOW)
-            stop_all()
             break
         except EOFError:
             break
 
-    log("程序已退出", Colors.GREEN)
+    supervisor.shutdown()
+    if remote:
+        log("已断开守护进程，服务继续运行（dev_manager.py 可重新连接，shutdown 停止守护进程）", Colors.GREEN)
+    else:
+        log("程序已退出", Colors.GREEN)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 模拟上游
+功能：本地 OpenAI 兼容服务（chat/completions、embeddings、SSE 流式），
+      可调首字延迟、输出速率、响应大小并注入 429/5xx/超时，用于在无真实供应商时测量网关自身开销
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import time
+import uuid
+
+from dev_runtimestats import ACCESS_TOKEN_ENV, USER_ID_ENV
+
+MOCK_PORT = 3060
+CHANNEL_NAME = "dev-mock"
+CHAT_MODEL = "mock-gpt"
+EMBEDDING_MODEL = "mock-embedding"
+MOCK_KEY = "sk-mock"
+STATS_EVERY = 10.0
+
+# 可在运行中通过 POST /mock/config 修改
+DEFAULT_CONFIG = {
+    "ttft_ms": 200,             # 首个 token 前的延迟
+    "tokens_per_sec": 50,       # 流式输出速率，0 表示不限速
+    "completion_tokens": 64,    # 每次回复的 token 数（请求中 max_tokens 更小时取其值）
+    "token_bytes": 4,           # 每个 token 的文本长度，用于放大响应体
+    "embedding_dim": 1536,
+    "rate_429": 0.0,            # 各类故障的注入概率
+    "rate_5xx": 0.0,
+    "rate_timeout": 0.0,
+    "timeout_sec": 120,         # 超时故障：挂起这么久后直接断开
+}
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests",
+           500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+class MockUpstream:
+    def __init__(self, port=MOCK_PORT, config=None):
+        self.port = port
+        self.config = dict(DEFAULT_CONFIG)
+        self.config.update(config or {})
+        self.counts = {}
+        self.started = time.time()
+
+    # ---------- HTTP ----------
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+                keep = await self.dispatch(method, path.split("?", 1)[0], body, writer)
+                if not keep or headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def send_json(writer, status, payload):
+        data = json.dumps(payload).encode()
+        writer.write((f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                      "Content-Type: application/json\r\n"
+                      f"Content-Length: {len(data)}\r\n\r\n").encode() + data)
+        await writer.drain()
+
+    @staticmethod
+    def error_body(message, kind):
+        return {"error": {"message": message, "type": kind, "param": None, "code": None}}
+
+    async def inject_fault(self, writer):
+        """按配置的概率注入故障，已处理时返回 (True, 是否保持连接)"""
+        cfg = self.config
+        roll = random.random()
+        if roll < cfg["rate_timeout"]:
+            self.count("timeout")
+            await asyncio.sleep(cfg["timeout_sec"])
+            return True, False
+        roll -= cfg["rate_timeout"]
+        if roll < cfg["rate_429"]:
+            self.count("429")
+            await self.send_json(writer, 429, self.error_body("Rate limit reached (mock)", "rate_limit_error"))
+            return True, True
+        roll -= cfg["rate_429"]
+        if roll < cfg["rate_5xx"]:
+            status = random.choice((500, 502, 503))
+            self.count(str(status))
+            await self.send_json(writer, status, self.error_body("Upstream failure (mock)", "server_error"))
+            return True, True
+        return False, True
+
+    def count(self, key):
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    async def dispatch(self, method, path, body, writer):
+        if path == "/mock/config":
+            if method == "POST":
+                try:
+                    update = json.loads(body or b"{}")
+                    for key, value in update.items():
+                        if key in DEFAULT_CONFIG:
+                            self.config[key] = type(DEFAULT_CONFIG[key])(value)
+                except (ValueError, TypeError) as e:
+                    await self.send_json(writer, 400, self.error_body(str(e), "invalid_request_error"))
+                    return True
+                print(f"[MOCK] 配置已更新: {json.dumps(self.config, ensure_ascii=False)}", flush=True)
+            await self.send_json(writer, 200, self.config)
+            return True
+        if path == "/v1/models":
+            await self.send_json(writer, 200, {"object": "list", "data": [
+                {"id": m, "object": "model", "created": int(self.started), "owned_by": "mock"}
+                for m in (CHAT_MODEL, EMBEDDING_MODEL)]})
+            return True
+        if method != "POST" or path not in ("/v1/chat/completions", "/v1/embeddings"):
+            await self.send_json(writer, 404, self.error_body(f"{method} {path} not found", "invalid_request_error"))
+            return True
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            await self.send_json(writer, 400, self.error_body("invalid JSON body", "invalid_request_error"))
+            return True
+        handled, keep = await self.inject_fault(writer)
+        if handled:
+            return keep
+        self.count(path.rsplit("/", 1)[1])
+        if path == "/v1/embeddings":
+            await self.embeddings(request, writer)
+        elif request.get("stream"):
+            await self.chat_stream(request, writer)
+        else:
+            await self.chat(request, writer)
+        return True
+
+    # ---------- 接口 ----------
+
+    def completion_tokens(self, request):
+        n = self.config["completion_tokens"]
+        limit = request.get("max_tokens") or request.get("max_completion_tokens")
+        return max(1, min(n, int(limit))) if limit else max(1, n)
+
+    def token_text(self):
+        return "x" * (self.config["token_bytes"] - 1) + " "
+
+    @staticmethod
+    def prompt_tokens(request):
+        text = json.dumps(request.get("messages") or request.get("input") or "")
+        return max(1, len(text) // 4)
+
+    async def chat(self, request, writer):
+        n = self.completion_tokens(request)
+        cfg = self.config
+        delay = cfg["ttft_ms"] / 1000
+        if cfg["tokens_per_sec"] > 0:
+            delay += (n - 1) / cfg["tokens_per_sec"]
+        await asyncio.sleep(delay)
+        prompt = self.prompt_tokens(request)
+        await self.send_json(writer, 200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", CHAT_MODEL),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": self.token_text() * n}}],
+            "usage": {"prompt_tokens": prompt, "completion_tokens": n, "total_tokens": prompt + n},
+        })
+
+    async def chat_stream(self, request, writer):
+        n = self.completion_tokens(request)
+        cfg = self.config
+        cid = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = request.get("model", CHAT_MODEL)
+        created = int(time.time())
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n")
+
+        def chunk(delta, finish=None, usage=None):
+            payload = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if delta is not None else []}
+            if usage is not None:
+                payload["usage"] = usage
+            return self.sse(json.dumps(payload))
+
+        await asyncio.sleep(cfg["ttft_ms"] / 1000)
+        writer.write(chunk({"role": "assistant", "content": ""}))
+        interval = 1 / cfg["tokens_per_sec"] if cfg["tokens_per_sec"] > 0 else 0
+        text = self.token_text()
+        start = time.monotonic()
+        for i in range(n):
+            if interval:
+                # 按计划时间输出，避免 sleep 误差累积
+                delay = start + i * interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            writer.write(chunk({"content": text}))
+            await writer.drain()
+        writer.write(chunk({}, "stop"))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            prompt = self.prompt_tokens(request)
+            writer.write(chunk(None, usage={"prompt_tokens": prompt, "completion_tokens": n,
+                                            "total_tokens": prompt + n}))
+        writer.write(self.sse("[DONE]") + b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def sse(data):
+        event = f"data: {data}\n\n".encode()
+        return f"{len(event):x}\r\n".encode() + event + b"\r\n"
+
+    async def embeddings(self, request, writer):
+        inputs = request.get("input") or ""
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        await asyncio.sleep(self.config["ttft_ms"] / 1000)
+        dim = self.config["embedding_dim"]
+        prompt = self.prompt_tokens(request)
+        await self.send_json(writer, 200, {
+            "object": "list",
+            "model": request.get("model", EMBEDDING_MODEL),
+            "data": [{"object": "embedding", "index": i,
+                      "embedding": [round(random.uniform(-1, 1), 6) for _ in range(dim)]}
+                     for i in range(len(inputs))],
+            "usage": {"prompt_tokens": prompt, "total_tokens": prompt},
+        })
+
+    # ---------- 运行 ----------
+
+    async def report(self):
+        last = {}
+        while True:
+            await asyncio.sleep(STATS_EVERY)
+            if self.counts != last:
+                summary = ", ".join(f"{k}={v}" for k, v in sorted(self.counts.items()))
+                print(f"[MOCK] 累计请求: {summary}", flush=True)
+                last = dict(self.counts)
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, "127.0.0.1", self.port, reuse_address=True)
+        print(f"[MOCK] 模拟上游已监听 127.0.0.1:{self.port} "
+              f"配置: {json.dumps(self.config, ensure_ascii=False)}", flush=True)
+        asyncio.ensure_future(self.report())
+        async with server:
+            await server.serve_forever()
+
+
+# ---------- 注册为后端渠道 ----------
+
+def _admin_request(conn, method, path, token, user_id, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else None
+    headers = {"Authorization": token, "New-Api-User": user_id}
+    if body is not None:
+        headers["Content-Type"] = "application/json"
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    data = json.loads(response.read() or b"{}")
+    if not data.get("success"):
+        raise RuntimeError(data.get("message") or f"HTTP {response.status}")
+    return data.get("data")
+
+
+def register_channel(backend_port, mock_port=MOCK_PORT, token=None, user_id=None):
+    """
+    在后端中创建（或更新）名为 dev-mock 的 OpenAI 渠道指向模拟上游
+    需要管理员 access token；返回 "created" 或 "updated"
+    """
+    token = token or os.environ.get(ACCESS_TOKEN_ENV, "")
+    user_id = user_id or os.environ.get(USER_ID_ENV, "1")
+    if not token:
+        raise RuntimeError(f"未设置环境变量 {ACCESS_TOKEN_ENV}")
+    channel = {
+        "name": CHANNEL_NAME,
+        "type": 1,              # constant.ChannelTypeOpenAI
+        "key": MOCK_KEY,
+        "base_url": f"http://127.0.0.1:{mock_port}",
+        "models": f"{CHAT_MODEL},{EMBEDDING_MODEL}",
+        "group": "default",
+        "status": 1,
+    }
+    conn = http.client.HTTPConnection("127.0.0.1", backend_port, timeout=10)
+    try:
+        found = _admin_request(conn, "GET", f"/api/channel/search?keyword={CHANNEL_NAME}", token, user_id)
+        items = (found or {}).get("items") or []
+        existing = next((c for c in items if c.get("name") == CHANNEL_NAME), None)
+        if existing:
+            channel["id"] = existing["id"]
+            _admin_request(conn, "PUT", "/api/channel/", token, user_id, channel)
+            return "updated"
+        _admin_request(conn, "POST", "/api/channel/", token, user_id, {"mode": "single", "channel": channel})
+        return "created"
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        raise RuntimeError(f"请求后端失败: {e}")
+    finally:
+        conn.close()
+
+
+def set_config(mock_port, update):
+    """修改运行中的模拟上游配置，返回生效后的完整配置"""
+    conn = http.client.HTTPConnection("127.0.0.1", mock_port, timeout=3)
+    try:
+        conn.request("POST", "/mock/config", body=json.dumps(update).encode(),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(data.get("error", {}).get("message", f"HTTP {response.status}"))
+        return data
+    finally:
+        conn.close()
+
+
+def parse_settings(args):
+    """把 key=value 列表解析为配置更新"""
+    update = {}
+    for arg in args:
+        key, sep, value = arg.partition("=")
+        if not sep or key not in DEFAULT_CONFIG:
+            raise ValueError(f"未知配置项: {arg}（可选: {', '.join(DEFAULT_CONFIG)}）")
+        update[key] = type(DEFAULT_CONFIG[key])(value)
+    return update
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NEW_API 模拟上游")
+    parser.add_argument("--port", type=int, default=MOCK_PORT)
+    parser.add_argument("--config", default="{}", help="JSON 格式的初始配置")
+    args = parser.parse_args()
+    try:
+        asyncio.run(MockUpstream(args.port, json.loads(args.config)).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
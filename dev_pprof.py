@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 性能剖析采集
+功能：从后端 pprof 端口（ENABLE_PPROF=true 时监听 PPROF_PORT，默认 8005）采集 cpu/heap/goroutine/mutex/block，
+      按提交号和时间归档，用 go tool pprof 汇总热点函数并对比两次采集
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dev_build import CACHE_DIR, BACKEND_DIR
+
+# 后端未设置 PPROF_PORT 时的默认端口
+PPROF_PORT = 8005
+PROFILE_ROOT = os.path.join(CACHE_DIR, "pprof")
+DEFAULT_WINDOW = 30
+TOP_N = 20
+# 启用剖析时传给后端的环境变量；mutex 按 1/5 采样，block 记录阻塞超过 10us 的事件
+PROFILE_ENV = {
+    "ENABLE_PPROF": "true",
+    "PPROF_MUTEX_RATE": "5",
+    "PPROF_BLOCK_RATE": "10000",
+}
+# 类型 -> 是否按时间窗口采集（否则为采集结束时的快照）
+PROFILE_KINDS = {
+    "cpu": True,
+    "mutex": True,
+    "block": True,
+    "heap": False,
+    "goroutine": False,
+}
+_URL_NAMES = {"cpu": "profile"}
+
+
+class ProfileError(Exception):
+    pass
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True,
+                              timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def source_revision():
+    """(短提交号, 后端目录是否有未提交改动)"""
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    dirty = bool(_git("status", "--porcelain", "--", "."))
+    return commit, dirty
+
+
+def _fetch(kind, seconds, target, port=PPROF_PORT):
+    name = _URL_NAMES.get(kind, kind)
+    query = f"?seconds={seconds}" if PROFILE_KINDS[kind] else ""
+    url = f"http://127.0.0.1:{port}/debug/pprof/{name}{query}"
+    try:
+        with urllib.request.urlopen(url, timeout=seconds + 30) as response, open(target, "wb") as f:
+            shutil.copyfileobj(response, f)
+    except OSError as e:
+        raise ProfileError(f"{kind}: {e}")
+
+
+def goroutine_dump(timeout=10, port=PPROF_PORT):
+    """所有 goroutine 的完整栈（文本，与 SIGQUIT 输出格式相同），不影响进程运行"""
+    url = f"http://127.0.0.1:{port}/debug/pprof/goroutine?debug=2"
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read().decode("utf-8", "replace")
+    except OSError as e:
+        raise ProfileError(f"goroutine: {e}")
+
+
+def capture(seconds=DEFAULT_WINDOW, kinds=tuple(PROFILE_KINDS), note="", port=PPROF_PORT):
+    """
+    从 port 上的实例并行采集各类 profile：窗口类在同一时间段内采集，快照类在窗口结束时采集
+    返回归档目录，目录名为 <时间>-<提交号>[-dirty]
+    """
+    commit, dirty = source_revision()
+    started = time.time()
+    name = datetime.fromtimestamp(started).strftime("%Y%m%d-%H%M%S") + f"-{commit}" + ("-dirty" if dirty else "")
+    directory = os.path.join(PROFILE_ROOT, name)
+    os.makedirs(directory, exist_ok=True)
+    windowed = [k for k in kinds if PROFILE_KINDS[k]]
+    snapshots = [k for k in kinds if not PROFILE_KINDS[k]]
+    errors = []
+    with ThreadPoolExecutor(max_workers=len(kinds)) as pool:
+        futures = {pool.submit(_fetch, k, seconds, os.path.join(directory, f"{k}.pb.gz"), port): k
+                   for k in windowed}
+        if windowed:
+            time.sleep(seconds)
+        futures.update({pool.submit(_fetch, k, seconds, os.path.join(directory, f"{k}.pb.gz"), port): k
+                        for k in snapshots})
+        failed = set()
+        for future, kind in futures.items():
+            try:
+                future.result()
+            except ProfileError as e:
+                errors.append(str(e))
+                failed.add(kind)
+                try:
+                    os.remove(os.path.join(directory, f"{kind}.pb.gz"))
+                except OSError:
+                    pass
+    captured = [k for k in kinds if k not in failed]
+    if not captured:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise ProfileError("; ".join(errors) or "没有采集到任何 profile")
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"commit": commit, "dirty": dirty, "time": started, "seconds": seconds,
+                   "profiles": captured, "errors": errors, "note": note}, f, ensure_ascii=False, indent=2)
+    return directory
+
+
+def list_captures():
+    """按时间从新到旧返回 [(目录名, meta)]"""
+    try:
+        names = sorted(os.listdir(PROFILE_ROOT), reverse=True)
+    except OSError:
+        return []
+    captures = []
+    for name in names:
+        try:
+            with open(os.path.join(PROFILE_ROOT, name, "meta.json"), encoding="utf-8") as f:
+                captures.append((name, json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return captures
+
+
+def resolve(ref):
+    """把 "1"（最近一次）、"2"…… 或目录名前缀解析为归档目录"""
+    captures = list_captures()
+    if ref.isdigit() and 0 < int(ref) <= len(captures):
+        return os.path.join(PROFILE_ROOT, captures[int(ref) - 1][0])
+    matches = [name for name, _ in captures if name.startswith(ref) or ref in name.split("-")]
+    if len(matches) == 1:
+        return os.path.join(PROFILE_ROOT, matches[0])
+    raise ProfileError(f"找不到唯一匹配的采集: {ref}" + (f"（{len(matches)} 个匹配）" if matches else ""))
+
+
+def _profile_path(directory, kind):
+    if kind not in PROFILE_KINDS:
+        raise ProfileError(f"未知类型: {kind}（可选: {', '.join(PROFILE_KINDS)}）")
+    path = os.path.join(directory, f"{kind}.pb.gz")
+    if not os.path.exists(path):
+        raise ProfileError(f"{os.path.basename(directory)} 中没有 {kind} profile")
+    return path
+
+
+def _pprof_top(args, n):
+    cmd = ["go", "tool", "pprof", "-top", f"-nodecount={n}", *args]
+    try:
+        result = subprocess.run(cmd, cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120,
+                                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0)
+    except (OSError, subprocess.SubprocessError) as e:
+        raise ProfileError(f"运行 go tool pprof 失败: {e}")
+    if result.returncode != 0:
+        raise ProfileError(result.stderr.strip() or "go tool pprof 执行失败")
+    return result.stdout.rstrip().splitlines()
+
+
+def top(directory, kind="cpu", n=TOP_N):
+    """某次采集的热点函数（go tool pprof -top 的输出），结果缓存在归档目录中"""
+    path = _profile_path(directory, kind)
+    cached = os.path.join(directory, f"{kind}.top{n}.txt")
+    if os.path.exists(cached):
+        with open(cached, encoding="utf-8") as f:
+            return f.read().splitlines()
+    lines = _pprof_top([path], n)
+    with open(cached, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return lines
+
+
+def diff(base_dir, new_dir, kind="cpu", n=TOP_N):
+    """以 base 为基准对比 new，正值表示 new 中增加的开销"""
+    return _pprof_top(["-diff_base", _profile_path(base_dir, kind), _profile_path(new_dir, kind)], n)
+
+
+def describe(name, meta):
+    stamp = datetime.fromtimestamp(meta["time"]).strftime("%m-%d %H:%M:%S")
+    dirty = "*" if meta.get("dirty") else ""
+    note = f"  {meta['note']}" if meta.get("note") else ""
+    return f"{stamp}  {meta['commit']}{dirty}  {meta['seconds']}s  {','.join(meta['profiles'])}{note}"
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 进程资源采样
+功能：按进程树汇总各服务的 CPU、内存、线程数与文件描述符，保留定长历史用于绘制趋势
+"""
+
+import os
+import sys
+import time
+from collections import deque, namedtuple
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 默认采样间隔（秒）与保留的历史点数
+SAMPLE_INTERVAL = 1.0
+HISTORY_SIZE = 300
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+Sample = namedtuple("Sample", ["time", "cpu", "rss", "threads", "fds", "procs"])
+
+_PROC = "/proc"
+_HAS_PROC = sys.platform.startswith("linux") and os.path.isdir(_PROC)
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if _HAS_PROC else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if _HAS_PROC else 4096
+
+
+def available():
+    return _HAS_PROC or psutil is not None
+
+
+def _read_stat(pid):
+    """解析 /proc/<pid>/stat，返回 (ppid, pgrp, session, cpu_ticks, threads, rss_bytes)"""
+    with open(f"{_PROC}/{pid}/stat", "rb") as f:
+        data = f.read()
+    # comm 字段可能包含空格和括号，从最后一个 ')' 之后开始解析
+    fields = data[data.rindex(b")") + 2:].split()
+    return (int(fields[1]), int(fields[2]), int(fields[3]),
+            int(fields[11]) + int(fields[12]), int(fields[17]), int(fields[21]) * _PAGE_SIZE)
+
+
+def group_members(pgid):
+    """
+    进程组内仍在运行（非僵尸）的进程 PID 列表；没有 /proc 时返回 None
+    已退出但未被回收的僵尸进程不会再占用资源，不计入
+    """
+    if not _HAS_PROC:
+        return None
+    members = []
+    for entry in os.listdir(_PROC):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"{_PROC}/{entry}/stat", "rb") as f:
+                data = f.read()
+            fields = data[data.rindex(b")") + 2:].split()
+        except (OSError, ValueError):
+            continue
+        if int(fields[2]) == pgid and fields[0] not in (b"Z", b"X"):
+            members.append(int(entry))
+    return members
+
+
+def _count_fds(pid):
+    try:
+        return len(os.listdir(f"{_PROC}/{pid}/fd"))
+    except OSError:
+        return 0
+
+
+class ProcessSampler:
+    """
+    对一组根进程（各服务的主进程）采样整棵进程树
+    根进程由 start_new_session 启动，同一会话或其后代都计入该服务
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, history=HISTORY_SIZE):
+        self.interval = interval
+        self.history = {}
+        self._history_size = history
+        self._prev_ticks = {}
+        self._prev_time = None
+        self._ps_cache = {}
+
+    def latest(self, name):
+        samples = self.history.get(name)
+        return samples[-1] if samples else None
+
+    def series(self, name, field):
+        return [getattr(s, field) for s in self.history.get(name, ())]
+
+    def sample(self, roots):
+        """roots: {服务名: 根进程 pid 或 None}；返回本次的 {服务名: Sample}"""
+        now = time.monotonic()
+        if _HAS_PROC:
+            result = self._sample_proc(roots, now)
+        elif psutil is not None:
+            result = self._sample_psutil(roots)
+        else:
+            result = {}
+        self._prev_time = now
+        stamp = time.time()
+        for name, values in result.items():
+            ring = self.history.get(name)
+            if ring is None:
+                ring = self.history[name] = deque(maxlen=self._history_size)
+            ring.append(Sample(stamp, *values))
+        return {name: self.history[name][-1] for name in result}
+
+    # ---------- /proc 实现 ----------
+
+    def _sample_proc(self, roots, now):
+        stats = {}
+        children = {}
+        # 所有服务都未运行时无需遍历 /proc
+        entries = os.listdir(_PROC) if any(roots.values()) else ()
+        for entry in entries:
+            if not entry.isdigit():
+                continue
+            pid = int(entry)
+            try:
+                stat = _read_stat(pid)
+            except (OSError, ValueError, IndexError):
+                continue
+            stats[pid] = stat
+            children.setdefault(stat[0], []).append(pid)
+
+        elapsed = now - self._prev_time if self._prev_time else None
+        ticks_now = {}
+        result = {}
+        for name, root in roots.items():
+            if not root or root not in stats:
+                result[name] = (0.0, 0, 0, 0, 0)
+                continue
+            # 同一会话的进程 + 根进程的所有后代（防止子进程另起会话后漏掉）
+            members = {pid for pid, stat in stats.items() if stat[2] == root}
+            members.add(root)
+            stack = list(members)
+            while stack:
+                for child in children.get(stack.pop(), ()):
+                    if child not in members:
+                        members.add(child)
+                        stack.append(child)
+            cpu = rss = threads = fds = 0
+            for pid in members:
+                _, _, _, ticks, n_threads, rss_bytes = stats[pid]
+                ticks_now[pid] = ticks
+                if elapsed:
+                    cpu += max(0, ticks - self._prev_ticks.get(pid, ticks))
+                rss += rss_bytes
+                threads += n_threads
+                fds += _count_fds(pid)
+            cpu_percent = cpu / _CLK_TCK / elapsed * 100 if elapsed else 0.0
+            result[name] = (cpu_percent, rss, threads, fds, len(members))
+        self._prev_ticks = ticks_now
+        return result
+
+    # ---------- psutil 实现（Windows/macOS） ----------
+
+    def _sample_psutil(self, roots):
+        result = {}
+        seen = set()
+        for name, root in roots.items():
+            if not root:
+                result[name] = (0.0, 0, 0, 0, 0)
+                continue
+            try:
+                procs = [psutil.Process(root)]
+                procs += procs[0].children(recursive=True)
+            except psutil.Error:
+                result[name] = (0.0, 0, 0, 0, 0)
+                continue
+            cpu = rss = threads = fds = 0
+            for proc in procs:
+                # 复用 Process 对象，cpu_percent 才能得到两次采样间的差值
+                cached = self._ps_cache.get(proc.pid)
+                if cached is None:
+                    cached = self._ps_cache[proc.pid] = proc
+                seen.add(proc.pid)
+                try:
+                    with cached.oneshot():
+                        cpu += cached.cpu_percent(None)
+                        rss += cached.memory_info().rss
+                        threads += cached.num_threads()
+                        fds += cached.num_handles() if sys.platform == "win32" else cached.num_fds()
+                except psutil.Error:
+                    continue
+            result[name] = (cpu, rss, threads, fds, len(procs))
+        self._ps_cache = {pid: p for pid, p in self._ps_cache.items() if pid in seen}
+        return result
+
+
+def sparkline(values, width=30):
+    """把数值序列画成一行字符趋势图"""
+    values = list(values)[-width:]
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    span = high - low
+    if span <= 0:
+        return SPARK_CHARS[0] * len(values)
+    scale = len(SPARK_CHARS) - 1
+    return "".join(SPARK_CHARS[int((v - low) / span * scale)] for v in values)
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
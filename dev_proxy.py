@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 本地反向代理
+功能：在固定端口上把 HTTP 请求转发到当前后端实例，支持原子切换目标实现无缝重启；
+      集群模式下按轮询或最少连接把新连接分配到多个实例
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import Counter
+
+# 后端就绪探测地址
+READY_PATH = "/api/status"
+CHUNK_SIZE = 64 * 1024
+# 没有可用目标或后端返回无法解析的响应时回给客户端
+BAD_GATEWAY = b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+# 负载均衡策略：轮询 / 最少活动连接
+BALANCE_POLICIES = ("round_robin", "least_conn")
+
+
+class _ProtocolError(Exception):
+    """无法按 HTTP/1.x 解析的报文"""
+
+
+async def _read_head(reader):
+    """
+    读取到空行为止的起始行与消息头，返回 (原始字节, 起始行, {小写名: 值})
+    连接在两条消息之间正常关闭时返回 None
+    """
+    try:
+        raw = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise _ProtocolError("消息头不完整")
+        return None
+    except asyncio.LimitOverrunError:
+        raise _ProtocolError("消息头过长")
+    lines = raw.decode("latin-1").lstrip("\r\n").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            name, value = name.strip().lower(), value.strip()
+            headers[name] = f"{headers[name]}, {value}" if name in headers else value
+    return raw, lines[0], headers
+
+
+def _body_framing(headers):
+    """消息体的界定方式："chunked"、Content-Length 字节数，或 None（两者都没有）"""
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        return "chunked"
+    if "content-length" in headers:
+        try:
+            return int(headers["content-length"].split(",")[0])
+        except ValueError:
+            raise _ProtocolError("Content-Length 无效")
+    return None
+
+
+def _wants_close(start_line, headers):
+    tokens = {t.strip().lower() for t in headers.get("connection", "").split(",")}
+    if "close" in tokens:
+        return True
+    # HTTP/1.0 默认短连接（起始行为请求行或状态行）
+    return "HTTP/1.0" in start_line and "keep-alive" not in tokens
+
+
+async def _copy_exact(reader, writer, size, count=None):
+    while size > 0:
+        data = await reader.read(min(size, CHUNK_SIZE))
+        if not data:
+            raise asyncio.IncompleteReadError(b"", size)
+        size -= len(data)
+        if count is not None:
+            count(len(data))
+        writer.write(data)
+        await writer.drain()
+
+
+async def _copy_body(reader, writer, framing, count=None):
+    """按 framing 原样转发一个消息体；framing 为 None 时读到对端关闭为止"""
+    if framing == "chunked":
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            writer.write(line)
+            try:
+                size = int(line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise _ProtocolError("chunk 长度无效")
+            if size == 0:
+                # 结尾的 trailer 以空行结束
+                while line != b"\r\n":
+                    line = await reader.readuntil(b"\r\n")
+                    writer.write(line)
+                await writer.drain()
+                return
+            await _copy_exact(reader, writer, size + 2, count)
+    elif framing is None:
+        await _pipe(reader, writer, count)
+    else:
+        await _copy_exact(reader, writer, framing, count)
+
+
+async def _pipe(reader, writer, count=None):
+    while True:
+        data = await reader.read(CHUNK_SIZE)
+        if not data:
+            break
+        if count is not None:
+            count(len(data))
+        writer.write(data)
+        await writer.drain()
+
+
+class _Connection:
+    """一条客户端连接及其当前的上游连接；in_flight 表示有请求尚未收到完整响应"""
+
+    def __init__(self, client_writer):
+        self.client_writer = client_writer
+        self.port = None
+        self.upstream = None        # (reader, writer)
+        self.in_flight = False
+
+    def close_upstream(self):
+        if self.upstream is not None and not self.upstream[1].is_closing():
+            self.upstream[1].close()
+        self.upstream = None
+        self.port = None
+
+    def close(self):
+        self.close_upstream()
+        if not self.client_writer.is_closing():
+            self.client_writer.close()
+
+
+class ReverseProxy:
+    """
+    监听 listen_port，按 HTTP 请求转发到 targets 中的一个端口
+    keep-alive 连接在其上游实例仍是目标时沿用同一条上游连接；
+    set_target(s) 之后进行中的请求在旧实例上完成，同一连接上的下一个请求转发到新实例
+    """
+
+    def __init__(self, listen_port, host=None, policy="round_robin"):
+        self.listen_port = listen_port
+        self.host = host
+        self.targets = ()
+        self.policy = policy
+        self.accepted = Counter()       # 端口 -> 累计连接数
+        self.transferred = Counter()    # 端口 -> 累计响应字节数
+        self._rotation = itertools.count()
+        self._conns = set()
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._error = None
+
+    # ---------- 生命周期 ----------
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self):
+        if self.running:
+            return
+        self._ready.clear()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="reverse-proxy", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+
+    def stop(self):
+        if not self.running:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.listen_port, reuse_address=True))
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            self._loop.close()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            for conn in list(self._conns):
+                conn.close()
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+
+    # ---------- 切换与排空 ----------
+
+    @property
+    def target(self):
+        return self.targets[0] if self.targets else None
+
+    def set_target(self, port):
+        """原子切换转发目标，返回旧目标端口"""
+        old = self.target
+        self.set_targets([port] if port is not None else [])
+        return old
+
+    def set_targets(self, ports, policy=None):
+        if policy is not None:
+            if policy not in BALANCE_POLICIES:
+                raise ValueError(f"未知的负载均衡策略: {policy}")
+            self.policy = policy
+        self.targets = tuple(ports)
+
+    def target_stats(self):
+        """{端口: (活动连接, 累计上游连接, 累计响应字节)}"""
+        active = Counter(conn.port for conn in list(self._conns))
+        return {port: (active[port], self.accepted[port], self.transferred[port]) for port in self.targets}
+
+    def _pick(self):
+        targets = self.targets
+        if not targets:
+            return None
+        if len(targets) == 1:
+            return targets[0]
+        if self.policy == "least_conn":
+            active = Counter(conn.port for conn in self._conns)
+            # 活动连接数相同时仍按轮询顺序分配，避免总是落到第一个实例
+            start = next(self._rotation) % len(targets)
+            ordered = targets[start:] + targets[:start]
+            return min(ordered, key=lambda port: active[port])
+        return targets[next(self._rotation) % len(targets)]
+
+    def wait_drained(self, port, timeout=10.0):
+        """
+        等待转发到 port 的请求全部完成；空闲的上游连接随即关闭，
+        客户端连接保持不变，其后续请求转发到新的目标。超时返回 False
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            remaining = [conn for conn in list(self._conns) if conn.port == port]
+            busy = [conn for conn in remaining if conn.in_flight]
+            if len(busy) < len(remaining) and self._loop:
+                self._loop.call_soon_threadsafe(self._release, port)
+            if not busy:
+                return True
+            if now >= deadline:
+                return False
+            time.sleep(0.1)
+
+    def _release(self, port):
+        # 在事件循环中重新判断，期间可能已经开始了新的请求
+        for conn in list(self._conns):
+            if conn.port == port and not conn.in_flight:
+                conn.close_upstream()
+
+    # ---------- 转发 ----------
+
+    async def _handle(self, reader, writer):
+        conn = _Connection(writer)
+        self._conns.add(conn)
+        try:
+            while await self._exchange(conn, reader, writer):
+                pass
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, _ProtocolError):
+            pass
+        finally:
+            self._conns.discard(conn)
+            conn.close()
+
+    async def _connect(self, conn):
+        """
+        沿用仍指向转发目标之一的上游连接，否则按策略选择实例新建连接
+        返回是否新建；没有可用目标时抛出 OSError
+        """
+        if conn.upstream is not None and conn.port in self.targets and not conn.upstream[0].at_eof():
+            return False
+        conn.close_upstream()
+        port = self._pick()
+        if port is None:
+            raise OSError("没有可用的转发目标")
+        conn.port = port
+        try:
+            conn.upstream = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            conn.port = None
+            raise
+        self.accepted[port] += 1
+        return True
+
+    async def _exchange(self, conn, reader, writer):
+        """转发一个请求及其响应，返回客户端连接能否继续发送下一个请求"""
+        request = await _read_head(reader)
+        if request is None:
+            return False
+        raw, request_line, headers = request
+        method = request_line.split(" ", 1)[0].upper()
+        body = _body_framing(headers) or 0
+        responded = False
+
+        def count(n):
+            self.transferred[conn.port] += n
+
+        conn.in_flight = True
+        try:
+            # 复用的上游连接可能刚被后端按空闲超时关闭：没有请求体时换一条新连接重试一次
+            for retry in (True, False):
+                try:
+                    fresh = await self._connect(conn)
+                except OSError:
+                    writer.write(BAD_GATEWAY)
+                    return False
+                up_reader, up_writer = conn.upstream
+                up_writer.write(raw)
+                sender = None
+                if body:
+                    # 请求体与响应并行转发（Expect: 100-continue 时后端先回 100 再读取请求体）
+                    sender = asyncio.ensure_future(_copy_body(reader, up_writer, body))
+                    sender.add_done_callback(lambda task, w=up_writer: task.cancelled() or (
+                        task.exception() is not None and w.close()))
+                response = await _read_head(up_reader)
+                if response is None and retry and not fresh and sender is None:
+                    conn.close_upstream()
+                    continue
+                break
+            while True:
+                if response is None:
+                    if sender is not None and sender.done() and sender.exception() is not None:
+                        raise sender.exception()
+                    if not responded:
+                        writer.write(BAD_GATEWAY)
+                    return False
+                raw, status_line, response_headers = response
+                try:
+                    status = int(status_line.split(" ", 2)[1])
+                except (IndexError, ValueError):
+                    raise _ProtocolError("状态行无效")
+                writer.write(raw)
+                responded = True
+                count(len(raw))
+                if 100 <= status < 200 and status != 101:
+                    await writer.drain()
+                    response = await _read_head(up_reader)
+                    continue
+                break
+            if status == 101 or (method == "CONNECT" and 200 <= status < 300):
+                # 协议升级（如 WebSocket）：之后按原始字节双向转发，直到任一方关闭
+                await asyncio.gather(_pipe(reader, up_writer), _pipe(up_reader, writer, count))
+                return False
+            framing = 0 if method == "HEAD" or status in (204, 304) else _body_framing(response_headers)
+            await _copy_body(up_reader, writer, framing, count)
+            if sender is not None:
+                if not sender.done():
+                    # 后端未读完请求体就已响应，连接上剩余的字节无法再区分请求边界
+                    sender.cancel()
+                    return False
+                sender.result()
+            return framing is not None and not (_wants_close(request_line, headers)
+                                                 or _wants_close(status_line, response_headers))
+        except _ProtocolError:
+            if not responded:
+                writer.write(BAD_GATEWAY)
+            return False
+        finally:
+            conn.in_flight = False
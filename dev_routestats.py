@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 路由延迟统计
+功能：从后端 gin 访问日志中解析方法、路由、状态码与耗时，
+      按路由维护滑动窗口内的延迟直方图，给出 p50/p95/p99、请求速率与错误率
+"""
+
+import math
+import re
+import time
+from collections import Counter, deque, namedtuple
+
+# 后端访问日志格式见 new-api/middleware/logger.go：
+# [GIN] 2006/01/02 - 15:04:05 | <request id> | 200 |    1.234567ms |       127.0.0.1 |    POST /v1/chat/completions
+ACCESS_RE = re.compile(
+    r"\[GIN\] [^|]*\|[^|]*\|\s*(\d{3})\s*\|\s*([0-9.hmsµun]+)\s*\|[^|]*\|\s*([A-Z]+) (\S+)")
+# Go 的 time.Duration 输出，如 12.3µs、1.5s、1m2.5s
+DURATION_RE = re.compile(r"([0-9.]+)(ns|us|µs|ms|s|m|h)")
+DURATION_UNITS = {"ns": 1e-9, "us": 1e-6, "µs": 1e-6, "ms": 1e-3, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+# 路径中的 ID 类片段归并为 :id，避免每个渠道、令牌各占一行
+ID_SEGMENT_RE = re.compile(r"^(\d+|[0-9a-fA-F-]{32,36}|[0-9a-fA-F]{16,}|[A-Za-z0-9_-]*\d[A-Za-z0-9_-]{23,})$")
+# 静态资源按目录归并
+STATIC_PREFIXES = ("/assets/", "/static/")
+
+# 统计窗口（秒），第一个为默认；按秒分槽保存，最长窗口之外的槽被丢弃
+WINDOWS = (60, 300)
+# 直方图按对数分桶，相邻桶边界相差 10%，分位数误差不超过 5%
+BUCKET_GROWTH = 1.1
+BUCKET_MIN = 1e-5
+# 路由数量上限，超出的请求计入 OTHER_ROUTE
+MAX_ROUTES = 500
+OTHER_ROUTE = "(其他)"
+# 状态码不低于该值计为错误
+ERROR_STATUS = 500
+
+Access = namedtuple("Access", ["method", "route", "status", "latency"])
+RouteRow = namedtuple("RouteRow", [
+    "method", "route",
+    "count", "rate",            # 窗口内请求数、每秒请求数
+    "errors", "error_rate",     # 5xx 数量及占比
+    "p50", "p95", "p99", "max", # 秒
+])
+# 可排序的列，默认按 p95 从高到低
+SORT_KEYS = ("p95", "p99", "p50", "max", "count", "rate", "errors", "error_rate", "route")
+
+
+def parse_duration(text):
+    """Go 的 Duration 字符串转为秒，无法解析时返回 None"""
+    parts = DURATION_RE.findall(text)
+    if not parts or "".join(n + u for n, u in parts) != text:
+        return None
+    try:
+        return sum(float(n) * DURATION_UNITS[u] for n, u in parts)
+    except ValueError:
+        return None
+
+
+def normalize_route(path):
+    path = path.split("?", 1)[0]
+    for prefix in STATIC_PREFIXES:
+        if path.startswith(prefix):
+            return prefix + "*"
+    segments = [":id" if ID_SEGMENT_RE.match(s) else s for s in path.split("/")]
+    return "/".join(segments) or "/"
+
+
+def parse_access(line):
+    """解析一行访问日志，不是访问日志返回 None"""
+    if "[GIN]" not in line:
+        return None
+    m = ACCESS_RE.search(line)
+    if not m:
+        return None
+    latency = parse_duration(m.group(2))
+    if latency is None:
+        return None
+    return Access(m.group(3), normalize_route(m.group(4)), int(m.group(1)), latency)
+
+
+def _bucket(latency):
+    return max(0, int(math.log(max(latency, BUCKET_MIN) / BUCKET_MIN, BUCKET_GROWTH)))
+
+
+def _bucket_value(index):
+    """桶的几何中点"""
+    return BUCKET_MIN * BUCKET_GROWTH ** (index + 0.5)
+
+
+class _Slot:
+    """某条路由一秒内的请求"""
+    __slots__ = ("second", "count", "errors", "max", "buckets")
+
+    def __init__(self, second):
+        self.second = second
+        self.count = 0
+        self.errors = 0
+        self.max = 0.0
+        self.buckets = Counter()
+
+
+class RouteStats:
+    """按路由、按秒分槽的滑动窗口统计；由事件循环线程写入，其他线程可随时读取 table"""
+
+    def __init__(self, windows=WINDOWS):
+        self.windows = tuple(windows)
+        self.span = max(self.windows)
+        self._routes = {}
+        self.total = 0
+
+    def reset(self):
+        self._routes.clear()
+        self.total = 0
+
+    def feed(self, lines, now=None):
+        """扫描一批输出行，返回其中访问日志的条数"""
+        now = time.time() if now is None else now
+        found = 0
+        for line in lines:
+            access = parse_access(line)
+            if access is not None:
+                self.add(access, now)
+                found += 1
+        return found
+
+    def add(self, access, now=None):
+        now = time.time() if now is None else now
+        key = (access.method, access.route)
+        slots = self._routes.get(key)
+        if slots is None:
+            if len(self._routes) >= MAX_ROUTES:
+                self._prune(now)
+            if len(self._routes) >= MAX_ROUTES:
+                key = (access.method, OTHER_ROUTE)
+                slots = self._routes.setdefault(key, deque())
+            else:
+                slots = self._routes[key] = deque()
+        second = int(now)
+        if not slots or slots[-1].second != second:
+            slots.append(_Slot(second))
+            while slots[0].second <= second - self.span:
+                slots.popleft()
+        slot = slots[-1]
+        slot.count += 1
+        slot.errors += access.status >= ERROR_STATUS
+        slot.max = max(slot.max, access.latency)
+        slot.buckets[_bucket(access.latency)] += 1
+        self.total += 1
+
+    def _prune(self, now):
+        """丢弃整个统计跨度内都没有请求的路由"""
+        expired = int(now) - self.span
+        for key in [k for k, slots in self._routes.items() if not slots or slots[-1].second <= expired]:
+            del self._routes[key]
+
+    def table(self, window=None, sort="p95", now=None):
+        """窗口内有请求的路由，按 sort 排序（route 升序，其余降序）"""
+        window = window or self.windows[0]
+        now = time.time() if now is None else now
+        since = int(now) - window
+        rows = []
+        for (method, route), slots in list(self._routes.items()):
+            count = errors = 0
+            peak = 0.0
+            buckets = Counter()
+            # 事件循环线程可能正在写入当前一秒的槽，先复制再合并
+            for slot in list(slots):
+                if slot.second > since:
+                    count += slot.count
+                    errors += slot.errors
+                    peak = max(peak, slot.max)
+                    buckets.update(dict(slot.buckets))
+            if not count:
+                continue
+            p50, p95, p99 = _percentiles(buckets, count, (0.50, 0.95, 0.99))
+            rows.append(RouteRow(method, route, count, count / window, errors, errors / count,
+                                 min(p50, peak), min(p95, peak), min(p99, peak), peak))
+        if sort == "route":
+            rows.sort(key=lambda r: (r.route, r.method))
+        else:
+            rows.sort(key=lambda r: getattr(r, sort), reverse=True)
+        return rows
+
+
+def _percentiles(buckets, count, quantiles):
+    result = []
+    ordered = sorted(buckets.items())
+    for q in quantiles:
+        rank = max(1, math.ceil(q * count))
+        seen = 0
+        for index, n in ordered:
+            seen += n
+            if seen >= rank:
+                result.append(_bucket_value(index))
+                break
+    return result
+
+
+def format_latency(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 0.001:
+        return f"{seconds * 1000:.1f}ms"
+    return f"{seconds * 1e6:.0f}µs"
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 后端运行时统计
+功能：定时拉取 /api/performance/stats（goroutine、堆内存、磁盘缓存等），
+      保存为定长时间序列，并识别持续增长的指标以便尽早发现泄漏
+"""
+
+import http.client
+import json
+import os
+from array import array
+
+from dev_procstat import format_bytes
+
+STATS_PATH = "/api/performance/stats"
+# 接口需要 root 用户的 access token（个人设置 -> 生成令牌）及对应的用户 ID
+ACCESS_TOKEN_ENV = "NEW_API_ACCESS_TOKEN"
+USER_ID_ENV = "NEW_API_USER_ID"
+STATS_INTERVAL = 5.0
+STATS_CAPACITY = 720            # 5s 一个点，约保留 1 小时
+# 增长检测：取最近 GROWTH_WINDOW 个点分成 GROWTH_CHUNKS 段，
+# 各段最小值（GC 之后的低水位）逐段上升且总增幅超过阈值即视为持续增长
+GROWTH_WINDOW = 60
+GROWTH_CHUNKS = 6
+GROWTH_MIN_RATIO = 0.10
+
+# 指标名 -> (显示名, 从响应 data 中取值的路径)
+METRICS = {
+    "goroutines": ("Goroutine", ("memory_stats", "num_goroutine")),
+    "heap_alloc": ("堆内存", ("memory_stats", "alloc")),
+    "heap_sys": ("系统内存", ("memory_stats", "sys")),
+    "num_gc": ("GC 次数", ("memory_stats", "num_gc")),
+    "disk_cache_files": ("缓存文件", ("disk_cache_info", "file_count")),
+    "disk_cache_bytes": ("缓存大小", ("disk_cache_info", "total_size")),
+    "disk_used_percent": ("磁盘占用%", ("disk_space_info", "used_percent")),
+}
+# 参与泄漏检测的指标
+WATCHED_METRICS = ("goroutines", "heap_alloc", "disk_cache_files", "disk_cache_bytes")
+BYTE_METRICS = ("heap_alloc", "heap_sys", "disk_cache_bytes")
+
+
+class StatsError(Exception):
+    """拉取统计失败；auth 为 True 表示未配置或配置了无效的 access token"""
+
+    def __init__(self, message, auth=False):
+        super().__init__(message)
+        self.auth = auth
+
+
+class StatsClient:
+    """复用一条 keep-alive 连接请求统计接口，连接断开时自动重连一次"""
+
+    def __init__(self, port, token=None, user_id=None, timeout=3.0):
+        self.port = port
+        self.token = token if token is not None else os.environ.get(ACCESS_TOKEN_ENV, "")
+        self.user_id = user_id if user_id is not None else os.environ.get(USER_ID_ENV, "1")
+        self.timeout = timeout
+        self._conn = None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _request(self):
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=self.timeout)
+        self._conn.request("GET", STATS_PATH, headers={
+            "Authorization": self.token,
+            "New-Api-User": self.user_id,
+            "Connection": "keep-alive",
+        })
+        response = self._conn.getresponse()
+        return response.status, response.read()
+
+    def fetch(self):
+        """返回响应中的 data 字段"""
+        if not self.token:
+            raise StatsError(f"未设置环境变量 {ACCESS_TOKEN_ENV}", auth=True)
+        try:
+            try:
+                status, body = self._request()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # 服务端关闭了空闲连接，重连后再试一次
+                self.close()
+                status, body = self._request()
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            raise StatsError(f"请求失败: {e}")
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise StatsError(f"响应不是 JSON (HTTP {status})")
+        if status in (401, 403) or not payload.get("success"):
+            raise StatsError(payload.get("message") or f"HTTP {status}", auth=status in (200, 401, 403))
+        return payload.get("data") or {}
+
+
+def extract(data):
+    """把接口返回的 data 展平为 {指标名: 数值}"""
+    values = {}
+    for name, (_, path) in METRICS.items():
+        node = data
+        for key in path:
+            node = node.get(key) if isinstance(node, dict) else None
+        values[name] = float(node or 0)
+    return values
+
+
+class TimeSeries:
+    """
+    定长环形时间序列：每个指标一个 array('d')，写满后覆盖最旧的点
+    """
+
+    def __init__(self, fields, capacity=STATS_CAPACITY):
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self._times = array("d", bytes(8 * capacity))
+        self._data = {f: array("d", bytes(8 * capacity)) for f in self.fields}
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def clear(self):
+        self._count = 0
+
+    def append(self, ts, values):
+        slot = self._count % self.capacity
+        self._times[slot] = ts
+        for f in self.fields:
+            self._data[f][slot] = values.get(f, 0.0)
+        self._count += 1
+
+    def _slots(self, last=None):
+        n = len(self)
+        if last is not None:
+            n = min(n, last)
+        start = self._count - n
+        return [i % self.capacity for i in range(start, self._count)]
+
+    def values(self, field, last=None):
+        data = self._data[field]
+        return [data[i] for i in self._slots(last)]
+
+    def times(self, last=None):
+        return [self._times[i] for i in self._slots(last)]
+
+    def latest(self):
+        if not self._count:
+            return None
+        slot = (self._count - 1) % self.capacity
+        return {f: self._data[f][slot] for f in self.fields}
+
+
+def detect_growth(values, window=GROWTH_WINDOW, chunks=GROWTH_CHUNKS, min_ratio=GROWTH_MIN_RATIO):
+    """
+    判断序列是否持续增长，返回增幅（比例）或 None
+    用分段最小值而非原始值比较，堆内存随 GC 的锯齿波动不会被误判
+    """
+    values = values[-window:]
+    if len(values) < window:
+        return None
+    size = len(values) // chunks
+    floors = [min(values[i * size:(i + 1) * size]) for i in range(chunks)]
+    if any(b <= a for a, b in zip(floors, floors[1:])):
+        return None
+    base = floors[0]
+    ratio = (floors[-1] - base) / base if base > 0 else float("inf")
+    return ratio if ratio >= min_ratio else None
+
+
+class RuntimeStats:
+    """后端运行时统计的历史与增长告警状态"""
+
+    def __init__(self, interval=STATS_INTERVAL, capacity=STATS_CAPACITY):
+        self.interval = interval
+        self.series = TimeSeries(METRICS, capacity)
+        self.error = None
+        self._flagged = set()
+
+    def reset(self):
+        """后端进程更换后重新开始记录"""
+        self.series.clear()
+        self.error = None
+        self._flagged.clear()
+
+    def record(self, ts, data):
+        """记录一次采样，返回新出现持续增长的 [(指标名, 增幅)]"""
+        self.error = None
+        self.series.append(ts, extract(data))
+        alerts = []
+        for name in WATCHED_METRICS:
+            ratio = detect_growth(self.series.values(name))
+            if ratio is None:
+                self._flagged.discard(name)
+            elif name not in self._flagged:
+                self._flagged.add(name)
+                alerts.append((name, ratio))
+        return alerts
+
+    def growing(self):
+        return sorted(self._flagged)
+
+
+def format_metric(name, value):
+    if name in BYTE_METRICS:
+        return format_bytes(value)
+    if name == "disk_used_percent":
+        return f"{value:.1f}%"
+    return f"{value:.0f}"
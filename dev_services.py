@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 服务清单
+功能：从 dev_services.toml 读取各服务的命令、工作目录、环境变量、端口、就绪探测与依赖，
+      校验依赖关系（不存在的依赖、循环依赖），供管理器按依赖图并行启动与级联重启
+"""
+
+import os
+import shlex
+from collections import namedtuple
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+SERVICES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dev_services.toml")
+# 由管理器实现启动与探测的服务
+BUILTIN_SERVICES = ("backend", "frontend", "mock")
+PROBE_KINDS = ("none", "tcp", "http", "log")
+
+ServiceSpec = namedtuple("ServiceSpec", [
+    "name", "label",
+    "builtin",          # 内置服务名，None 表示按 command 启动的外部进程
+    "command", "cwd", "env", "port",
+    "probe",            # (类型, 参数)：("http", "/path")、("log", 正则)、("tcp", None)、("none", None)；内置服务为 None
+    "deps",             # 依赖的服务名，依赖就绪后才启动
+    "autostart",        # 是否随"启动所有服务"一起启动
+    "follow_restarts",  # 依赖重启时是否跟着重启
+])
+
+# 没有清单文件（或清单中缺少某个内置服务）时使用的默认配置
+DEFAULT_SPECS = {
+    "backend": ServiceSpec("backend", "后端", "backend", (), None, {}, None, None, (), True, True),
+    "frontend": ServiceSpec("frontend", "前端", "frontend", (), None, {}, None, None, ("backend",), True, False),
+    "mock": ServiceSpec("mock", "模拟上游", "mock", (), None, {}, None, None, (), False, True),
+}
+
+
+class ServiceConfigError(Exception):
+    pass
+
+
+def _parse_probe(name, value, port):
+    if value is None:
+        return ("tcp", None) if port else ("none", None)
+    if isinstance(value, str):
+        kind, arg = value, None
+    elif isinstance(value, dict) and len(value) == 1:
+        kind, arg = next(iter(value.items()))
+    else:
+        raise ServiceConfigError(f"{name}: probe 应为 \"tcp\"、\"none\"、{{ http = \"/path\" }} 或 {{ log = \"正则\" }}")
+    if kind not in PROBE_KINDS:
+        raise ServiceConfigError(f"{name}: 未知的探测方式 {kind}（可选: {', '.join(PROBE_KINDS)}）")
+    if kind in ("tcp", "http") and not port:
+        raise ServiceConfigError(f"{name}: {kind} 探测需要设置 port")
+    if kind in ("http", "log") and not arg:
+        raise ServiceConfigError(f"{name}: {kind} 探测需要参数")
+    return kind, arg
+
+
+def _parse_service(name, table, base_dir):
+    if not isinstance(table, dict):
+        raise ServiceConfigError(f"{name}: 应为表 [services.{name}]")
+    builtin = table.get("builtin")
+    deps = tuple(table.get("deps", ()))
+    env = {str(k): os.path.expandvars(str(v)) for k, v in table.get("env", {}).items()}
+    autostart = bool(table.get("autostart", True))
+    follow_restarts = bool(table.get("follow_restarts", True))
+    if builtin is not None:
+        if builtin not in BUILTIN_SERVICES or builtin != name:
+            raise ServiceConfigError(f"{name}: builtin 只能是与表名相同的 {', '.join(BUILTIN_SERVICES)}")
+        # 内置服务的命令与探测由管理器实现，清单只决定依赖、启动方式和附加环境变量
+        return DEFAULT_SPECS[name]._replace(
+            label=table.get("label", DEFAULT_SPECS[name].label), env=env, deps=deps,
+            autostart=autostart, follow_restarts=follow_restarts)
+    command = table.get("command")
+    if isinstance(command, str):
+        command = shlex.split(command)
+    if not command:
+        raise ServiceConfigError(f"{name}: 缺少 command")
+    port = table.get("port")
+    if port is not None and not isinstance(port, int):
+        raise ServiceConfigError(f"{name}: port 应为整数")
+    cwd = os.path.normpath(os.path.join(base_dir, table.get("cwd", ".")))
+    return ServiceSpec(name, table.get("label", name), None, tuple(str(c) for c in command), cwd, env, port,
+                       _parse_probe(name, table.get("probe"), port), deps, autostart, follow_restarts)
+
+
+def start_order(specs):
+    """依赖在前的拓扑顺序；存在循环依赖时抛出 ServiceConfigError"""
+    remaining = {name: set(spec.deps) for name, spec in specs.items()}
+    order = []
+    while remaining:
+        ready = sorted(name for name, deps in remaining.items() if not deps & remaining.keys())
+        if not ready:
+            raise ServiceConfigError(f"存在循环依赖: {', '.join(sorted(remaining))}")
+        order.extend(ready)
+        for name in ready:
+            del remaining[name]
+    return order
+
+
+def dependents(specs):
+    """{服务名: 直接依赖它的服务列表}"""
+    result = {name: [] for name in specs}
+    for name, spec in specs.items():
+        for dep in spec.deps:
+            result[dep].append(name)
+    return result
+
+
+def load_services(path=SERVICES_FILE):
+    """
+    读取服务清单，返回按启动顺序排列的 {服务名: ServiceSpec}
+    文件不存在时使用默认配置；清单中缺少的内置服务同样补上默认配置
+    """
+    specs = {}
+    if os.path.exists(path):
+        if tomllib is None:
+            raise ServiceConfigError("读取服务清单需要 Python 3.11+ 或 pip install tomli")
+        try:
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        except (OSError, tomllib.TOMLDecodeError) as e:
+            raise ServiceConfigError(f"{os.path.basename(path)}: {e}")
+        base_dir = os.path.dirname(os.path.abspath(path))
+        for name, table in data.get("services", {}).items():
+            specs[name] = _parse_service(name, table, base_dir)
+    for name, spec in DEFAULT_SPECS.items():
+        specs.setdefault(name, spec)
+    for name, spec in specs.items():
+        unknown = [dep for dep in spec.deps if dep not in specs]
+        if unknown:
+            raise ServiceConfigError(f"{name}: 依赖的服务不存在: {', '.join(unknown)}")
+    return {name: specs[name] for name in start_order(specs)}
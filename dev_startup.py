@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 启动就绪检测
+功能：用 TCP 连接 + HTTP 状态探测后端、用 Vite 的 ready 输出判断前端就绪，
+      按日志标记拆分每次启动的耗时（编译、拉起进程、数据库初始化、端口监听），并记录历史
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from statistics import median
+
+from dev_build import CACHE_DIR
+
+HISTORY_FILE = os.path.join(CACHE_DIR, "startup.jsonl")
+PROBE_INTERVAL = 0.05
+
+# 日志标记 -> 时间点；同一时间点只记录第一次出现
+BACKEND_MARKERS = (
+    ("db_start", re.compile(r"using (?:SQLite|MySQL|PostgreSQL) as database|database migration started")),
+    ("db_done", re.compile(r"database migrated")),
+    ("started", re.compile(r"New API \S+ started")),
+)
+FRONTEND_MARKERS = (
+    ("started", re.compile(r"\bready in\b")),
+)
+
+# 阶段：(名称, 显示名, 起点, 终点)
+PHASES = (
+    ("deps", "依赖准备", "begin", "deps"),
+    ("bundle", "前端构建", "begin", "bundled"),
+    ("compile", "编译", "bundled", "built"),
+    ("spawn", "拉起进程", "built", "spawned"),
+    ("db", "数据库初始化", "db_start", "db_done"),
+    ("init", "初始化", "spawned", "started"),
+    ("listen", "端口监听", "started", "listening"),
+    ("probe", "首个响应", "listening", "ready"),
+    ("optimize", "依赖预构建", "started", "optimized"),
+)
+# 没有前端构建、编译步骤或启动标记的服务，依次以前面的时间点代替
+FALLBACK_MARKS = {"bundled": ("begin",), "built": ("deps", "begin"), "started": ("spawned",)}
+
+
+class StartupTimeline:
+    """一次启动过程中各时间点（monotonic 秒）"""
+
+    def __init__(self, service, markers=()):
+        self.service = service
+        self.markers = markers
+        self.marks = {"begin": time.monotonic()}
+        self.started = asyncio.Event()
+        self.cached = None      # 后端是否复用了缓存的二进制
+
+    def mark(self, name, when=None):
+        if name not in self.marks:
+            self.marks[name] = when if when is not None else time.monotonic()
+            if name == "started":
+                self.started.set()
+
+    def feed(self, lines):
+        """扫描子进程输出中的阶段标记"""
+        if "ready" in self.marks or all(name in self.marks for name, _ in self.markers):
+            return
+        now = time.monotonic()
+        for line in lines:
+            for name, pattern in self.markers:
+                if name not in self.marks and pattern.search(line):
+                    self.mark(name, now)
+
+    def phases(self):
+        """[(名称, 显示名, 秒)]，缺少起止点的阶段省略"""
+        result = []
+        for name, label, start, end in PHASES:
+            if start not in self.marks:
+                start = next((m for m in FALLBACK_MARKS.get(start, ()) if m in self.marks), start)
+            if start in self.marks and end in self.marks:
+                result.append((name, label, max(self.marks[end] - self.marks[start], 0.0)))
+        return result
+
+    @property
+    def total(self):
+        return self.marks.get("ready", time.monotonic()) - self.marks["begin"]
+
+    def summary(self):
+        parts = [f"{label} {seconds:.2f}s" for _, label, seconds in self.phases()]
+        return f"耗时 {self.total:.2f}s" + (f" ({' / '.join(parts)})" if parts else "")
+
+    def record(self, path=HISTORY_FILE):
+        entry = {
+            "service": self.service,
+            "time": time.time(),
+            "total": round(self.total, 3),
+            "cached": self.cached,
+            "phases": {name: round(seconds, 3) for name, _, seconds in self.phases()},
+        }
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError:
+            pass
+        return entry
+
+
+async def tcp_open(port, timeout=0.5):
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
+async def http_status(port, path, timeout=1.0):
+    """发送一次 GET，返回状态码；失败返回 None"""
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nConnection: close\r\n\r\n".encode())
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        return int(line.split()[1])
+    except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def wait_http(port, path, timeline, timeout, alive):
+    """
+    先等待端口可连接（listening），再等待 HTTP 返回非 5xx（ready）
+    进程退出返回 False，超时返回 None
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not alive():
+            return False
+        if "listening" not in timeline.marks:
+            if await tcp_open(port):
+                timeline.mark("listening")
+                continue
+        else:
+            status = await http_status(port, path)
+            if status is not None and status < 500:
+                timeline.mark("ready")
+                return True
+        await asyncio.sleep(PROBE_INTERVAL)
+    return None
+
+
+async def wait_tcp(port, timeline, timeout, alive):
+    """端口可连接即视为就绪，用于 Redis 等非 HTTP 服务；返回值同 wait_http"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not alive():
+            return False
+        if await tcp_open(port):
+            timeline.mark("listening")
+            timeline.mark("ready")
+            return True
+        await asyncio.sleep(PROBE_INTERVAL)
+    return None
+
+
+async def wait_marker(timeline, timeout, alive, final=True):
+    """等待日志中出现 started 标记（前端 Vite 的 ready 行）；final 为 False 时由调用方在后续检查完成后标记 ready"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not alive():
+            return False
+        try:
+            await asyncio.wait_for(timeline.started.wait(), 0.2)
+        except asyncio.TimeoutError:
+            continue
+        if final:
+            timeline.mark("ready")
+        return True
+    return None
+
+
+def load_history(service=None, limit=50, path=HISTORY_FILE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return []
+    entries = []
+    for line in reversed(lines):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if service is None or entry.get("service") == service:
+            entries.append(entry)
+            if len(entries) >= limit:
+                break
+    entries.reverse()
+    return entries
+
+
+def history_medians(entries):
+    """各阶段及总耗时的中位数"""
+    columns = {"total": [e["total"] for e in entries]}
+    for entry in entries:
+        for name, seconds in entry.get("phases", {}).items():
+            columns.setdefault(name, []).append(seconds)
+    return {name: median(values) for name, values in columns.items() if values}
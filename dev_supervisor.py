@@ -0,0 +1,1616 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 开发环境进程管理核心
+功能：基于 asyncio 统一管理前后端进程，以事件流的形式把输出与状态推送给终端和 GUI
+"""
+
+import asyncio
+import codecs
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+
+from dev_build import ensure_backend_binary, BuildError
+from dev_bundle import ensure_frontend_bundle, BundleError
+from dev_webdeps import (prepare_frontend, save_prebundle, metadata_mtime, FORCE_ENV, ENTRY_MODULE,
+                         OPTIMIZE_TIMEOUT)
+from dev_watcher import backend_watcher, frontend_watcher, bundle_watcher
+from dev_proxy import ReverseProxy, READY_PATH, BALANCE_POLICIES
+from dev_startup import (StartupTimeline, BACKEND_MARKERS, FRONTEND_MARKERS, http_status, wait_http, wait_marker,
+                         wait_tcp)
+from dev_services import load_services, dependents, DEFAULT_SPECS, ServiceConfigError
+from dev_envprofiles import load_profiles, read_options, write_options, DEFAULT_PROFILE, EnvProfileError
+from dev_logstore import LogStore
+from dev_logindex import LogIndex
+from dev_procstat import ProcessSampler, group_members, available as sampling_available
+from dev_pprof import PROFILE_ENV, PPROF_PORT, capture, goroutine_dump, source_revision, top, ProfileError
+from dev_mockupstream import MOCK_PORT, register_channel, set_config
+from dev_runtimestats import RuntimeStats, StatsClient, StatsError, METRICS, GROWTH_WINDOW
+from dev_routestats import RouteStats
+from dev_editlatency import EditTracker, LOOPS as EDIT_LOOPS, describe as describe_edit
+from dev_flightrecorder import (FlightRecorder, TRIGGERS, FATAL_TRIGGERS, WATCH_INTERVAL, PROBE_TIMEOUT,
+                                STALL_PROBES, DUMP_TIMEOUT, CPU_PROFILE_SECONDS, BACKOFF_RESET, LATENCY_WINDOW,
+                                proc_snapshot, write_bundle)
+
+# 项目路径配置
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(PROJECT_ROOT, "new-api")
+FRONTEND_DIR = os.path.join(PROJECT_ROOT, "new-api", "web")
+
+# 端口配置：前端 Vite 代理固定指向 BACKEND_PORT；无缝重启时由代理占用该端口
+BACKEND_PORT = 3050
+FRONTEND_PORT = 5173
+SCRATCH_PORTS = (3051, 3052)
+# 集群模式：实例依次监听 CLUSTER_BASE_PORT 起的连续端口，第一个为 master，其余为 slave
+CLUSTER_BASE_PORT = 3101
+CLUSTER_MAX = 16
+# 启用剖析时每个可能作为 master 的实例端口各用一个 pprof 端口，蓝绿切换时新旧实例不争用
+PPROF_PORTS = {
+    BACKEND_PORT: PPROF_PORT,
+    SCRATCH_PORTS[0]: PPROF_PORT + 1,
+    SCRATCH_PORTS[1]: PPROF_PORT + 2,
+    CLUSTER_BASE_PORT: PPROF_PORT + 3,
+}
+# 集群共享的环境变量（已在环境中设置的以环境为准）：会话密钥一致才能在实例间保持登录，
+# 缩短缓存同步周期便于复现多节点一致性问题
+CLUSTER_ENV = {
+    "SESSION_SECRET": uuid.uuid4().hex,
+    "SYNC_FREQUENCY": "10",
+}
+READY_TIMEOUT = 60
+STOP_TIMEOUT = 5
+STOP_POLL_INTERVAL = 0.05
+
+# 子进程输出按块读取
+READ_CHUNK = 64 * 1024
+# 单个订阅者最多积压的事件数，超过后暂停读取子进程输出
+SUBSCRIPTION_SIZE = 20000
+
+# ANSI 转义序列（颜色、光标控制等）
+ANSI_RE = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+
+# 事件：
+#   kind=output   子进程输出的一行，source 为显示名（如 "后端:3051"）
+#   kind=message  管理器自身的提示，level 为 system/error
+#   kind=status   服务状态变化，text 为 starting/running/stopping/stopped
+Event = namedtuple("Event", ["kind", "service", "source", "text", "level", "time"])
+
+
+class Subscription:
+    """
+    事件订阅，带有界缓冲
+    消费跟不上时发布方会等待，从而暂停读取子进程管道（背压）；lossy 订阅（守护进程的客户端）
+    则丢弃放不下的事件并计数，腾出空间后先补一条提示，不拖慢发布方；
+    drain() 可在任意线程调用，wait() 供普通线程阻塞等待，async for 供事件循环内使用
+    """
+
+    def __init__(self, supervisor, maxsize=SUBSCRIPTION_SIZE, lossy=False):
+        self._sup = supervisor
+        self.maxsize = maxsize
+        self.lossy = lossy
+        self.dropped = 0            # 尚未提示的丢弃数
+        self.lost = 0               # 累计丢弃数
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._space = None          # asyncio.Event，在事件循环线程内惰性创建
+        self._space_wanted = False
+        self._ready = None          # asyncio.Event，供 async for 使用
+        self.closed = False
+
+    # ---------- 生产者（事件循环线程） ----------
+
+    async def put_many(self, events):
+        while not self.closed:
+            if self._space is None:
+                self._space = asyncio.Event()
+                self._ready = asyncio.Event()
+            with self._lock:
+                if len(self._items) < self.maxsize:
+                    if self.dropped:
+                        self._items.append(Event("message", None, None, f"订阅方读取过慢，丢弃了 {self.dropped} 条事件",
+                                                 "error", time.time()))
+                        self.dropped = 0
+                    self._items.extend(events)
+                    self._available.notify_all()
+                    self._ready.set()
+                    return
+                if self.lossy:
+                    self.dropped += len(events)
+                    self.lost += len(events)
+                    return
+                # 在锁内清除信号，保证消费方随后 drain 时的唤醒不会丢失
+                self._space_wanted = True
+                self._space.clear()
+            await self._space.wait()
+
+    # ---------- 消费者 ----------
+
+    def drain(self, limit=None):
+        """取出当前积压的事件（非阻塞）"""
+        with self._lock:
+            if limit is None or limit >= len(self._items):
+                items = list(self._items)
+                self._items.clear()
+            else:
+                items = [self._items.popleft() for _ in range(limit)]
+            if self._space_wanted:
+                self._space_wanted = False
+                self._sup.loop.call_soon_threadsafe(self._space.set)
+        return items
+
+    def wait(self, timeout=None):
+        """阻塞直到有事件或订阅关闭"""
+        with self._lock:
+            if not self._items and not self.closed:
+                self._available.wait(timeout)
+        return self.drain()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            items = self.drain()
+            if items:
+                return items
+            if self.closed:
+                raise StopAsyncIteration
+            if self._ready is None:
+                self._ready = asyncio.Event()
+                self._space = asyncio.Event()
+            self._ready.clear()
+            with self._lock:
+                if self._items or self.closed:
+                    continue
+            await self._ready.wait()
+
+    def close(self):
+        self._sup.unsubscribe(self)
+        with self._lock:
+            self.closed = True
+            self._available.notify_all()
+        if self._space is not None and self._sup.loop:
+            self._sup.loop.call_soon_threadsafe(self._space.set)
+            self._sup.loop.call_soon_threadsafe(self._ready.set)
+
+
+def _signal_group(pgid, sig):
+    try:
+        os.killpg(pgid, sig)
+    except OSError:
+        pass
+
+
+def _group_alive(pgid):
+    """进程组内是否还有进程（子进程以 start_new_session 启动，组 ID 即其 PID）"""
+    if sys.platform == "win32":
+        return False
+    members = group_members(pgid)
+    if members is not None:
+        return bool(members)
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+async def _taskkill_tree(pid):
+    killer = await asyncio.create_subprocess_exec(
+        "taskkill", "/F", "/T", "/PID", str(pid),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        creationflags=subprocess.CREATE_NO_WINDOW)
+    await killer.wait()
+
+
+class Service:
+    """一个受管服务：持有进程、读取输出、负责启停"""
+
+    name = ""
+    label = ""
+    # 输出中标记启动阶段的正则，见 dev_startup
+    markers = ()
+
+    def __init__(self, supervisor, spec=None):
+        self.sup = supervisor
+        self.spec = spec or DEFAULT_SPECS.get(self.name)
+        self.proc = None
+        self.state = "stopped"
+        self.lock = asyncio.Lock()
+        self.restarting = False
+        self.restart_pending = False
+        self.ready_wait = None      # 进行中的就绪等待（asyncio.Task），stop 时取消
+        self.timeline = None
+        self.last_startup = None
+
+    @property
+    def running(self):
+        return self.proc is not None and self.proc.returncode is None
+
+    @property
+    def pid(self):
+        return self.proc.pid if self.running else None
+
+    async def set_state(self, state):
+        self.state = state
+        await self.sup.publish_one("status", self.name, state)
+
+    async def say(self, text, level="system"):
+        await self.sup.publish_one("message", self.name, text, level)
+
+    def spec_env(self, extra=None):
+        """在当前环境上附加服务清单中的 env 与 extra；都没有时返回 None 沿用当前环境"""
+        merged = dict(self.spec.env) if self.spec else {}
+        merged.update(extra or {})
+        return dict(os.environ, **merged) if merged else None
+
+    # ---------- 进程 ----------
+
+    async def spawn(self, args, cwd, source=None, env=None):
+        kwargs = {}
+        if sys.platform == "win32":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+        else:
+            # 独立进程组，停止时可以整组发送信号
+            kwargs["start_new_session"] = True
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            **kwargs
+        )
+        self.sup.loop.create_task(self.pump(proc, source or self.label))
+        return proc
+
+    async def pump(self, proc, source):
+        """按块读取子进程输出，增量解码后逐行发布"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        partial = ""
+        while True:
+            chunk = await proc.stdout.read(READ_CHUNK)
+            if not chunk:
+                break
+            lines = (partial + decoder.decode(chunk)).split("\n")
+            partial = lines.pop()
+            if lines:
+                await self.publish_lines(source, lines)
+        tail = partial + decoder.decode(b"", final=True)
+        if tail:
+            await self.publish_lines(source, [tail])
+        code = await proc.wait()
+        await self.on_exit(proc, code)
+
+    async def publish_lines(self, source, lines):
+        if self.timeline is not None:
+            self.timeline.feed(lines)
+        now = time.time()
+        await self.sup.publish([Event("output", self.name, source, line.rstrip("\r"), "output", now)
+                                for line in lines])
+
+    async def on_exit(self, proc, code):
+        # 主动停止时 self.proc 已被清空，这里只处理意外退出
+        if proc is self.proc:
+            self.proc = None
+            await self.say(f"{self.label}进程已退出 (退出码: {code})", "error" if code else "system")
+            await self.set_state("stopped")
+            if _group_alive(proc.pid):
+                # 主进程退出后组内残留的子进程（如 go run 编译出的程序）一并清理
+                await self.terminate(proc)
+
+    async def terminate(self, proc, timeout=None):
+        """
+        终止整个进程组：先发 SIGTERM，到期后 SIGKILL；主进程退出后组内残留的子进程同样处理
+        Windows 下直接用 taskkill /F /T 结束进程树。返回是否进行了强制终止
+        """
+        if proc.returncode is not None and not _group_alive(proc.pid):
+            return False
+        if sys.platform == "win32":
+            await _taskkill_tree(proc.pid)
+            await proc.wait()
+            return False
+        timeout = STOP_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        _signal_group(proc.pid, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(proc.wait(), timeout)
+            while _group_alive(proc.pid) and time.monotonic() < deadline:
+                await asyncio.sleep(STOP_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        if proc.returncode is None or _group_alive(proc.pid):
+            _signal_group(proc.pid, signal.SIGKILL)
+            await proc.wait()
+            return True
+        return False
+
+    # ---------- 生命周期 ----------
+
+    async def start(self):
+        async with self.lock:
+            if self.running:
+                await self.say(f"{self.label}服务已在运行中")
+                return
+            await self.say(f"正在启动{self.label}服务...")
+            await self.set_state("starting")
+            self.timeline = StartupTimeline(self.name, self.markers)
+            try:
+                self.proc = await self.launch()
+            except Exception as e:
+                self.proc = None
+                await self.say(f"启动{self.label}失败: {e}", "error")
+            if self.proc is None:
+                self.sup.edits.abandon(self.name, self.timeline)
+                await self.set_state("stopped")
+                return
+            proc = self.proc
+            # 等待就绪（最长 READY_TIMEOUT）期间不持有锁，stop 先取消等待再停止进程
+            waiting = self.ready_wait = self.sup.loop.create_task(self.wait_ready(proc))
+        try:
+            await asyncio.wait({waiting})
+        finally:
+            if not waiting.done():
+                waiting.cancel()
+            if self.ready_wait is waiting:
+                self.ready_wait = None
+        async with self.lock:
+            ready = False if waiting.cancelled() else waiting.result()
+            if ready is False or proc is not self.proc:
+                # 进程在就绪前退出（on_exit 已更新状态），或等待被 stop 取消（由 stop 更新状态）
+                self.sup.edits.abandon(self.name, self.timeline)
+                return
+            if ready is None:
+                await self.say(f"{self.label}未在 {READY_TIMEOUT}s 内就绪，继续等待其输出", "error")
+            await self.set_state("running")
+            await self.say(f"{self.label}服务已就绪 (PID: {proc.pid}) {self.timeline.summary()}")
+            self.last_startup = self.timeline.record()
+            await self.report_edits(self.sup.edits.ready(self.name, self.timeline))
+            await self.after_start()
+
+    async def stop(self):
+        if self.ready_wait is not None:
+            self.ready_wait.cancel()
+        async with self.lock:
+            await self._stop_locked()
+
+    async def _stop_locked(self):
+        proc, self.proc = self.proc, None
+        if proc is None or (proc.returncode is not None and not _group_alive(proc.pid)):
+            await self.say(f"{self.label}服务未运行")
+            await self.after_stop()
+            await self.set_state("stopped")
+            return
+        await self.say(f"正在停止{self.label}服务...")
+        await self.set_state("stopping")
+        began = time.monotonic()
+        killed, _ = await asyncio.gather(self.terminate(proc), self.stop_workers())
+        await self.after_stop()
+        await self.set_state("stopped")
+        elapsed = time.monotonic() - began
+        if killed:
+            await self.say(f"{self.label}服务 {STOP_TIMEOUT}s 内未退出，已强制终止 ({elapsed:.2f}s)", "error")
+        else:
+            await self.say(f"{self.label}服务已停止 ({elapsed:.2f}s)")
+
+    async def restart(self):
+        """重启；进行中再次请求时只在结束后补一次"""
+        if self.restarting:
+            self.restart_pending = True
+            return
+        self.restarting = True
+        try:
+            await self.do_restart()
+            while self.restart_pending:
+                self.restart_pending = False
+                await self.do_restart()
+        finally:
+            self.restarting = False
+
+    async def do_restart(self):
+        await self.stop()
+        await self.start()
+
+    async def report_edits(self, records):
+        """输出并记录本次生效对应的各次保存的“保存→生效”耗时"""
+        if not records:
+            return
+        edits, loop = self.sup.edits, self.sup.loop
+        revision = await loop.run_in_executor(None, source_revision)
+        await loop.run_in_executor(None, edits.save, records, revision)
+        for record in records:
+            count, p50, p95 = edits.rolling(record["loop"])
+            more = f" 等 {len(record['files'])} 个文件" if len(record["files"]) > 1 else ""
+            await self.say(f"{EDIT_LOOPS[record['loop']]} {record['files'][0]}{more}: {describe_edit(record)}"
+                           f"  近 {count} 次 p50 {p50:.2f}s / p95 {p95:.2f}s")
+
+    # ---------- 子类实现 ----------
+
+    async def launch(self):
+        raise NotImplementedError
+
+    async def wait_ready(self, proc):
+        """等待服务可用：True 就绪，False 进程已退出，None 超时"""
+        self.timeline.mark("ready")
+        return True
+
+    async def stop_workers(self):
+        """与主进程同时停止的附属进程"""
+
+    async def after_start(self):
+        """服务就绪后执行（含蓝绿切换完成后）"""
+
+    async def after_stop(self):
+        pass
+
+    def snapshot(self):
+        return {"state": self.state, "pid": self.pid, "startup": self.last_startup}
+
+
+class BackendService(Service):
+    name = "backend"
+    label = "后端"
+    markers = BACKEND_MARKERS
+
+    def __init__(self, supervisor, spec=None):
+        super().__init__(supervisor, spec)
+        self.blue_green = False
+        self.proxy = None
+        self.port = None
+        self.binary = None
+        self.profiling = False
+        self.bundle = False     # 生产包模式：前端构建后嵌入二进制，由后端端口提供页面
+        self.env_profile = DEFAULT_PROFILE
+        self.options_pending = False
+        self.option_baseline = {}   # 环境配置修改过的系统设置 -> 修改前的值
+        self.instances = 1
+        self.balance = "round_robin"
+        self.workers = {}       # 集群模式下 slave 实例：端口 -> 进程
+        self.dumping = None     # 正在用 SIGQUIT 取 goroutine 栈的进程，其退出不再触发飞行记录
+
+    async def publish_lines(self, source, lines):
+        # gin 访问日志顺带计入各路由的延迟统计（集群各实例合并统计），同时进入飞行记录的缓冲
+        self.sup.route_stats.feed(lines)
+        self.sup.flight.feed(source, lines)
+        await super().publish_lines(source, lines)
+
+    @property
+    def clustered(self):
+        return self.instances > 1
+
+    @property
+    def pprof_port(self):
+        """当前实例的 pprof 端口"""
+        return PPROF_PORTS.get(self.port, PPROF_PORT)
+
+    def env(self, port=None, role="master"):
+        """
+        在当前环境上附加所选环境配置的变量；启用剖析时附加 pprof 相关变量及该实例端口对应的 pprof 端口
+        （集群中只给 master）；集群模式附加共享配置，slave 额外设置 NODE_TYPE。无需改动时返回 None 沿用当前环境
+        """
+        profile = self.sup.env_profiles.get(self.env_profile)
+        extra = dict(profile.env) if profile else {}
+        if self.clustered:
+            extra.update({k: v for k, v in CLUSTER_ENV.items() if k not in os.environ})
+            if role == "slave":
+                extra["NODE_TYPE"] = "slave"
+        if self.profiling and role == "master":
+            extra.update(PROFILE_ENV, PPROF_PORT=str(PPROF_PORTS.get(port, PPROF_PORT)))
+        return self.spec_env(extra)
+
+    async def build(self):
+        """编译（或复用缓存的）后端二进制，失败返回 None；生产包模式下先构建前端"""
+        loop = self.sup.loop
+        if self.bundle:
+            if not await self.build_bundle():
+                return None
+            self.timeline.mark("bundled")
+        try:
+            build = await loop.run_in_executor(
+                None, ensure_backend_binary, lambda msg: self.sup.say_threadsafe(msg, self.name))
+        except BuildError as e:
+            await self.publish_lines(self.label, e.output.splitlines())
+            await self.say("后端编译失败", "error")
+            return None
+        if build.built:
+            await self.say(f"后端编译完成，耗时 {build.elapsed:.1f}s")
+        self.binary = build.path
+        return build
+
+    async def after_start(self):
+        if self.options_pending:
+            self.options_pending = False
+            await self.apply_options()
+
+    async def apply_options(self):
+        """
+        写入当前环境配置的系统设置；首次修改某项前记下原值，
+        切换到不包含该项的配置时写回原值
+        """
+        profile = self.sup.env_profiles.get(self.env_profile)
+        wanted = dict(profile.options) if profile else {}
+        restore = {k: v for k, v in self.option_baseline.items() if k not in wanted}
+        if not wanted and not restore:
+            return
+        loop = self.sup.loop
+        try:
+            missing = [k for k in wanted if k not in self.option_baseline]
+            if missing:
+                self.option_baseline.update(await loop.run_in_executor(None, read_options, self.port, missing))
+            await loop.run_in_executor(None, write_options, self.port, {**restore, **wanted})
+        except EnvProfileError as e:
+            await self.say(f"写入系统设置失败: {e}", "error")
+            return
+        for key in restore:
+            del self.option_baseline[key]
+        changes = [f"{k}={v}" for k, v in {**restore, **wanted}.items()]
+        await self.say(f"已写入系统设置: {', '.join(changes)}")
+
+    async def build_bundle(self):
+        """构建（或复用缓存的）前端生产包到 web/dist，随后的 go build 会将其嵌入二进制"""
+        try:
+            bundle = await self.sup.loop.run_in_executor(
+                None, ensure_frontend_bundle, lambda msg: self.sup.say_threadsafe(msg, self.name))
+        except BundleError as e:
+            await self.publish_lines("前端构建", e.output.splitlines())
+            await self.say(f"前端生产包构建失败: {e}", "error")
+            return False
+        if bundle.built:
+            await self.say(f"前端生产包构建完成，耗时 {bundle.elapsed:.1f}s")
+        elif bundle.restored:
+            await self.say(f"前端生产包命中缓存 ({bundle.digest[:8]})，已恢复到 web/dist")
+        return True
+
+    def source_for(self, port):
+        return self.label if port == BACKEND_PORT else f"{self.label}:{port}"
+
+    async def ensure_proxy(self):
+        if self.proxy is None:
+            self.proxy = ReverseProxy(BACKEND_PORT)
+        if not self.proxy.running:
+            await self.sup.loop.run_in_executor(None, self.proxy.start)
+            await self.say(f"反向代理已启动 (端口: {BACKEND_PORT})")
+        return self.proxy
+
+    async def launch(self):
+        build = await self.build()
+        if build is None:
+            return None
+        self.timeline.mark("built")
+        self.timeline.cached = not build.built
+        if self.clustered:
+            # 先启动 master 完成数据库迁移，就绪后再启动 slave（见 wait_ready）
+            await self.ensure_proxy()
+            port = CLUSTER_BASE_PORT
+            proc = await self.spawn([build.path, "-port", str(port)], BACKEND_DIR, self.source_for(port),
+                                    self.env(port))
+        elif self.blue_green:
+            proxy = await self.ensure_proxy()
+            port = SCRATCH_PORTS[0]
+            proc = await self.spawn([build.path, "-port", str(port)], BACKEND_DIR, self.source_for(port),
+                                    self.env(port))
+            proxy.set_target(port)
+        else:
+            port = BACKEND_PORT
+            proc = await self.spawn([build.path, "-port", str(port)], BACKEND_DIR, self.source_for(port),
+                                    self.env(port))
+        self.timeline.mark("spawned")
+        self.port = port
+        return proc
+
+    async def wait_ready(self, proc):
+        ready = await wait_http(self.port, READY_PATH, self.timeline, READY_TIMEOUT,
+                                alive=lambda: proc.returncode is None)
+        if ready is None:
+            self.sup.loop.create_task(self.sup.flight_record("probe", f"{READY_TIMEOUT}s 内未就绪", proc))
+        if ready and self.clustered:
+            await self.start_workers()
+        return ready
+
+    async def start_workers(self):
+        """并行启动 slave 实例，就绪的实例与 master 一起加入负载均衡"""
+        ports = [CLUSTER_BASE_PORT + i for i in range(1, self.instances)]
+        await self.say(f"正在启动 {len(ports)} 个 slave 实例 (端口 {ports[0]}-{ports[-1]})...")
+        env = self.env(role="slave")
+
+        async def start_one(port):
+            try:
+                proc = await self.spawn([self.binary, "-port", str(port)], BACKEND_DIR,
+                                        self.source_for(port), env)
+            except Exception as e:
+                await self.say(f"启动 slave {port} 失败: {e}", "error")
+                return None
+            self.workers[port] = proc
+            timeline = StartupTimeline(self.name)
+            if await wait_http(port, READY_PATH, timeline, READY_TIMEOUT, alive=lambda: proc.returncode is None):
+                return port
+            await self.say(f"slave {port} 未能就绪", "error")
+            return None
+
+        ready = await asyncio.gather(*(start_one(port) for port in ports))
+        targets = [self.port] + [port for port in ready if port is not None]
+        self.proxy.set_targets(targets, self.balance)
+        await self.say(f"集群已就绪：{len(targets)} 个实例，代理 {BACKEND_PORT} 按 {self.balance} 分配")
+
+    async def stop_workers(self):
+        workers, self.workers = self.workers, {}
+        await asyncio.gather(*(self.terminate(proc) for proc in workers.values()))
+
+    async def on_exit(self, proc, code):
+        for port, worker in list(self.workers.items()):
+            if worker is proc:
+                del self.workers[port]
+                if self.proxy is not None:
+                    self.proxy.set_targets([p for p in self.proxy.targets if p != port])
+                await self.say(f"slave {port} 已退出 (退出码: {code})，已从负载均衡中移除", "error")
+                return
+        was_current = proc is self.proc
+        await super().on_exit(proc, code)
+        if was_current and self.workers:
+            # master 意外退出时 slave 无法继续承担迁移和定时任务，一并停止
+            await self.stop_workers()
+            await self.after_stop()
+        if was_current and code and proc is not self.dumping:
+            self.sup.loop.create_task(self.sup.flight_record("exit", f"退出码 {code}", proc))
+
+    async def stop(self):
+        # 主动停止（含重启）后不再执行等待中的自动重启
+        self.sup.cancel_flight_restart()
+        await super().stop()
+
+    async def after_stop(self):
+        if self.proxy and self.proxy.running:
+            await self.sup.loop.run_in_executor(None, self.proxy.stop)
+        self.port = None
+
+    def instance_pids(self):
+        """集群各实例的 {"backend:端口": PID}，供资源采样使用"""
+        if not self.workers or not self.running:
+            return {}
+        pids = {f"{self.name}:{self.port}": self.proc.pid}
+        pids.update({f"{self.name}:{port}": proc.pid for port, proc in self.workers.items()
+                     if proc.returncode is None})
+        return pids
+
+    def can_swap(self):
+        # 集群与蓝绿共用代理端口；从集群切回单实例时先整体停止，不做切换
+        return (self.blue_green and not self.clustered and not self.workers and self.running
+                and self.ready_wait is None and self.proxy is not None and self.proxy.running)
+
+    async def do_restart(self):
+        if self.can_swap():
+            async with self.lock:
+                await self.swap()
+            return
+        await super().do_restart()
+
+    async def swap(self):
+        """
+        蓝绿切换：在备用端口启动新实例，就绪后把代理切过去，再排空并停止旧实例
+        新实例启动失败时保留旧实例继续服务
+        """
+        loop = self.sup.loop
+        old_proc, old_port = self.proc, self.port
+        timeline = self.timeline = StartupTimeline(self.name, self.markers)
+        build = await self.build()
+        if build is None:
+            self.sup.edits.abandon(self.name, timeline)
+            await self.say("保留旧的后端实例继续服务")
+            return
+        timeline.mark("built")
+        timeline.cached = not build.built
+        new_port = SCRATCH_PORTS[1] if old_port == SCRATCH_PORTS[0] else SCRATCH_PORTS[0]
+        await self.say(f"正在端口 {new_port} 启动新的后端实例...")
+        try:
+            new_proc = await self.spawn([build.path, "-port", str(new_port)], BACKEND_DIR,
+                                        self.source_for(new_port), self.env(new_port))
+        except Exception as e:
+            self.sup.edits.abandon(self.name, timeline)
+            await self.say(f"启动后端失败: {e}", "error")
+            return
+        timeline.mark("spawned")
+        ready = await wait_http(new_port, READY_PATH, timeline, READY_TIMEOUT,
+                                alive=lambda: new_proc.returncode is None)
+        if not ready:
+            self.sup.edits.abandon(self.name, timeline)
+            await self.say("新实例未能就绪，保留旧实例继续服务", "error")
+            await self.terminate(new_proc)
+            return
+
+        self.proxy.set_target(new_port)
+        self.proc, self.port = new_proc, new_port
+        await self.set_state("running")
+        await self.say(f"已切换到新实例 (PID: {new_proc.pid}, 端口: {new_port}) {timeline.summary()}")
+        self.last_startup = timeline.record()
+        await self.report_edits(self.sup.edits.ready(self.name, timeline))
+        await self.after_start()
+        drained = await loop.run_in_executor(None, self.proxy.wait_drained, old_port)
+        if not drained:
+            await self.say("旧实例仍有未完成的请求，强制停止")
+        await self.terminate(old_proc)
+        await self.say("旧的后端实例已停止")
+
+    def snapshot(self):
+        info = super().snapshot()
+        info["port"] = self.port
+        info["blue_green"] = self.blue_green
+        info["profiling"] = self.profiling
+        info["pprof_port"] = self.pprof_port if self.profiling else None
+        info["bundle"] = self.bundle
+        info["env_profile"] = self.env_profile
+        info["flight"] = self.sup.flight.settings()
+        info["instances"] = self.instances
+        info["balance"] = self.balance
+        info["cluster"] = None
+        if self.clustered:
+            stats = self.proxy.target_stats() if self.proxy is not None and self.proxy.running else {}
+            members = [(self.port, "master", self.proc)] if self.running else []
+            members += [(port, "slave", proc) for port, proc in sorted(self.workers.items())]
+            info["cluster"] = {
+                "instances": self.instances,
+                "balance": self.balance,
+                "members": [{"port": port, "role": role,
+                             "pid": proc.pid if proc.returncode is None else None,
+                             "balanced": port in stats,
+                             "active": stats.get(port, (0, 0, 0))[0],
+                             "connections": stats.get(port, (0, 0, 0))[1],
+                             "bytes": stats.get(port, (0, 0, 0))[2]}
+                            for port, role, proc in members],
+            }
+        return info
+
+
+class FrontendService(Service):
+    name = "frontend"
+    label = "前端"
+    markers = FRONTEND_MARKERS
+    # 依赖预构建的状态 -> 提示
+    PREBUNDLE_STATES = {
+        "warm": "依赖未变化，沿用 Vite 预构建缓存",
+        "restored": "已从缓存恢复该依赖版本的 Vite 预构建",
+        "cold": "依赖或 vite.config.js 已变化，Vite 将重新预构建依赖",
+    }
+
+    def __init__(self, supervisor, spec=None):
+        super().__init__(supervisor, spec)
+        self.deps = None            # 本次启动的 DepsResult
+        self.prebundle_saved = None # 已保存到缓存的 _metadata.json 修改时间
+
+    async def publish_lines(self, source, lines):
+        await super().publish_lines(source, lines)
+        # Vite 的 HMR/整页刷新输出即前端源码修改已推送到浏览器
+        await self.report_edits(self.sup.edits.feed_vite(lines))
+
+    async def start(self):
+        if self.sup.services["backend"].bundle:
+            await self.say(f"生产包模式下页面由后端提供 (http://localhost:{BACKEND_PORT})，不启动 Vite 开发服务器")
+            return
+        await super().start()
+
+    async def launch(self):
+        # package.json/锁文件变化时才安装依赖；预构建缓存与当前依赖一致时不再强制重新预构建
+        try:
+            deps = await self.sup.loop.run_in_executor(
+                None, prepare_frontend, lambda msg: self.sup.say_threadsafe(msg, self.name))
+        except BundleError as e:
+            await self.publish_lines("前端依赖", e.output.splitlines())
+            await self.say(f"前端依赖安装失败: {e}", "error")
+            return None
+        except OSError as e:
+            await self.say(f"准备前端依赖失败: {e}", "error")
+            return None
+        self.deps = deps
+        self.timeline.mark("deps")
+        self.timeline.cached = deps.prebundle != "cold"
+        self.prebundle_saved = metadata_mtime() if deps.prebundle != "cold" else None
+        await self.say(f"{self.PREBUNDLE_STATES[deps.prebundle]} ({deps.digest[:8]})")
+        # Windows 使用 npm.cmd
+        npm_cmd = "npm.cmd" if sys.platform == "win32" else "npm"
+        env = self.spec_env({FORCE_ENV: "true" if deps.prebundle == "cold" else "false"})
+        proc = await self.spawn([npm_cmd, "run", "dev"], FRONTEND_DIR, env=env)
+        self.timeline.mark("spawned")
+        return proc
+
+    async def wait_ready(self, proc):
+        # Vite 就绪时输出 "VITE vX.Y.Z  ready in N ms"，但此时依赖可能尚未预构建完成，页面仍打不开
+        alive = lambda: proc.returncode is None
+        ready = await wait_marker(self.timeline, READY_TIMEOUT, alive, final=False)
+        if ready and self.deps is not None and self.deps.prebundle == "cold":
+            await self.wait_prebundle(alive)
+        if ready:
+            self.timeline.mark("ready")
+        return ready
+
+    async def wait_prebundle(self, alive):
+        """冷启动：请求入口模块触发 Vite 扫描依赖，等待本次预构建写出 _metadata.json"""
+        timeline = self.timeline
+        began = time.time() - (time.monotonic() - timeline.marks["begin"])
+        await http_status(FRONTEND_PORT, ENTRY_MODULE, timeout=OPTIMIZE_TIMEOUT)
+        deadline = time.monotonic() + OPTIMIZE_TIMEOUT
+        while time.monotonic() < deadline and alive():
+            mtime = metadata_mtime()
+            if mtime is not None and mtime >= began:
+                timeline.mark("optimized")
+                return True
+            await asyncio.sleep(0.2)
+        if alive():
+            await self.say(f"{OPTIMIZE_TIMEOUT}s 内未等到 Vite 完成依赖预构建", "error")
+        return False
+
+    async def after_start(self):
+        if "optimized" in self.timeline.marks:
+            await self.save_prebundle()
+
+    async def after_stop(self):
+        # 运行期间 Vite 发现新依赖会重新预构建，停止时把最新结果存入缓存
+        if self.deps is not None:
+            await self.save_prebundle()
+
+    async def save_prebundle(self):
+        mtime = metadata_mtime()
+        if mtime is None or mtime == self.prebundle_saved:
+            return
+        try:
+            saved = await self.sup.loop.run_in_executor(None, save_prebundle, self.deps.digest)
+        except OSError as e:
+            await self.say(f"保存 Vite 预构建缓存失败: {e}", "error")
+            return
+        if saved:
+            self.prebundle_saved = mtime
+            await self.say(f"已保存 Vite 预构建缓存 ({self.deps.digest[:8]})")
+
+
+class MockUpstreamService(Service):
+    """本地模拟的 OpenAI 兼容上游，用于隔离供应商波动测量网关开销"""
+
+    name = "mock"
+    label = "模拟上游"
+
+    def __init__(self, supervisor, spec=None):
+        super().__init__(supervisor, spec)
+        self.config = {}
+
+    async def launch(self):
+        proc = await self.spawn(
+            [sys.executable, "-u", os.path.join(PROJECT_ROOT, "dev_mockupstream.py"),
+             "--port", str(MOCK_PORT), "--config", json.dumps(self.config)],
+            PROJECT_ROOT, env=self.spec_env())
+        self.timeline.mark("spawned")
+        return proc
+
+    async def wait_ready(self, proc):
+        ready = await wait_http(MOCK_PORT, "/v1/models", self.timeline, READY_TIMEOUT,
+                                alive=lambda: proc.returncode is None)
+        if ready and self.sup.services["backend"].running:
+            self.sup.loop.create_task(self.register())
+        return ready
+
+    async def register(self):
+        """把模拟上游注册为后端渠道（需要管理员 access token）"""
+        try:
+            result = await self.sup.loop.run_in_executor(None, register_channel, BACKEND_PORT, MOCK_PORT)
+        except RuntimeError as e:
+            await self.say(f"注册模拟上游渠道失败: {e}", "error")
+            return False
+        action = "已创建" if result == "created" else "已更新"
+        await self.say(f"{action}渠道 dev-mock -> 127.0.0.1:{MOCK_PORT}")
+        return True
+
+    async def configure(self, update):
+        """修改配置；运行中立即生效，否则在下次启动时使用"""
+        self.config.update(update)
+        if self.running:
+            config = await self.sup.loop.run_in_executor(None, set_config, MOCK_PORT, update)
+            await self.say(f"模拟上游配置: {json.dumps(config, ensure_ascii=False)}")
+
+    def snapshot(self):
+        info = super().snapshot()
+        info["port"] = MOCK_PORT
+        info["config"] = dict(self.config)
+        return info
+
+
+class ExternalService(Service):
+    """服务清单中按 command 声明的外部进程（如 Redis），就绪探测方式由 probe 决定"""
+
+    def __init__(self, supervisor, spec):
+        self.name = spec.name
+        self.label = spec.label
+        super().__init__(supervisor, spec)
+        kind, arg = spec.probe
+        if kind == "log":
+            self.markers = (("started", re.compile(arg)),)
+
+    async def launch(self):
+        proc = await self.spawn(list(self.spec.command), self.spec.cwd, env=self.spec_env())
+        self.timeline.mark("spawned")
+        return proc
+
+    async def wait_ready(self, proc):
+        kind, arg = self.spec.probe
+        alive = lambda: proc.returncode is None
+        if kind == "http":
+            return await wait_http(self.spec.port, arg, self.timeline, READY_TIMEOUT, alive)
+        if kind == "tcp":
+            return await wait_tcp(self.spec.port, self.timeline, READY_TIMEOUT, alive)
+        if kind == "log":
+            return await wait_marker(self.timeline, READY_TIMEOUT, alive)
+        return await super().wait_ready(proc)
+
+    def snapshot(self):
+        info = super().snapshot()
+        info["port"] = self.spec.port
+        return info
+
+
+BUILTIN_CLASSES = {
+    "backend": BackendService,
+    "frontend": FrontendService,
+    "mock": MockUpstreamService,
+}
+
+
+class Supervisor:
+    """
+    在后台线程中运行事件循环，对外提供线程安全的同步接口
+    所有控制方法返回 concurrent.futures.Future，调用方可选择等待或忽略
+    """
+
+    def __init__(self):
+        self.loop = None
+        self._thread = None
+        self._subs = []
+        self.services = {}
+        self.specs = {}
+        self.dependents = {}
+        self.config_error = None
+        self.env_profiles = {}
+        self.watchers = []
+        # 所有输出同时落盘，便于事后按时间回看；内存中另建倒排索引供检索
+        self.log_store = LogStore()
+        self.log_index = LogIndex()
+        self.sampler = ProcessSampler()
+        self.runtime_stats = RuntimeStats()
+        self.route_stats = RouteStats()
+        self.flight = FlightRecorder()
+        self.edits = EditTracker()
+        self._flight_restart = None
+
+    # ---------- 事件循环 ----------
+
+    def start(self):
+        if self._thread:
+            return self
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.load_specs()
+            self.loop.create_task(self._record_logs(self.subscribe()))
+            if sampling_available():
+                self.loop.create_task(self._sample_resources())
+            self.loop.create_task(self._poll_runtime_stats())
+            self.loop.create_task(self._watch_backend())
+            started.set()
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="supervisor", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def load_specs(self):
+        """读取服务清单并创建服务；清单有误时退回默认配置并记录错误"""
+        try:
+            self.specs = load_services()
+        except ServiceConfigError as e:
+            self.config_error = f"服务清单有误，使用默认配置: {e}"
+            self.specs = load_services(path="")
+        self.dependents = dependents(self.specs)
+        try:
+            self.env_profiles = load_profiles()
+        except EnvProfileError as e:
+            error = f"环境配置有误，只保留 default: {e}"
+            self.config_error = f"{self.config_error}；{error}" if self.config_error else error
+            self.env_profiles = load_profiles(path="")
+        self.services = {name: BUILTIN_CLASSES[spec.builtin](self, spec) if spec.builtin
+                         else ExternalService(self, spec)
+                         for name, spec in self.specs.items()}
+
+    def shutdown(self, timeout=15):
+        """停止监听与所有服务，然后结束事件循环"""
+        self.set_watch(False)
+        try:
+            self.submit(self.stop_all_async()).result(timeout)
+        finally:
+            for sub in list(self._subs):
+                sub.close()
+            self.submit(self._cancel_tasks()).result(timeout)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+            self.log_store.close()
+
+    async def _record_logs(self, subscription):
+        async for events in subscription:
+            self.log_store.append(events)
+            self.log_index.append(events)
+
+    async def _sample_resources(self):
+        """按 sampler.interval 周期采样各服务进程树；读取 /proc 放到线程池，避免阻塞事件循环"""
+        while True:
+            roots = {name: service.pid for name, service in self.services.items()}
+            roots.update(self.services["backend"].instance_pids())
+            await self.loop.run_in_executor(None, self.sampler.sample, roots)
+            await asyncio.sleep(self.sampler.interval)
+
+    async def _poll_runtime_stats(self):
+        """
+        定时拉取后端 /api/performance/stats；后端进程或端口变化时重建连接并清空历史
+        鉴权失败只提示一次，直到后端重启后再尝试
+        """
+        stats = self.runtime_stats
+        backend = self.services["backend"]
+        client, target, auth_failed = None, None, False
+        try:
+            while True:
+                await asyncio.sleep(stats.interval)
+                pid, port = backend.pid, backend.port
+                if pid is None or port is None or backend.state != "running":
+                    continue
+                if (pid, port) != target:
+                    if client is not None:
+                        client.close()
+                    client, target, auth_failed = StatsClient(port), (pid, port), False
+                    stats.reset()
+                if auth_failed:
+                    continue
+                try:
+                    data = await self.loop.run_in_executor(None, client.fetch)
+                except StatsError as e:
+                    stats.error = str(e)
+                    if e.auth:
+                        auth_failed = True
+                        await self.say(f"无法读取后端运行时统计: {e}", "backend")
+                    continue
+                for name, ratio in stats.record(time.time(), data):
+                    amount = "" if ratio == float("inf") else f" {ratio:.0%}"
+                    minutes = GROWTH_WINDOW * stats.interval / 60
+                    await self.say(f"疑似泄漏: {METRICS[name][0]} 近 {minutes:g} 分钟持续上涨{amount}",
+                                   "backend", "error")
+        finally:
+            if client is not None:
+                client.close()
+
+    async def _watch_backend(self):
+        """
+        巡检运行中的后端：连续 STALL_PROBES 次探测超时视为无响应；
+        RSS、goroutine 数与路由 p99 超过阈值时保存现场；稳定运行一段时间后清零自动重启的退避
+        """
+        backend = self.services["backend"]
+        flight = self.flight
+        misses, running_since = 0, None
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            proc, port = backend.proc, backend.port
+            if not backend.running or port is None or backend.state != "running":
+                misses, running_since = 0, None
+                continue
+            now = time.monotonic()
+            running_since = running_since or now
+            if flight.failures and now - running_since >= BACKOFF_RESET:
+                flight.failures = 0
+            if not flight.enabled:
+                continue
+            if await http_status(port, READY_PATH, PROBE_TIMEOUT) is None:
+                misses += 1
+                if misses >= STALL_PROBES:
+                    misses = 0
+                    await self.flight_record(
+                        "stall", f"{STALL_PROBES} 次探测 {READY_PATH} 均未在 {PROBE_TIMEOUT:g}s 内响应", proc)
+                continue
+            misses = 0
+            hits = flight.check(self.sampler.latest("backend"), self.runtime_stats.series.latest(),
+                                self.route_stats.table(LATENCY_WINDOW, "p99"))
+            for trigger, detail in hits:
+                await self.flight_record(trigger, detail, proc)
+
+    async def flight_record(self, trigger, detail="", proc=None):
+        """
+        保存后端现场，返回现场包目录（受开关与冷却限制未保存时返回 None）
+        开启 pprof 时经 pprof 端口取 goroutine 栈与 cpu/heap profile，不影响进程；
+        否则仅在进程已无响应或将被自动重启时用 SIGQUIT 取栈（进程随之退出）
+        """
+        flight = self.flight
+        if not flight.allow(trigger):
+            return None
+        backend = self.services["backend"]
+        proc = proc or backend.proc
+        alive = proc is not None and proc.returncode is None
+        exit_code = proc.returncode if proc else None
+        label = TRIGGERS[trigger]
+        await self.say(f"飞行记录: {label} ({detail})，正在保存现场..." if detail else
+                       f"飞行记录: {label}，正在保存现场...", "backend", "error" if trigger != "manual" else "system")
+        began = time.time()
+        pids = (group_members(proc.pid) or [proc.pid]) if alive else []
+        proc_text = await self.loop.run_in_executor(None, proc_snapshot, pids)
+        goroutines, pprof_dir, notes = None, None, []
+        fatal = trigger in FATAL_TRIGGERS or (flight.auto_restart and trigger != "manual")
+        if alive and backend.profiling:
+            try:
+                pprof_port = backend.pprof_port
+                goroutines = await self.loop.run_in_executor(None, lambda: goroutine_dump(port=pprof_port))
+                pprof_dir = await self.loop.run_in_executor(None, lambda: capture(
+                    CPU_PROFILE_SECONDS, kinds=("cpu", "heap", "goroutine"), note=f"飞行记录: {label}",
+                    port=pprof_port))
+            except ProfileError as e:
+                notes.append(f"pprof 采集失败: {e}")
+        if alive and goroutines is None and fatal and sys.platform != "win32":
+            goroutines = await self._sigquit_dump(backend, proc)
+        elif alive and goroutines is None:
+            notes.append("未开启 pprof，进程仍在服务，未取 goroutine 栈")
+        commit, dirty = await self.loop.run_in_executor(None, source_revision)
+        meta = {
+            "trigger": trigger, "detail": detail, "time": began, "commit": commit, "dirty": dirty,
+            "pid": proc.pid if proc else None, "port": backend.port, "exit_code": exit_code,
+            "env_profile": backend.env_profile, "profiling": backend.profiling,
+            "thresholds": flight.thresholds._asdict(), "notes": notes,
+        }
+        metrics = {
+            "samples": [s._asdict() for s in self.sampler.history.get("backend", ())
+                        if s.time >= began - flight.window],
+            "runtime": {"times": self.runtime_stats.series.times(),
+                        **{f: self.runtime_stats.series.values(f) for f in self.runtime_stats.series.fields}},
+            "routes": [r._asdict() for r in self.route_stats.table(LATENCY_WINDOW)],
+        }
+        lines = flight.since(began - flight.window)
+        try:
+            directory = await self.loop.run_in_executor(
+                None, write_bundle, meta, lines, metrics, proc_text, goroutines, pprof_dir)
+        except OSError as e:
+            await self.say(f"保存现场失败: {e}", "backend", "error")
+            return None
+        flight.last_bundle = os.path.basename(directory)
+        await self.say(f"现场已保存到 {os.path.relpath(directory, PROJECT_ROOT)}", "backend")
+        if flight.auto_restart and trigger != "manual":
+            self.cancel_flight_restart()
+            self._flight_restart = self.loop.create_task(self._restart_with_backoff(label))
+        return directory
+
+    async def _sigquit_dump(self, backend, proc):
+        """SIGQUIT 让 Go 运行时把所有 goroutine 栈打印到 stderr 后退出，返回期间的输出行"""
+        backend.dumping = proc
+        began = time.time()
+        try:
+            os.kill(proc.pid, signal.SIGQUIT)
+            await asyncio.wait_for(proc.wait(), DUMP_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            pass
+        # 进程退出后读取任务可能仍有未发布的输出
+        await asyncio.sleep(0.2)
+        if proc.returncode is None or _group_alive(proc.pid):
+            await backend.terminate(proc)
+        return self.flight.since(began)
+
+    async def _restart_with_backoff(self, label):
+        delay = self.flight.next_backoff()
+        await self.say(f"{delay:g}s 后自动重启后端 (连续第 {self.flight.failures} 次，原因: {label})", "backend")
+        await asyncio.sleep(delay)
+        self._flight_restart = None
+        if self.services["backend"].running:
+            await self.restart_tree("backend")
+        else:
+            await self.start_group(["backend"])
+
+    def cancel_flight_restart(self):
+        task = self._flight_restart
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+            self._flight_restart = None
+
+    async def _cancel_tasks(self):
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ---------- 事件 ----------
+
+    def subscribe(self, maxsize=SUBSCRIPTION_SIZE, lossy=False):
+        """lossy=True 的订阅在积压满时丢弃事件，不对发布方（子进程输出）施加背压"""
+        sub = Subscription(self, maxsize, lossy)
+        self._subs.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        if sub in self._subs:
+            self._subs.remove(sub)
+
+    async def publish(self, events):
+        for sub in list(self._subs):
+            await sub.put_many(events)
+
+    async def publish_one(self, kind, service, text, level="system"):
+        await self.publish([Event(kind, service, service, text, level, time.time())])
+
+    async def say(self, text, service=None, level="system"):
+        await self.publish_one("message", service, text, level)
+
+    def say_threadsafe(self, text, service=None, level="system"):
+        self.submit(self.say(text, service, level))
+
+    # ---------- 控制接口 ----------
+
+    def start_service(self, name):
+        return self.submit(self.services[name].start())
+
+    def stop_service(self, name):
+        return self.submit(self.services[name].stop())
+
+    def restart_service(self, name):
+        return self.submit(self.restart_tree(name))
+
+    def start_with_deps(self, name):
+        """启动服务，连同尚未运行的依赖"""
+        return self.submit(self.start_group([name]))
+
+    # ---------- 依赖图 ----------
+
+    async def start_group(self, names):
+        """
+        启动 names 及其依赖：每个服务在依赖全部就绪后启动，互不依赖的服务并行启动
+        依赖未能就绪时跳过依赖它的服务
+        """
+        pending = {}
+
+        async def bring_up(name):
+            deps = self.specs[name].deps
+            await asyncio.gather(*(ensure(dep) for dep in deps))
+            missing = [dep for dep in deps if self.services[dep].state != "running"]
+            service = self.services[name]
+            if missing:
+                await service.say(f"依赖 {', '.join(missing)} 未就绪，跳过启动", "error")
+            elif not service.running:
+                await service.start()
+
+        def ensure(name):
+            if name not in pending:
+                pending[name] = asyncio.ensure_future(bring_up(name))
+            return pending[name]
+
+        await asyncio.gather(*(ensure(name) for name in names))
+
+    async def stop_group(self, names):
+        """停止 names：依赖它的服务（同在 names 中的）先停止，互不依赖的服务并行停止"""
+        names = set(names)
+        pending = {}
+
+        async def take_down(name):
+            await asyncio.gather(*(ensure(d) for d in self.dependents[name] if d in names))
+            await self.services[name].stop()
+
+        def ensure(name):
+            if name not in pending:
+                pending[name] = asyncio.ensure_future(take_down(name))
+            return pending[name]
+
+        await asyncio.gather(*(ensure(name) for name in names))
+
+    def affected_by(self, name):
+        """name 重启时需要跟着重启的服务：运行中且 follow_restarts 的下游服务（递归）"""
+        affected, stack = [], [name]
+        while stack:
+            for dependent in self.dependents[stack.pop()]:
+                service = self.services[dependent]
+                if dependent not in affected and self.specs[dependent].follow_restarts and service.running:
+                    affected.append(dependent)
+                    stack.append(dependent)
+        return affected
+
+    async def restart_tree(self, name):
+        """重启一个服务及受影响的下游子树；其他服务不受影响"""
+        affected = self.affected_by(name)
+        if not affected:
+            await self.services[name].restart()
+            return
+        await self.say(f"{name} 重启，下游 {', '.join(affected)} 随之重启")
+        await self.stop_group(affected)
+        await self.services[name].restart()
+        await self.start_group(affected)
+
+    async def start_all_async(self):
+        await self.start_group([name for name, spec in self.specs.items() if spec.autostart])
+
+    async def stop_all_async(self):
+        """按依赖反序停止各服务，互不依赖的并行停止；按需启动的服务只在运行时顺带停止"""
+        names = [name for name, service in self.services.items()
+                 if self.specs[name].autostart or service.running]
+        began = time.monotonic()
+        await self.stop_group(names)
+        await self.say(f"所有服务已停止，耗时 {time.monotonic() - began:.2f}s")
+
+    async def restart_all_async(self):
+        await self.say("正在重启所有服务...")
+        backend = self.services["backend"]
+        running = [name for name, service in self.services.items() if service.running]
+        if backend.can_swap():
+            # 后端无缝切换不会中断服务，各服务各自重启即可
+            await asyncio.gather(*(self.services[name].restart() for name in running))
+            return
+        await self.stop_all_async()
+        await self.start_group([name for name, spec in self.specs.items() if spec.autostart] + running)
+
+    def start_all(self):
+        return self.submit(self.start_all_async())
+
+    def stop_all(self):
+        return self.submit(self.stop_all_async())
+
+    def restart_all(self):
+        return self.submit(self.restart_all_async())
+
+    async def force_kill_async(self):
+        """强制清理所有相关进程，包括不受本管理器控制的残留进程"""
+        await self.say("正在强制清理所有进程...")
+        for service in self.services.values():
+            proc, service.proc = service.proc, None
+            if proc is not None and proc.returncode is None:
+                if sys.platform == "win32":
+                    await _taskkill_tree(proc.pid)
+                else:
+                    _signal_group(proc.pid, signal.SIGKILL)
+        if sys.platform == "win32":
+            images = {"go.exe", "new-api.exe", "node.exe"}
+            binary = self.services["backend"].binary
+            if binary:
+                images.add(os.path.basename(binary))
+            for image in images:
+                killer = await asyncio.create_subprocess_exec(
+                    "taskkill", "/F", "/IM", image,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                    creationflags=subprocess.CREATE_NO_WINDOW)
+                await killer.wait()
+        else:
+            for pattern in ("go run", os.path.join(".devcache", "bin", "new-api-"), "node"):
+                killer = await asyncio.create_subprocess_exec(
+                    "pkill", "-f", pattern, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                await killer.wait()
+        for service in self.services.values():
+            await service.after_stop()
+            await service.set_state("stopped")
+        await self.say("所有进程已强制清理")
+
+    def force_kill_all(self):
+        return self.submit(self.force_kill_async())
+
+    # ---------- 性能剖析 ----------
+
+    def set_profiling(self, enabled):
+        """开启/关闭后端 pprof；后端在运行时立即重启使其生效"""
+        backend = self.services["backend"]
+        backend.profiling = enabled
+        state = "已开启性能剖析 (pprof 端口随实例端口分配，见 status)" if enabled else "已关闭性能剖析"
+        self.say_threadsafe(state + ("，正在重启后端" if backend.running else "，下次启动后端时生效"))
+        if backend.running:
+            return self.restart_service("backend")
+        return None
+
+    async def capture_profiles_async(self, seconds, note=""):
+        backend = self.services["backend"]
+        if not (backend.running and backend.profiling):
+            await self.say("请先开启性能剖析并启动后端", "backend", "error")
+            return None
+        await self.say(f"正在采集 {seconds}s 的 cpu/mutex/block 及 heap/goroutine profile...", "backend")
+        try:
+            port = backend.pprof_port
+            directory = await self.loop.run_in_executor(None, lambda: capture(seconds, note=note, port=port))
+        except ProfileError as e:
+            await self.say(f"采集失败: {e}", "backend", "error")
+            return None
+        await self.say(f"profile 已保存到 {os.path.relpath(directory, PROJECT_ROOT)}", "backend")
+        try:
+            lines = await self.loop.run_in_executor(None, top, directory, "cpu", 10)
+            await self.publish([Event("message", "backend", "backend", line, "system", time.time())
+                                for line in lines])
+        except ProfileError as e:
+            await self.say(f"汇总失败: {e}", "backend", "error")
+        return directory
+
+    def capture_profiles(self, seconds, note=""):
+        return self.submit(self.capture_profiles_async(seconds, note))
+
+    # ---------- 飞行记录 ----------
+
+    def set_flight_recorder(self, enabled=None, auto_restart=None, thresholds=None):
+        """设置飞行记录的开关、崩溃后自动重启与阈值（{"rss_mb": ..., "goroutines": ..., "p99_ms": ...}）"""
+        flight = self.flight
+        if enabled is not None:
+            flight.enabled = bool(enabled)
+        if auto_restart is not None:
+            flight.auto_restart = bool(auto_restart)
+            if not flight.auto_restart:
+                self.loop.call_soon_threadsafe(self.cancel_flight_restart)
+        if thresholds is not None:
+            flight.thresholds = flight.thresholds._replace(**thresholds)
+        limits = flight.thresholds
+        self.say_threadsafe(f"飞行记录: {'开启' if flight.enabled else '关闭'}  "
+                            f"自动重启: {'开启' if flight.auto_restart else '关闭'}  "
+                            f"阈值 RSS {limits.rss_mb or '-'}MB / goroutine {limits.goroutines or '-'} / "
+                            f"p99 {limits.p99_ms or '-'}ms")
+
+    def capture_flight(self, note=""):
+        """立即保存一次后端现场"""
+        return self.submit(self.flight_record("manual", note))
+
+    def register_mock(self):
+        return self.submit(self.services["mock"].register())
+
+    def configure_mock(self, update):
+        return self.submit(self.services["mock"].configure(update))
+
+    # ---------- 模式 ----------
+
+    def set_blue_green(self, enabled):
+        """开启/关闭无缝重启，下次启动或重启后端时生效"""
+        self.services["backend"].blue_green = enabled
+        if enabled:
+            self.say_threadsafe(f"已开启无缝重启：代理端口 {BACKEND_PORT}，后端在 {SCRATCH_PORTS} 间切换")
+        else:
+            self.say_threadsafe("已关闭无缝重启，下次重启后端时恢复直连")
+
+    def set_bundle(self, enabled):
+        """
+        开启/关闭生产包模式：前端按 makefile 的 build-frontend 构建后嵌入后端二进制，
+        浏览器直接访问后端端口，不再启动 Vite 开发服务器；后端在运行时立即重启使其生效
+        """
+        self.services["backend"].bundle = enabled
+        return self.submit(self._apply_bundle(enabled))
+
+    async def _apply_bundle(self, enabled):
+        backend, frontend = self.services["backend"], self.services["frontend"]
+        if enabled:
+            await self.say(f"已开启生产包模式：页面地址 http://localhost:{BACKEND_PORT}")
+            if frontend.running:
+                await frontend.stop()
+            if backend.running:
+                await self.restart_tree("backend")
+        else:
+            await self.say("已关闭生产包模式，恢复 Vite 开发服务器")
+            if backend.running:
+                await frontend.start()
+
+    def set_env_profile(self, name, start=False):
+        """
+        切换后端环境配置；后端在运行时立即重启（start 为 True 时未运行也启动），
+        就绪后写入该配置的系统设置。Future 的结果为后端是否在运行
+        """
+        if name not in self.env_profiles:
+            raise ValueError(f"未知的环境配置: {name}（可选: {', '.join(self.env_profiles)}）")
+        return self.submit(self._apply_env_profile(name, start))
+
+    async def _apply_env_profile(self, name, start):
+        backend = self.services["backend"]
+        profile = self.env_profiles[name]
+        backend.env_profile = name
+        backend.options_pending = True
+        if not (backend.running or start):
+            await self.say(f"环境配置: {name}，下次启动后端时生效")
+            return False
+        await self.say(f"环境配置: {name}，正在{'重启' if backend.running else '启动'}后端")
+        missing = [s for s in profile.services if s not in self.services]
+        if missing:
+            await self.say(f"环境配置 {name} 依赖的服务不存在: {', '.join(missing)}", level="error")
+        await self.start_group([s for s in profile.services if s in self.services])
+        if backend.running:
+            await self.restart_tree("backend")
+        else:
+            await self.start_group(["backend"])
+        return backend.running
+
+    def set_cluster(self, instances, balance=None):
+        """
+        设置后端实例数（1 为单实例）与负载均衡策略；后端在运行时立即重启使其生效
+        只修改策略时直接作用于运行中的代理
+        """
+        backend = self.services["backend"]
+        instances = max(1, min(int(instances), CLUSTER_MAX))
+        if balance is not None and balance not in BALANCE_POLICIES:
+            raise ValueError(f"未知的负载均衡策略: {balance}（可选: {', '.join(BALANCE_POLICIES)}）")
+        balance = balance or backend.balance
+        resize = instances != backend.instances
+        backend.instances, backend.balance = instances, balance
+        if not resize:
+            if backend.proxy is not None and backend.clustered:
+                backend.proxy.policy = balance
+            self.say_threadsafe(f"负载均衡策略: {balance}")
+            return None
+        if instances == 1:
+            state = "已关闭集群模式"
+        else:
+            state = (f"集群模式: {instances} 个实例 (端口 {CLUSTER_BASE_PORT}-{CLUSTER_BASE_PORT + instances - 1}，"
+                     f"代理 {BACKEND_PORT}，{balance})")
+        self.say_threadsafe(state + ("，正在重启后端" if backend.running else "，下次启动后端时生效"))
+        if backend.running:
+            return self.restart_service("backend")
+        return None
+
+    def set_watch(self, enabled):
+        """开启/关闭源码变化自动重启"""
+        for watcher in self.watchers:
+            watcher.stop()
+        had_watchers = bool(self.watchers)
+        self.watchers = []
+        if not enabled:
+            if had_watchers:
+                self.say_threadsafe("已关闭自动重启")
+            return
+        self.watchers = [
+            backend_watcher(lambda paths: self.submit(self._on_source_changed("backend", paths))),
+            frontend_watcher(lambda paths: self.submit(self._on_source_changed("frontend", paths))),
+            bundle_watcher(lambda paths: self.submit(self._on_bundle_changed(paths))),
+        ]
+        for watcher in self.watchers:
+            watcher.start()
+        self.say_threadsafe(f"已开启自动重启 (监听方式: {self.watchers[0].backend})")
+
+    async def _on_source_changed(self, name, paths):
+        names = [os.path.relpath(p, BACKEND_DIR) for p in paths]
+        more = f" 等 {len(names)} 个文件" if len(names) > 3 else ""
+        kind = "后端源码" if name == "backend" else "前端配置"
+        if name == "backend" and all(n.startswith("web" + os.sep) for n in names):
+            kind = "前端源码"
+        self.edits.changed(name, "bundle" if kind == "前端源码" else name, paths)
+        await self.say(f"检测到{kind}变化: {', '.join(names[:3])}{more}", name)
+        await self.restart_tree(name)
+
+    async def _on_bundle_changed(self, paths):
+        """生产包模式下前端源码变化需要重新构建并重启后端；开发模式由 Vite HMR 处理"""
+        if self.services["backend"].bundle:
+            await self._on_source_changed("backend", paths)
+
+    # ---------- 状态 ----------
+
+    def set_sample_interval(self, seconds):
+        self.sampler.interval = max(0.1, float(seconds))
+        self.say_threadsafe(f"资源采样间隔: {self.sampler.interval:g}s")
+
+    def snapshot(self):
+        info = {name: service.snapshot() for name, service in self.services.items()}
+        for name, service_info in info.items():
+            service_info["resources"] = self.sampler.latest(name)
+        info["backend"]["runtime"] = self.runtime_stats.series.latest()
+        for member in (info["backend"]["cluster"] or {}).get("members", ()):
+            member["resources"] = self.sampler.latest(f"backend:{member['port']}")
+        return info
+
+    def dashboard(self, services, window=None, sort="p95", points=60):
+        """
+        资源面板一次刷新所需的数据：各服务最新采样与 CPU/RSS 趋势、运行时统计、路由延迟、集群连接分配
+        守护进程模式下由一次请求取回
+        """
+        sampler, series = self.sampler, self.runtime_stats.series
+        return {
+            "resources": {name: {"latest": sampler.latest(name),
+                                 "rss": sampler.series(name, "rss")[-points:],
+                                 "cpu": sampler.series(name, "cpu")[-points:]} for name in services},
+            "runtime": {"error": self.runtime_stats.error, "growing": self.runtime_stats.growing(),
+                        "latest": series.latest(),
+                        "series": {name: series.values(name, points) for name in METRICS}},
+            "routes": self.route_stats.table(window, sort),
+            "cluster": self.services["backend"].snapshot()["cluster"],
+        }
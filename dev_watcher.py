@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 文件监听
+功能：基于 inotify 监听源码变化，合并短时间内的多次保存后触发一次回调
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# 任意层级都忽略的目录
+IGNORE_DIRS = {".git", "node_modules", "logs", "pprof", "__pycache__"}
+
+# inotify 常量（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+EVENT_HEADER = struct.Struct("iIII")
+
+# 无 inotify 时（Windows/macOS）的轮询间隔
+POLL_INTERVAL = 1.0
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+class FileWatcher:
+    """
+    监听 root 下的文件变化
+    include(rel_path) 决定文件是否关心；skip_dirs 仅作用于 root 的直接子目录；
+    一批变化在 debounce 秒内没有新事件时才回调 callback(changed_paths)
+    """
+
+    def __init__(self, root, callback, include=None, skip_dirs=(), recursive=True,
+                 debounce=0.3, max_delay=2.0, name="watcher"):
+        self.root = os.path.abspath(root)
+        self.callback = callback
+        self.include = include or (lambda rel_path: True)
+        self.skip_dirs = set(skip_dirs)
+        self.recursive = recursive
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.name = name
+        self.backend = "inotify" if _libc else "polling"
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake_r = self._wake_w = None
+
+    # ---------- 公共接口 ----------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        target = self._run_inotify if _libc else self._run_polling
+        self._thread = threading.Thread(target=target, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b"x")
+            except OSError:
+                pass
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    # ---------- 过滤 ----------
+
+    def _dir_allowed(self, rel_dir):
+        if rel_dir in ("", "."):
+            return True
+        parts = rel_dir.split(os.sep)
+        if parts[0] in self.skip_dirs:
+            return False
+        return not any(p in IGNORE_DIRS or p.startswith(".") for p in parts)
+
+    def _file_allowed(self, full_path):
+        rel_path = os.path.relpath(full_path, self.root)
+        if not self._dir_allowed(os.path.dirname(rel_path)):
+            return False
+        return self.include(rel_path)
+
+    def _iter_dirs(self):
+        if not self.recursive:
+            yield self.root
+            return
+        for dirpath, dirnames, _ in os.walk(self.root):
+            rel_dir = os.path.relpath(dirpath, self.root)
+            if not self._dir_allowed(rel_dir):
+                dirnames[:] = []
+                continue
+            yield dirpath
+
+    # ---------- 防抖 ----------
+
+    def _flush(self, pending):
+        if not pending or self._stop.is_set():
+            return
+        try:
+            self.callback(sorted(pending))
+        except Exception as e:
+            print(f"[{self.name}] 回调异常: {e}", file=sys.stderr)
+
+    # ---------- inotify 实现 ----------
+
+    def _add_watch(self, fd, wds, path):
+        wd = _libc.inotify_add_watch(fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            wds[wd] = path
+
+    def _run_inotify(self):
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            self.backend = "polling"
+            self._run_polling()
+            return
+        self._wake_r, self._wake_w = os.pipe()
+        wds = {}
+        try:
+            for path in self._iter_dirs():
+                self._add_watch(fd, wds, path)
+            pending = set()
+            first_event = last_event = 0.0
+            while not self._stop.is_set():
+                if pending:
+                    now = time.monotonic()
+                    timeout = min(last_event + self.debounce, first_event + self.max_delay) - now
+                    if timeout <= 0:
+                        self._flush(pending)
+                        pending = set()
+                        continue
+                else:
+                    timeout = None
+                readable, _, _ = select.select([fd, self._wake_r], [], [], timeout)
+                if self._wake_r in readable or fd not in readable:
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                changed = self._parse_events(fd, wds, data)
+                if changed:
+                    now = time.monotonic()
+                    if not pending:
+                        first_event = now
+                    last_event = now
+                    pending.update(changed)
+        finally:
+            os.close(fd)
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_r = self._wake_w = None
+
+    def _parse_events(self, fd, wds, data):
+        changed = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出：无法得知具体文件，视为整体变化
+                changed.add(self.root)
+                continue
+            if mask & IN_IGNORED:
+                wds.pop(wd, None)
+                continue
+            dir_path = wds.get(wd)
+            if dir_path is None or not name:
+                continue
+            full_path = os.path.join(dir_path, name)
+            if mask & IN_ISDIR:
+                if (mask & (IN_CREATE | IN_MOVED_TO)) and self.recursive:
+                    rel_dir = os.path.relpath(full_path, self.root)
+                    if self._dir_allowed(rel_dir):
+                        # 新建目录：补充监听，并把已存在的文件当作变化
+                        for sub in os.walk(full_path):
+                            self._add_watch(fd, wds, sub[0])
+                            changed.update(os.path.join(sub[0], f) for f in sub[2]
+                                           if self._file_allowed(os.path.join(sub[0], f)))
+                continue
+            if self._file_allowed(full_path):
+                changed.add(full_path)
+        return changed
+
+    # ---------- 轮询实现 ----------
+
+    def _snapshot(self):
+        snapshot = {}
+        for dirpath in self._iter_dirs():
+            try:
+                entries = os.scandir(dirpath)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if not entry.is_file() or not self._file_allowed(entry.path):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def _run_polling(self):
+        previous = self._snapshot()
+        pending = set()
+        last_change = 0.0
+        while not self._stop.wait(min(POLL_INTERVAL, self.debounce) if pending else POLL_INTERVAL):
+            current = self._snapshot()
+            changed = {p for p in current.keys() | previous.keys() if current.get(p) != previous.get(p)}
+            previous = current
+            if changed:
+                pending.update(changed)
+                last_change = time.monotonic()
+            elif pending and time.monotonic() - last_change >= self.debounce:
+                self._flush(pending)
+                pending = set()
+
+
+# ---------- 预设的监听范围 ----------
+
+# 修改后需要重启 Vite 的前端配置文件（src 下的改动由 Vite HMR 自行处理）
+FRONTEND_CONFIG_FILES = {"package.json", "package-lock.json", "bun.lock", "bun.lockb",
+                         "yarn.lock", "pnpm-lock.yaml", "vite.config.js",
+                         "tailwind.config.js", "postcss.config.js", ".env"}
+
+
+def backend_watcher(callback, debounce=0.5):
+    """监听 Go 源码、go.mod/go.sum 与 .env，忽略 web/ 等非编译目录"""
+    from dev_build import BACKEND_DIR, SKIP_DIRS, SOURCE_EXTS, MODULE_FILES
+
+    def include(rel_path):
+        if rel_path in MODULE_FILES or rel_path == ".env":
+            return True
+        return rel_path.endswith(SOURCE_EXTS) and not rel_path.endswith("_test.go")
+
+    return FileWatcher(BACKEND_DIR, callback, include=include, skip_dirs=SKIP_DIRS,
+                       debounce=debounce, name="backend-watcher")
+
+
+def frontend_watcher(callback, debounce=0.5):
+    """监听 web/ 根目录下的依赖与构建配置"""
+    from dev_build import BACKEND_DIR
+    return FileWatcher(os.path.join(BACKEND_DIR, "web"), callback,
+                       include=lambda rel_path: rel_path in FRONTEND_CONFIG_FILES,
+                       recursive=False, debounce=debounce, name="frontend-watcher")
+
+
+def bundle_watcher(callback, debounce=0.5):
+    """生产包模式下监听 web/src 等参与前端构建的文件，变化后需重新构建并重启后端"""
+    from dev_bundle import WEB_DIR, BUNDLE_SOURCE_DIRS, BUNDLE_FILES, LOCK_FILES
+
+    def include(rel_path):
+        return rel_path in BUNDLE_FILES or rel_path in LOCK_FILES or rel_path.split(os.sep)[0] in BUNDLE_SOURCE_DIRS
+
+    return FileWatcher(WEB_DIR, callback, include=include,
+                       skip_dirs={d for d in os.listdir(WEB_DIR) if d not in BUNDLE_SOURCE_DIRS}
+                       if os.path.isdir(WEB_DIR) else (),
+                       debounce=debounce, name="bundle-watcher")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NEW_API 前端依赖缓存
+功能：以 package.json 与锁文件的哈希判断 node_modules 是否需要重新安装，
+      并按哈希保存、恢复 Vite 的依赖预构建缓存，依赖未变化时跳过强制的重新预构建
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from collections import namedtuple
+
+from dev_build import CACHE_DIR
+from dev_bundle import WEB_DIR, LOCK_FILES, BundleError, package_manager, run_web
+
+NODE_MODULES = os.path.join(WEB_DIR, "node_modules")
+# Vite 的预构建产物（cacheDir 默认为 node_modules/.vite）
+VITE_DEPS_DIR = os.path.join(NODE_MODULES, ".vite", "deps")
+VITE_METADATA = os.path.join(VITE_DEPS_DIR, "_metadata.json")
+PREBUNDLE_ROOT = os.path.join(CACHE_DIR, "vite")
+# node_modules 与 node_modules/.vite/deps 当前对应的哈希
+DEPS_STAMP_FILE = os.path.join(CACHE_DIR, "web-deps.json")
+# 决定是否重新安装的文件；预构建还取决于 vite.config.js（Vite 自身也按它判断缓存是否有效）
+DEPS_FILES = ("package.json",) + LOCK_FILES
+PREBUNDLE_FILES = DEPS_FILES + ("vite.config.js",)
+# 传给 vite.config.js 的 optimizeDeps.force，未设置时保持强制预构建
+FORCE_ENV = "OPTIMIZE_DEPS_FORCE"
+KEEP_PREBUNDLES = 3
+# 冷启动时请求入口模块触发 Vite 扫描依赖，等待预构建写出 _metadata.json 的最长时间
+ENTRY_MODULE = "/src/index.jsx"
+OPTIMIZE_TIMEOUT = 180
+
+DepsResult = namedtuple("DepsResult", [
+    "digest",       # 预构建哈希
+    "installed",    # 是否执行了安装
+    "prebundle",    # "warm" 沿用现有预构建，"restored" 从缓存恢复，"cold" 需要重新预构建
+    "elapsed",
+])
+
+
+def _digest(names):
+    total = hashlib.sha256()
+    for name in names:
+        try:
+            with open(os.path.join(WEB_DIR, name), "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        total.update(name.encode() + b"\0" + hashlib.sha256(data).hexdigest().encode())
+    return total.hexdigest()
+
+
+def deps_digest():
+    return _digest(DEPS_FILES)
+
+
+def prebundle_digest():
+    return _digest(PREBUNDLE_FILES)
+
+
+def _read_stamp():
+    try:
+        with open(DEPS_STAMP_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_stamp(**values):
+    stamp = dict(_read_stamp(), **values)
+    os.makedirs(os.path.dirname(DEPS_STAMP_FILE), exist_ok=True)
+    with open(DEPS_STAMP_FILE, "w", encoding="utf-8") as f:
+        json.dump(stamp, f)
+
+
+def ensure_dependencies(log=None):
+    """package.json 或锁文件变化（或没有 node_modules）时安装依赖，返回是否执行了安装；失败时抛出 BundleError"""
+    digest = deps_digest()
+    if os.path.isdir(NODE_MODULES) and _read_stamp().get("deps") == digest:
+        return False
+    if log:
+        log(f"前端依赖{'已变化' if os.path.isdir(NODE_MODULES) else '未安装'}，正在安装 ({digest[:8]})...")
+    run_web([package_manager(), "install"], dict(os.environ), log)
+    _write_stamp(deps=digest)
+    return True
+
+
+def prepare_frontend(log=None):
+    """
+    启动 Vite 前准备依赖与预构建缓存：
+    node_modules/.vite/deps 已对应当前哈希时沿用；缓存中有同一哈希的预构建时复制回去；否则需要重新预构建
+    """
+    start = time.monotonic()
+    installed = ensure_dependencies(log)
+    digest = prebundle_digest()
+    cached = os.path.join(PREBUNDLE_ROOT, digest[:16])
+    if _read_stamp().get("prebundle") == digest and os.path.exists(VITE_METADATA):
+        state = "warm"
+    elif os.path.exists(os.path.join(cached, "_metadata.json")):
+        tmp = VITE_DEPS_DIR + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        shutil.copytree(cached, tmp)
+        shutil.rmtree(VITE_DEPS_DIR, ignore_errors=True)
+        os.replace(tmp, VITE_DEPS_DIR)
+        os.utime(cached)
+        _write_stamp(prebundle=digest)
+        state = "restored"
+    else:
+        state = "cold"
+    return DepsResult(digest, installed, state, time.monotonic() - start)
+
+
+def metadata_mtime():
+    try:
+        return os.stat(VITE_METADATA).st_mtime
+    except OSError:
+        return None
+
+
+def save_prebundle(digest):
+    """把当前的预构建产物保存为 digest 对应的缓存（Vite 写完 _metadata.json 之后调用），返回是否保存"""
+    if not os.path.exists(VITE_METADATA):
+        return False
+    target = os.path.join(PREBUNDLE_ROOT, digest[:16])
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    # 预构建过程中的 deps_temp_* 不在 deps 目录内，复制的是完整结果
+    shutil.copytree(VITE_DEPS_DIR, tmp)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    _write_stamp(prebundle=digest)
+    _prune_prebundles(os.path.basename(target))
+    return True
+
+
+def _prune_prebundles(current):
+    try:
+        names = [n for n in os.listdir(PREBUNDLE_ROOT) if n != current and not n.endswith(".tmp")]
+    except OSError:
+        return
+    paths = sorted((os.path.join(PREBUNDLE_ROOT, n) for n in names), key=os.path.getmtime, reverse=True)
+    for path in paths[KEEP_PREBUNDLES - 1:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    try:
+        res = prepare_frontend(log=print)
+    except BundleError as e:
+        print(e.output, end="")
+        print(e)
+        sys.exit(1)
+    state = {"warm": "沿用现有预构建", "restored": "从缓存恢复预构建", "cold": "需要重新预构建"}[res.prebundle]
+    print(f"{'已安装依赖，' if res.installed else ''}{state} ({res.digest[:8]})，耗时 {res.elapsed:.1f}s")
@@ -7,6 +7,7 @@ import (
 	"log"
 	"net/http"
 	"os"
+	"runtime"
 	"strconv"
 	"strings"
 	"time"
@@ -124,8 +125,13 @@ func main() {
 	}
 
 	if os.Getenv("ENABLE_PPROF") == "true" {
+		// mutex/block profile 默认关闭，按需通过环境变量开启采样
+		runtime.SetMutexProfileFraction(common.GetEnvOrDefault("PPROF_MUTEX_RATE", 0))
+		runtime.SetBlockProfileRate(common.GetEnvOrDefault("PPROF_BLOCK_RATE", 0))
+		// 蓝绿切换时新旧实例同时运行，由启动器为每个实例指定不同的 pprof 端口
+		pprofAddr := fmt.Sprintf("0.0.0.0:%d", common.GetEnvOrDefault("PPROF_PORT", 8005))
 		gopool.Go(func() {
-			log.Println(http.ListenAndServe("0.0.0.0:8005", nil))
+			log.Println(http.ListenAndServe(pprofAddr, nil))
 		})
 		go common.Monitor()
 		common.SysLog("pprof enabled")
@@ -56,7 +56,9 @@ export default defineConfig({
     }),
   ],
   optimizeDeps: {
-    force: true,
+    // Re-optimize on every start unless the dev launcher has verified that the
+    // pre-bundled deps match package.json, the lockfile and this config.
+    force: process.env.OPTIMIZE_DEPS_FORCE !== 'false',
     esbuildOptions: {
       loader: {
         '.js': 'jsx',
@@ -0,0 +1,92 @@
+import functools
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dev_benchstore  # noqa: E402
+from dev_bench import BenchResult, LatencyHistogram, make_config  # noqa: E402
+from dev_benchstore import compare, compare_revisions, load_runs, main, record  # noqa: E402
+
+CONFIG = make_config(3000, path="/api/status", key="", duration=1.0, warmup=0)
+rng = random.Random(7)
+
+
+def _result(rps, latency_us):
+    """吞吐约 rps、平均延迟约 latency_us 的 1 秒压测结果"""
+    hist = LatencyHistogram()
+    for _ in range(int(rps * rng.uniform(0.98, 1.02))):
+        hist.record(latency_us * rng.uniform(0.9, 1.1))
+    return BenchResult(CONFIG, 1.0, hist, {200: hist.count}, {}, 0)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    db = str(tmp_path / "bench.sqlite3")
+    revision = {}
+    monkeypatch.setattr(dev_benchstore, "source_revision", lambda: (revision["commit"], False))
+    monkeypatch.setattr(dev_benchstore, "resolve_revision", lambda rev: rev)
+    monkeypatch.setattr(dev_benchstore, "compare_revisions", functools.partial(compare_revisions, path=db))
+
+    def add(commit, profile, rps, latency_us, times=1):
+        revision["commit"] = commit
+        for _ in range(times):
+            record(_result(rps, latency_us), profile=profile, path=db)
+
+    return db, add
+
+
+def _delta(deltas, metric):
+    return next(d for d in deltas if d.metric == metric)
+
+
+def test_compare_flags_significant_regression(store):
+    db, add = store
+    add("aaaaaaa", "default", 1000, 2000, times=5)
+    add("bbbbbbb", "default", 800, 2600, times=5)
+    deltas = compare(load_runs("aaaaaaa", path=db), load_runs("bbbbbbb", path=db))
+    throughput = _delta(deltas, "throughput")
+    assert throughput.regression and throughput.p_value < 0.05
+    assert throughput.change == pytest.approx(0.2, abs=0.03)
+    assert _delta(deltas, "mean").regression
+
+
+def test_compare_ignores_noise(store):
+    db, add = store
+    add("aaaaaaa", "default", 1000, 2000, times=5)
+    add("bbbbbbb", "default", 1000, 2000, times=5)
+    assert not any(d.regression for d in compare(load_runs("aaaaaaa", path=db), load_runs("bbbbbbb", path=db)))
+
+
+def test_single_runs_use_latency_distribution(store):
+    db, add = store
+    add("aaaaaaa", "default", 1000, 2000)
+    add("bbbbbbb", "default", 1000, 3000)
+    mean = _delta(compare(load_runs("aaaaaaa", path=db), load_runs("bbbbbbb", path=db)), "mean")
+    assert mean.p_value is not None and mean.p_value < 0.05 and mean.regression
+
+
+def test_profiles_are_compared_separately(store):
+    db, add = store
+    # 两个提交在各配置下表现相同，只是各配置的运行次数不同；混在一起会误报吞吐回退
+    add("aaaaaaa", "default", 1000, 2000, times=1)
+    add("aaaaaaa", "fast", 2000, 1000, times=3)
+    add("bbbbbbb", "default", 1000, 2000, times=3)
+    add("bbbbbbb", "fast", 2000, 1000, times=1)
+    groups = compare_revisions("aaaaaaa", "bbbbbbb", path=db)
+    assert [(scenario, profile, len(base), len(new)) for scenario, profile, base, new, _ in groups] == [
+        ("GET /api/status c=16", "default", 1, 3), ("GET /api/status c=16", "fast", 3, 1)]
+    assert main(["compare", "aaaaaaa", "bbbbbbb"]) == 0
+    assert main(["compare", "aaaaaaa", "bbbbbbb", "-p", "fast"]) == 0
+    assert main(["compare", "aaaaaaa", "bbbbbbb", "-p", "missing"]) == 2
+
+
+def test_main_reports_regression(store, capsys):
+    _, add = store
+    add("aaaaaaa", "default", 1000, 2000, times=3)
+    add("bbbbbbb", "default", 700, 2000, times=3)
+    assert main(["compare", "aaaaaaa", "bbbbbbb", "-t", "10"]) == 1
+    assert "回退" in capsys.readouterr().out
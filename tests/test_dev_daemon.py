@@ -0,0 +1,127 @@
+import concurrent.futures
+import functools
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dev_daemon  # noqa: E402
+import dev_manager  # noqa: E402
+import dev_supervisor  # noqa: E402
+from dev_bench import BenchResult, LatencyHistogram  # noqa: E402
+from dev_benchstore import display_width  # noqa: E402
+from dev_daemon import ControlServer, RemoteSupervisor  # noqa: E402
+from dev_logindex import build_query  # noqa: E402
+from dev_logstore import LogStore  # noqa: E402
+from dev_supervisor import Event, Supervisor  # noqa: E402
+
+
+def _done(value):
+    future = concurrent.futures.Future()
+    future.set_result(value)
+    return future
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    """进程内的守护进程与连接到它的 RemoteSupervisor"""
+    monkeypatch.setattr(dev_daemon, "DAEMON_SOCKET", str(tmp_path / "supervisor.sock"))
+    monkeypatch.setattr(dev_supervisor, "LogStore", functools.partial(LogStore, str(tmp_path / "logs")))
+    sup = Supervisor().start()
+    server = ControlServer(sup)
+    sup.submit(server.start()).result(5)
+    remote = RemoteSupervisor().start()
+    try:
+        yield sup, remote
+    finally:
+        remote.shutdown()
+        sup.submit(server.close()).result(5)
+        sup.shutdown()
+
+
+def _record_calls(monkeypatch, sup, method):
+    calls = []
+
+    def handler(*args, **kwargs):
+        calls.append((args, kwargs))
+        return _done(True)
+
+    monkeypatch.setattr(sup, method, handler)
+    return calls
+
+
+@pytest.mark.parametrize("method, args, kwargs", [
+    ("set_env_profile", ("default",), {"start": True}),
+    ("set_flight_recorder", (), {"enabled": True}),
+    ("set_flight_recorder", (), {"thresholds": {"rss": 1 << 30}}),
+    ("set_profiling", (True,), {}),
+    ("set_cluster", (2, "round_robin"), {}),
+    ("capture_profiles", (30, "slow"), {}),
+])
+def test_call_shapes(daemon, monkeypatch, method, args, kwargs):
+    sup, remote = daemon
+    calls = _record_calls(monkeypatch, sup, method)
+    assert getattr(remote, method)(*args, **kwargs).result(5) is True
+    assert calls == [(args, kwargs)]
+
+
+def test_bench_ab_through_daemon(daemon, monkeypatch, capsys):
+    sup, remote = daemon
+    calls = _record_calls(monkeypatch, sup, "set_env_profile")
+    names = list(remote.env_profiles)[:1] * 2
+
+    def fake_bench(config, progress=None):
+        hist = LatencyHistogram()
+        for value in (800, 1200, 2500):
+            hist.record(value)
+        return BenchResult(config, 1.0, hist, {200: 3}, {}, 48)
+
+    monkeypatch.setattr(dev_manager, "supervisor", remote)
+    monkeypatch.setattr(dev_manager, "run_bench", fake_bench)
+    monkeypatch.setattr(dev_manager, "record_bench", lambda result, **kwargs: 1)
+    monkeypatch.setattr(dev_manager, "backend_usage", lambda since, until: None)
+    dev_manager.run_ab_benchmark(names + ["-p", "/api/status", "-k", "", "-w", "0"])
+    assert calls == [((name,), {"start": True}) for name in names]
+    out = capsys.readouterr().out
+    table = out[out.index("A/B 对比"):].splitlines()[2:-2]
+    assert len(table) == 1 + len(names)
+    assert {display_width(line) for line in table} == {dev_manager.AB_TABLE_WIDTH}
+
+
+def test_log_search_does_not_block_loop(daemon, monkeypatch):
+    sup, remote = daemon
+    release = threading.Event()
+
+    def slow_search(query, limit=500):
+        release.wait(5)
+        return []
+
+    monkeypatch.setattr(sup.log_index, "search", slow_search)
+    search = remote.call("log_search", build_query("error")._replace(regex=None)._asdict(), 10)
+    try:
+        begin = time.perf_counter()
+        remote.request("log_count", timeout=2)
+        assert time.perf_counter() - begin < 1
+    finally:
+        release.set()
+    assert search.result(5) == []
+
+
+def test_slow_client_does_not_block_publisher(daemon):
+    sup, _ = daemon
+    sock = dev_daemon._open_socket(timeout=2)
+    try:
+        sock.sendall(dev_daemon._encode({"id": 1, "method": "subscribe", "params": [0]}))
+        sock.settimeout(2)
+        assert b'"backlog": 0' in sock.recv(4096)
+        # 客户端不再读取：事件远超订阅缓冲与 socket 缓冲
+        events = [Event("output", "backend", "stdout", "x" * 500, "output", time.time())] * 1000
+        for _ in range(60):
+            sup.submit(sup.publish(events)).result(5)
+        assert sum(sub.lost for sub in sup._subs) > 0
+    finally:
+        sock.close()
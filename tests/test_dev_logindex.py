@@ -0,0 +1,99 @@
+import os
+import random
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dev_logindex import LogIndex, build_query, classify, display_text, match_line  # noqa: E402
+from dev_supervisor import Event  # noqa: E402
+
+PATHS = ["/v1/chat/completions", "/api/user/self", "/api/status", "/v1/embeddings"]
+NOTES = ["ok", "渠道处理失败", "upstream error: timeout", "panic: runtime error", "user_42 quota"]
+
+
+def _lines(count, seed=1):
+    rng = random.Random(seed)
+    for i in range(count):
+        text = (f"[GIN] 2025/10/18 - 12:{i % 60:02d}:00 | {rng.choice((200, 401, 500))} | "
+                f"{rng.random() * 9:.3f}ms | POST {rng.choice(PATHS)} rid={rng.getrandbits(64):016x} "
+                f"{rng.choice(NOTES)}")
+        yield Event("output", rng.choice(("backend", "frontend")), "stdout", text, None, float(i))
+
+
+def _index(capacity, count):
+    index = LogIndex(capacity)
+    lines = list(_lines(count))
+    for i in range(0, count, 500):
+        index.append(lines[i:i + 500])
+    return index, lines[-capacity:]
+
+
+QUERIES = [
+    ("rror", None, None),
+    ("user_4", "backend", None),
+    ("POST /v1/chat", None, None),
+    ("/self 401", None, None),
+    ("1.23", None, None),
+    ("ab", None, None),
+    ("处理", None, None),
+    ("zzzq", None, None),
+    ("", None, r"\| 5\d\d \|"),
+    ("omple user", "frontend", None),
+]
+
+
+@pytest.fixture(scope="module")
+def churned():
+    # 容量远小于写入量，覆盖清理与三元组索引重建
+    return _index(2000, 30000)
+
+
+@pytest.fixture(scope="module")
+def large():
+    return _index(200000, 200000)[0]
+
+
+@pytest.mark.parametrize("text, service, regex", QUERIES)
+def test_search_matches_live_filter(churned, text, service, regex):
+    index, kept = churned
+    query = build_query(text, service, None, regex)
+    expected = [index.oldest_id + i for i, event in enumerate(kept)
+                if match_line(query, event.service, classify(event), display_text(event))]
+    assert [m.id for m in index.search(query, 300)] == expected[-300:]
+
+
+def test_search_by_request_id_fragment():
+    index, kept = _index(5000, 5000)
+    rid = kept[-3].text.split("rid=")[1][:7]
+    matches = index.search(build_query(f"rid={rid}"), 10)
+    assert [m.id for m in matches] == [4997]
+
+
+def test_search_latency_at_scale(large):
+    for text, service, regex in QUERIES:
+        query = build_query(text, service, None, regex)
+        begin = time.perf_counter()
+        large.search(query, 500)
+        assert time.perf_counter() - begin < 0.05, text
+
+
+def test_search_does_not_block_append(large):
+    query = build_query(regex="never")
+    searching = threading.Event()
+
+    def search():
+        searching.set()
+        large.search(query, 500)
+
+    thread = threading.Thread(target=search)
+    thread.start()
+    searching.wait()
+    begin = time.perf_counter()
+    large.append(list(_lines(100, seed=2)))
+    elapsed = time.perf_counter() - begin
+    thread.join()
+    assert elapsed < 0.05
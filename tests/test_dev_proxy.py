@@ -0,0 +1,98 @@
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dev_bench import make_config, run_bench  # noqa: E402
+from dev_proxy import ReverseProxy  # noqa: E402
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(0.002)
+        body = b'{"success":true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.served += 1
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class _Backend(ThreadingHTTPServer):
+    """keep-alive 后端；kill() 模拟进程退出，断开所有连接"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.served = 0
+        self.sockets = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def get_request(self):
+        sock, addr = super().get_request()
+        self.sockets.append(sock)
+        return sock, addr
+
+    def kill(self):
+        self.shutdown()
+        self.server_close()
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.parametrize("path", ["/api/status", "/v1/chat/completions"])
+def test_swap_during_bench_has_no_errors(path):
+    blue, green = _Backend(), _Backend()
+    proxy = ReverseProxy(_free_port(), host="127.0.0.1")
+    proxy.set_target(blue.port)
+    proxy.start()
+    drained = []
+
+    def swap():
+        time.sleep(1.0)
+        old = proxy.set_target(green.port)
+        drained.append(proxy.wait_drained(old, timeout=1.0))
+        blue.kill()
+
+    swapper = threading.Thread(target=swap)
+    swapper.start()
+    try:
+        result = run_bench(make_config(proxy.listen_port, path=path, key="", concurrency=8,
+                                       duration=3.0, warmup=0))
+    finally:
+        swapper.join()
+        proxy.stop()
+        green.kill()
+    assert drained == [True]
+    assert result.errors == {}
+    assert set(result.statuses) == {200}
+    assert blue.served > 0 and green.served > 0
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dev_routestats import RouteStats, parse_access, parse_duration  # noqa: E402
+
+
+def _gin_line(status, latency, method, path, request_id="2025101812000012345678abcdef", ip="127.0.0.1"):
+    """与 new-api/middleware/logger.go 相同的格式："[GIN] %s | %s | %3d | %13v | %15s | %7s %s" """
+    return f"[GIN] 2025/10/18 - 12:00:00 | {request_id} | {status:3d} | {latency:>13} | {ip:>15} | {method:>7} {path}"
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("0s", 0.0),
+    ("850ns", 850e-9),
+    ("12.345µs", 12.345e-6),
+    ("1.234567ms", 1.234567e-3),
+    ("1.5s", 1.5),
+    ("1m2.5s", 62.5),
+    ("2h0m0s", 7200.0),
+])
+def test_parse_duration_go_format(text, seconds):
+    assert parse_duration(text) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("text", ["", "12", "1.5x", "ms", "1.5s extra"])
+def test_parse_duration_rejects_garbage(text):
+    assert parse_duration(text) is None
+
+
+@pytest.mark.parametrize("status, latency, method, path, route", [
+    (200, "1.234567ms", "POST", "/v1/chat/completions", "/v1/chat/completions"),
+    (401, "12.345µs", "GET", "/api/user/self", "/api/user/self"),
+    (500, "1m2.5s", "DELETE", "/api/channel/42", "/api/channel/:id"),
+    (200, "850ns", "GET", "/assets/index-3f2a.js", "/assets/*"),
+    (404, "2.1ms", "OPTIONS", "/api/status?x=1", "/api/status"),
+])
+def test_parse_access_gin_format(status, latency, method, path, route):
+    access = parse_access(_gin_line(status, latency, method, path))
+    assert access is not None
+    assert (access.method, access.route, access.status) == (method, route, status)
+    assert access.latency == pytest.approx(parse_duration(latency))
+
+
+@pytest.mark.parametrize("line", [
+    _gin_line(200, "1.2ms", "GET", "/api/status", request_id=""),
+    _gin_line(200, "1.2ms", "GET", "/api/status", ip="2001:db8::1"),
+])
+def test_parse_access_optional_fields(line):
+    assert parse_access(line) is not None
+
+
+@pytest.mark.parametrize("line", [
+    "[GIN-debug] GET    /api/status               --> main.handler (5 handlers)",
+    "[SYS] 2025/10/18 - 12:00:00 | New API started",
+    "[GIN] 2025/10/18 - 12:00:00 | broken",
+])
+def test_parse_access_ignores_other_lines(line):
+    assert parse_access(line) is None
+
+
+def test_route_stats_percentiles():
+    stats = RouteStats()
+    lines = [_gin_line(500 if i % 10 == 0 else 200, f"{i}ms", "GET", f"/api/channel/{i}") for i in range(1, 101)]
+    lines.append("[INFO] not an access log")
+    assert stats.feed(lines, now=1000.0) == 100
+    [row] = stats.table(now=1000.0)
+    assert (row.method, row.route, row.count, row.errors) == ("GET", "/api/channel/:id", 100, 10)
+    assert row.p50 == pytest.approx(0.050, rel=0.05)
+    assert row.p99 == pytest.approx(0.099, rel=0.05)
+    assert row.max == pytest.approx(0.100)
@@ -0,0 +1,39 @@
+import functools
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dev_supervisor  # noqa: E402
+from dev_logstore import LogStore  # noqa: E402
+from dev_services import ServiceSpec  # noqa: E402
+from dev_supervisor import ExternalService, Supervisor  # noqa: E402
+
+
+@pytest.fixture
+def supervisor(tmp_path, monkeypatch):
+    monkeypatch.setattr(dev_supervisor, "LogStore", functools.partial(LogStore, str(tmp_path / "logs")))
+    sup = Supervisor().start()
+    try:
+        yield sup
+    finally:
+        sup.shutdown()
+
+
+def test_stop_cancels_pending_readiness_wait(supervisor, tmp_path):
+    # 日志中永远不会出现就绪标记，start 会一直等到 READY_TIMEOUT
+    spec = ServiceSpec("slow", "慢服务", None, ("sleep", "30"), str(tmp_path), {}, None,
+                       ("log", "never ready"), (), False, False)
+    service = ExternalService(supervisor, spec)
+    start = supervisor.submit(service.start())
+    deadline = time.monotonic() + 5
+    while not service.running and time.monotonic() < deadline:
+        time.sleep(0.02)
+    time.sleep(0.2)
+    assert service.state == "starting"
+    supervisor.submit(service.stop()).result(10)
+    start.result(5)
+    assert service.state == "stopped" and not service.running